@@ -88,6 +88,9 @@ def save_anomalies(session):
 
 
 class Alarm(object):
+    # the anomalies are evaluated on the events of the latest hour
+    window = 3600
+
     def __init__(self, state):
         self.state = state
 
@@ -113,10 +116,7 @@ class Alarm(object):
         self.number_of_anomalies = 0
 
         self.event_matrix.clear()
-
-        for event in State.tenant_state[tid].RecentEventQ:
-            self.event_matrix.setdefault(event.event_type, 0)
-            self.event_matrix[event.event_type] += 1
+        self.event_matrix.update(State.tenant_state[tid].count_events(self.window))
 
         for event_name, threshold in ANOMALY_MAP.items():
             if event_name in self.event_matrix:
@@ -135,6 +135,9 @@ class Alarm(object):
             log_function = log.info
             self.alarm_levels['activity'] = 2
 
+        # the proof of work of the tokens becomes harder during anomalies
+        State.tokens.difficulty.set_alarm_level(tid, self.alarm_levels['activity'])
+
         # if there are some anomaly or we're nearby, record it.
         if self.number_of_anomalies >= 1 or self.alarm_levels['activity'] >= 1:
             State.tenant_state[tid].AnomaliesQ.append([datetime_now(), self.event_matrix, self.alarm_levels['activity']])
@@ -15,9 +15,11 @@ import globaleaks.mocks.twisted_mocks  # pylint: disable=W0611
 
 from globaleaks.db import create_db, init_db, update_db, \
     sync_refresh_memory_variables, sync_clean_untracked_files
+from globaleaks.handlers.metrics import MetricsResource
 from globaleaks.rest.api import APIResourceWrapper
 from globaleaks.settings import Settings
 from globaleaks.state import State
+from globaleaks.utils.fs import close_secure_deletion_pool
 from globaleaks.utils.log import log, openLogFile, logFormatter, timedLogFormatter, LogObserver
 from globaleaks.utils.process import disable_swap
 from globaleaks.utils.sock import listen_tcp_on_sock, reserve_port_for_ip
@@ -73,6 +75,14 @@ class Service(service.Service):
             else:
                 self.state.http_socks += [http_sock]
 
+        # Allocate the port of the metrics, reachable only from the host
+        if Settings.metrics_port:
+            sock, fail = reserve_port_for_ip('127.0.0.1', Settings.metrics_port)
+            if fail is not None:
+                log.err("Could not reserve socket for the metrics (error: %s)", fail)
+            else:
+                self.state.metrics_socks += [sock]
+
         # Allocate remote ports
         for port in Settings.bind_remote_ports:
             sock, fail = reserve_port_for_ip(Settings.bind_address, port+mask)
@@ -107,6 +117,9 @@ class Service(service.Service):
 
             self._shutdown = True
             self.state.orm_tp.stop()
+            close_secure_deletion_pool()
+            self.state.pgp_keyring.clear()
+            self.state.close_sessions_store()
             d.callback(None)
 
         reactor.callLater(30, _shutdown, None)
@@ -157,6 +170,8 @@ class Service(service.Service):
         sync_clean_untracked_files()
         sync_refresh_memory_variables()
 
+        self.state.open_sessions_store()
+
         self.state.orm_tp.start()
 
         reactor.addSystemEventTrigger('before', 'shutdown', self.shutdown)
@@ -164,6 +179,9 @@ class Service(service.Service):
         for sock in self.state.http_socks:
             listen_tcp_on_sock(reactor, sock.fileno(), self.api_factory)
 
+        for sock in self.state.metrics_socks:
+            listen_tcp_on_sock(reactor, sock.fileno(), server.Site(MetricsResource()))
+
         self.state.process_supervisor = ProcessSupervisor(self.state.https_socks,
                                                           '127.0.0.1',
                                                           8082)
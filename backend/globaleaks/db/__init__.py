@@ -3,6 +3,7 @@
 # ******************
 import os
 import sys
+import time
 import traceback
 import warnings
 
@@ -11,13 +12,16 @@ from sqlalchemy import exc as sa_exc
 from globaleaks import models, DATABASE_VERSION
 from globaleaks.db.appdata import db_load_default_questionnaires, db_load_default_fields
 from globaleaks.models import Config
+from globaleaks.models.config import ConfigCache
 from globaleaks.models.config_desc import ConfigFilters
 from globaleaks.orm import transact, transact_sync, get_session, make_db_uri
 from globaleaks.sessions import Session
 from globaleaks.settings import Settings
 from globaleaks.state import State, TenantState
 from globaleaks.utils import fs
+from globaleaks.utils.ip import get_ip_filter
 from globaleaks.utils.log import log
+from globaleaks.utils.metrics import tenant_cache_refresh_duration
 from globaleaks.utils.objectdict import ObjectDict
 
 
@@ -109,15 +113,14 @@ def sync_clean_untracked_files(session):
     removes files in Settings.attachments_path that are not
     tracked by InternalFile/ReceiverFile.
     """
-    tracked_files = db_get_tracked_files(session)
-    for filesystem_file in os.listdir(Settings.attachments_path):
-        if filesystem_file not in tracked_files:
-            file_to_remove = os.path.join(Settings.attachments_path, filesystem_file)
-            try:
-                log.debug('Removing untracked file: %s', file_to_remove)
-                fs.overwrite_and_remove(file_to_remove)
-            except OSError:
-                log.err('Failed to remove untracked file', file_to_remove)
+    tracked_files = set(db_get_tracked_files(session))
+    files_to_remove = [os.path.join(Settings.attachments_path, x)
+                       for x in os.listdir(Settings.attachments_path) if x not in tracked_files]
+
+    for file_to_remove in files_to_remove:
+        log.debug('Removing untracked file: %s', file_to_remove)
+
+    fs.overwrite_and_remove_files(files_to_remove)
 
 
 def db_set_cache_exception_delivery_list(session, tenant_cache):
@@ -142,6 +145,9 @@ def db_refresh_tenant_cache(session, tid_list):
     This routine loads in memory few variables of node and notification tables
     that are subject to high usage.
     """
+    for tid in tid_list:
+        State.tenant_cache[tid]['languages_enabled'] = []
+
     for cfg in session.query(Config).filter(Config.tid.in_(tid_list)):
         tenant_cache = State.tenant_cache[cfg.tid]
 
@@ -152,96 +158,207 @@ def db_refresh_tenant_cache(session, tid_list):
             tenant_cache['notification'][cfg.var_name] = cfg.value
 
     for tid, lang in models.EnabledLanguage.tid_list(session, tid_list):
-        State.tenant_cache[tid].setdefault('languages_enabled', []).append(lang)
+        State.tenant_cache[tid]['languages_enabled'].append(lang)
 
     for tid in tid_list:
-        State.tenant_cache[tid]['ip_filter'] = {}
-        State.tenant_cache[tid]['https_allowed'] = {}
+        refresh_tenant_filters(tid)
 
-        for x in [('admin', 'ip_filter_admin_enable', 'ip_filter_admin'),
-                  ('custodian', 'ip_filter_custodian_enable', 'ip_filter_custodian'),
-                  ('receiver', 'ip_filter_receiver_enable', 'ip_filter_receiver'),
-                  ('whistleblower', 'ip_filter_whistleblower_enable', 'ip_filter_whistleblower')]:
-            if State.tenant_cache[tid].get(x[1], False) and State.tenant_cache[1][x[2]]:
-                State.tenant_cache[tid]['ip_filter'][x[0]] = State.tenant_cache[1][x[2]]
 
-        for x in ['admin', 'custodian', 'receiver', 'whistleblower']:
-            State.tenant_cache[tid]['https_allowed'][x] = State.tenant_cache[tid].get('https_' + x, True)
+def refresh_tenant_filters(tid):
+    """
+    Refresh the access filters of a tenant that depend also on the
+    configuration of the root tenant
+    """
+    State.tenant_cache[tid]['ip_filter'] = {}
+    State.tenant_cache[tid]['https_allowed'] = {}
 
+    for x in [('admin', 'ip_filter_admin_enable', 'ip_filter_admin'),
+              ('custodian', 'ip_filter_custodian_enable', 'ip_filter_custodian'),
+              ('receiver', 'ip_filter_receiver_enable', 'ip_filter_receiver'),
+              ('whistleblower', 'ip_filter_whistleblower_enable', 'ip_filter_whistleblower')]:
+        if State.tenant_cache[tid].get(x[1], False) and State.tenant_cache[1][x[2]]:
+            State.tenant_cache[tid]['ip_filter'][x[0]] = get_ip_filter(State.tenant_cache[1][x[2]])
 
-def db_refresh_memory_variables(session, to_refresh=None):
-    tenant_map = {tenant.id: tenant for tenant in session.query(models.Tenant).filter(models.Tenant.active == True)}
+    for x in ['admin', 'custodian', 'receiver', 'whistleblower']:
+        State.tenant_cache[tid]['https_allowed'][x] = State.tenant_cache[tid].get('https_' + x, True)
 
-    existing_tids = set(tenant_map.keys())
-    cached_tids = set(State.tenant_state.keys())
 
-    to_remove = cached_tids - existing_tids
-    to_add = existing_tids - cached_tids
+def db_refresh_root_variables(session):
+    db_set_cache_exception_delivery_list(session, State.tenant_cache[1])
 
-    for tid in to_remove:
-        if tid in State.tenant_state:
-            del State.tenant_state[tid]
+    if State.tenant_cache[1].admin_api_token_digest:
+        State.api_token_session = Session(1, 0, 'admin', False, '')
 
-        if tid in State.tenant_cache:
-            del State.tenant_cache[tid]
+    log.setloglevel(State.tenant_cache[1].log_level)
 
-    for tid in to_add:
+
+def get_tenant_hostnames(tenant):
+    """
+    Return the hostnames and the onion names by which a tenant is reachable
+    """
+    tid = tenant.id
+    rootdomain = State.tenant_cache[1].rootdomain
+    root_onionservice = State.tenant_cache[1].onionservice
+
+    hostnames = []
+    onionnames = []
+
+    if State.tenant_cache[tid].hostname != '':
+        hostnames.append(State.tenant_cache[tid].hostname.encode())
+
+    if State.tenant_cache[tid].onionservice != '':
+        onionnames.append(State.tenant_cache[tid].onionservice.encode())
+
+    if rootdomain != '':
+        hostnames.append('p{}.{}'.format(tid, rootdomain).encode())
+
+    if root_onionservice != '':
+        onionnames.append('p{}.{}'.format(tid, root_onionservice).encode())
+
+    if tenant.subdomain != '':
+        if rootdomain != '':
+            onionnames.append('{}.{}'.format(tenant.subdomain, rootdomain).encode())
+        if root_onionservice != '':
+            onionnames.append('{}.{}'.format(tenant.subdomain, root_onionservice).encode())
+
+    return hostnames, onionnames
+
+
+def unmap_tenant_hostnames(tid):
+    """Remove the hostnames of a tenant from the map of the hostnames"""
+    tenant_cache = State.tenant_cache.get(tid, {})
+
+    for hostname in tenant_cache.get('hostnames', []) + tenant_cache.get('onionnames', []):
+        if State.tenant_hostname_id_map.get(hostname) == tid:
+            del State.tenant_hostname_id_map[hostname]
+
+
+def refresh_tenant_hostnames(tenant):
+    hostnames, onionnames = get_tenant_hostnames(tenant)
+
+    unmap_tenant_hostnames(tenant.id)
+
+    State.tenant_cache[tenant.id].hostnames = hostnames
+    State.tenant_cache[tenant.id].onionnames = onionnames
+
+    State.tenant_hostname_id_map.update({h: tenant.id for h in hostnames + onionnames})
+
+
+def db_remove_tenant(tid):
+    unmap_tenant_hostnames(tid)
+
+    State.tenant_state.pop(tid, None)
+    State.tenant_cache.pop(tid, None)
+
+
+def db_add_tenant(tid):
+    if tid not in State.tenant_state:
         State.tenant_state[tid] = TenantState(State)
+
+    if tid not in State.tenant_cache:
         State.tenant_cache[tid] = ObjectDict()
 
-    if to_refresh is None:
-        to_refresh = tenant_map.keys()
-    else:
-        to_refresh = [tid for tid in to_refresh if tid in tenant_map]
 
-    if to_refresh:
-        db_refresh_tenant_cache(session, to_refresh)
+def db_refresh_tenant(session, tid):
+    """
+    Refresh the memory variables of a single tenant
+    """
+    tenant = session.query(models.Tenant).filter(models.Tenant.id == tid, models.Tenant.active == True).one_or_none()
+    if tenant is None:
+        db_remove_tenant(tid)
+        return
 
-    if 1 in to_refresh:
-        to_refresh = State.tenant_cache.keys()
-        db_set_cache_exception_delivery_list(session, State.tenant_cache[1])
+    db_add_tenant(tid)
 
-        if State.tenant_cache[1].admin_api_token_digest:
-            State.api_token_session = Session(1, 0, 'admin', False, '')
+    db_refresh_tenant_cache(session, [tid])
 
-        log.setloglevel(State.tenant_cache[1].log_level)
+    if tid == 1:
+        db_refresh_root_variables(session)
 
-    rootdomain = State.tenant_cache[1].rootdomain
-    root_onionservice = State.tenant_cache[1].onionservice
+    refresh_tenant_hostnames(tenant)
+
+
+def db_refresh_root_dependencies(session):
+    """
+    Refresh the variables of the tenants that depend on the configuration
+    of the root tenant without reloading the configuration of the tenants
+    already loaded
+    """
+    tenant_map = {tenant.id: tenant for tenant in session.query(models.Tenant).filter(models.Tenant.active == True)}
 
-    for tid in to_refresh:
-        if tid not in tenant_map:
-            continue
+    for tid in set(State.tenant_state.keys()) - set(tenant_map.keys()):
+        db_remove_tenant(tid)
 
-        tenant = tenant_map[tid]
-        if not tenant.active and tid != 1:
-            continue
+    to_add = [tid for tid in tenant_map if tid not in State.tenant_cache]
+    for tid in to_add:
+        db_add_tenant(tid)
 
-        hostnames = []
-        onionnames = []
+    if to_add:
+        db_refresh_tenant_cache(session, to_add)
 
-        if State.tenant_cache[tid].hostname != '':
-            hostnames.append(State.tenant_cache[tid].hostname.encode())
+    for tid, tenant in tenant_map.items():
+        if tid != 1:
+            refresh_tenant_filters(tid)
+            refresh_tenant_hostnames(tenant)
 
-        if State.tenant_cache[tid].onionservice != '':
-            onionnames.append(State.tenant_cache[tid].onionservice.encode())
 
-        if rootdomain != '':
-            hostnames.append('p{}.{}'.format(tid, rootdomain).encode())
+def db_refresh_all_tenants(session):
+    tenant_map = {tenant.id: tenant for tenant in session.query(models.Tenant).filter(models.Tenant.active == True)}
 
-        if root_onionservice != '':
-            onionnames.append('p{}.{}'.format(tid, root_onionservice).encode())
+    for tid in set(State.tenant_state.keys()) - set(tenant_map.keys()):
+        db_remove_tenant(tid)
+
+    for tid in tenant_map:
+        db_add_tenant(tid)
+
+    db_refresh_tenant_cache(session, list(tenant_map.keys()))
 
-        if tenant.subdomain != '':
-            if rootdomain != '':
-                onionnames.append('{}.{}'.format(tenant.subdomain, rootdomain).encode())
-            if root_onionservice != '':
-                onionnames.append('{}.{}'.format(tenant.subdomain, root_onionservice).encode())
+    db_refresh_root_variables(session)
+
+    tenant_hostname_id_map = {}
+
+    for tid, tenant in tenant_map.items():
+        hostnames, onionnames = get_tenant_hostnames(tenant)
 
         State.tenant_cache[tid].hostnames = hostnames
         State.tenant_cache[tid].onionnames = onionnames
 
-        State.tenant_hostname_id_map.update({h: tid for h in hostnames + onionnames})
+        tenant_hostname_id_map.update({h: tid for h in hostnames + onionnames})
+
+    State.tenant_hostname_id_map = tenant_hostname_id_map
+
+
+def db_refresh_memory_variables(session, to_refresh=None):
+    """
+    Refresh the memory variables of the tenants
+
+    The whole cache is rebuilt only if to_refresh is None, otherwise only
+    the tenants listed are reloaded; a change of the root tenant causes
+    also the refresh of the variables of the other tenants depending on it.
+    """
+    # The configuration could have been changed out of the sessions (e.g. by a migration)
+    ConfigCache.invalidate(None if to_refresh is None else set(to_refresh))
+
+    start_time = time.time()
+
+    if to_refresh is None:
+        kind = 'full'
+        db_refresh_all_tenants(session)
+    else:
+        kind = 'tenant'
+        for tid in to_refresh:
+            db_refresh_tenant(session, tid)
+
+        if 1 in to_refresh:
+            kind = 'root'
+            db_refresh_root_dependencies(session)
+
+    duration = time.time() - start_time
+
+    tenant_cache_refresh_duration.observe(duration, (kind,))
+
+    log.debug("Refreshed the memory variables [%s: %s] in %.3fs",
+              kind, 'all' if to_refresh is None else ', '.join(str(x) for x in to_refresh), duration)
 
 
 @transact
@@ -0,0 +1,6 @@
+# -*- coding: UTF-8
+from globaleaks.db.migrations.update import MigrationBase
+
+
+class MigrationScript(MigrationBase):
+    pass
@@ -92,7 +92,5 @@ def track_handler(handler):
         if event['handler_check'](handler.request.uri) and \
            event['method'] == handler.request.method and \
            event['status_check'](handler.request.code):
-            e = Event(event, handler.request.execution_time)
-            State.tenant_state[tid].RecentEventQ.append(e)
-            State.tenant_state[tid].EventQ.append(e)
+            State.tenant_state[tid].add_event(Event(event, handler.request.execution_time))
             break
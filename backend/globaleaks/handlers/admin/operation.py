@@ -8,7 +8,7 @@ from twisted.web.client import readBody
 from globaleaks.db import db_refresh_memory_variables
 from globaleaks.handlers.operation import OperationHandler
 from globaleaks.handlers.password_reset import generate_password_reset_token
-from globaleaks.handlers.rtip import db_delete_itip
+from globaleaks.handlers.rtip import db_delete_itips
 from globaleaks.models import Config, InternalTip
 from globaleaks.models.config import ConfigFactory, db_set_config_variable
 from globaleaks.orm import transact, tw
@@ -54,8 +54,9 @@ def set_config_variable(session, tid, var, val):
 def reset_submissions(session, tid):
     session.query(Config).filter(Config.tid == tid, Config.var_name == u'counter_submissions').update({'value': 0})
 
-    for itip in session.query(InternalTip).filter(InternalTip.tid == tid):
-        db_delete_itip(session, itip)
+    itips_ids = [x[0] for x in session.query(InternalTip.id).filter(InternalTip.tid == tid)]
+    if itips_ids:
+        db_delete_itips(session, itips_ids)
 
 
 
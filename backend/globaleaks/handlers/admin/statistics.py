@@ -6,7 +6,9 @@ from datetime import timedelta
 from globaleaks.event import events_monitored
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.models import Stats, Anomalies
-from globaleaks.orm import transact
+from globaleaks.orm import transact, QueryLog
+from globaleaks.rest import errors
+from globaleaks.sessions import Sessions
 from globaleaks.state import State
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now, \
     iso_to_gregorian
@@ -153,25 +155,22 @@ class RecentEventsCollection(BaseHandler):
     """
     check_roles = 'admin'
 
-    def get_summary(self, templist):
+    def get_summary(self):
         eventmap = dict()
         for event in events_monitored:
             eventmap.setdefault(event['name'], 0)
 
-        for e in templist:
-            eventmap[e['event']] += 1
+        eventmap.update(State.tenant_state[self.request.tid].count_events())
 
         return eventmap
 
     def get(self, kind):
-        templist = [e.serialize() for e in State.tenant_state[self.request.tid].EventQ]
-
-        templist.sort(key=operator.itemgetter('creation_date'))
-
         if kind == 'details':
+            templist = [e.serialize() for e in State.tenant_state[self.request.tid].EventQ]
+            templist.sort(key=operator.itemgetter('creation_date'))
             return templist
 
-        return self.get_summary(templist)
+        return self.get_summary()
 
 
 class JobsTiming(BaseHandler):
@@ -186,7 +185,52 @@ class JobsTiming(BaseHandler):
         for job in State.jobs:
             response.append({
               'name': job.name,
-              'timings': job.last_executions
+              'timings': job.last_executions,
+              'phases': job.phases_timings,
+              'progress': job.progress
             })
 
         return response
+
+
+class QueriesTiming(BaseHandler):
+    """
+    This handler return the statistics on the queries executed by each
+    transaction and the latest slow queries
+    """
+    check_roles = 'admin'
+
+    def get(self):
+        # The statistics are collected for the whole process
+        if self.request.tid != 1:
+            raise errors.ForbiddenOperation
+
+        with QueryLog.lock:
+            transactions = sorted((dict(x) for x in QueryLog.transactions.values()),
+                                  key=operator.itemgetter('queries'), reverse=True)
+
+            slow_queries = [dict(x, date=datetime_to_ISO8601(x['date'])) for x in reversed(QueryLog.slow_queries)]
+
+        return {
+            'queries': QueryLog.count,
+            'slow_query_threshold': QueryLog.threshold,
+            'transactions': transactions,
+            'slow_queries': slow_queries
+        }
+
+
+class SessionsCount(BaseHandler):
+    """
+    This handler return the number of active sessions per tenant and role
+    """
+    check_roles = 'admin'
+
+    def get(self):
+        # The root tenant is shown the sessions of every tenant
+        tids = sorted(Sessions.tenants) if self.request.tid == 1 else [self.request.tid]
+
+        return [{
+            'tid': tid,
+            'count': Sessions.count(tid),
+            'roles': Sessions.count_by_role(tid)
+        } for tid in tids]
@@ -7,6 +7,8 @@
 import base64
 import os
 
+from twisted.internet.defer import inlineCallbacks, returnValue
+
 from globaleaks import models
 from globaleaks.db import db_refresh_memory_variables
 from globaleaks.db.appdata import load_appdata
@@ -14,6 +16,7 @@ from globaleaks.handlers.admin import file
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.orm import transact
 from globaleaks.rest import requests
+from globaleaks.sessions import Sessions
 from globaleaks.settings import Settings
 from globaleaks.state import State
 from globaleaks.utils.log import log
@@ -172,6 +175,7 @@ class TenantInstance(BaseHandler):
 
         return get(tenant_id)
 
+    @inlineCallbacks
     def put(self, tenant_id):
         """
         Update the specified tenant.
@@ -181,8 +185,14 @@ class TenantInstance(BaseHandler):
         request = self.validate_message(self.request.content.read(),
                                         requests.AdminTenantDesc)
 
-        return update(tenant_id, request)
+        tenant = yield update(tenant_id, request)
+
+        if not tenant['active']:
+            Sessions.revoke_tenant(tenant_id)
 
+        returnValue(tenant)
+
+    @inlineCallbacks
     def delete(self, tenant_id):
         """
         Delete the specified tenant.
@@ -191,4 +201,6 @@ class TenantInstance(BaseHandler):
 
         log.info('Removing tenant with id: %d', tenant_id, tid=self.request.tid)
 
-        return delete(tenant_id)
+        yield delete(tenant_id)
+
+        Sessions.revoke_tenant(tenant_id)
@@ -5,6 +5,7 @@
 # Implementation of the User model functionalities
 #
 from six import text_type
+from twisted.internet.defer import inlineCallbacks, returnValue
 
 from globaleaks import models
 from globaleaks.db import db_refresh_memory_variables
@@ -17,6 +18,7 @@ from globaleaks.handlers.user import db_get_user, \
 from globaleaks.models import fill_localized_keys
 from globaleaks.orm import transact
 from globaleaks.rest import requests, errors
+from globaleaks.sessions import Sessions
 from globaleaks.state import State
 from globaleaks.utils.crypto import GCE
 from globaleaks.utils.utility import datetime_now, uuid4
@@ -194,19 +196,28 @@ class UserInstance(BaseHandler):
     check_roles = 'admin'
     invalidate_cache = True
 
+    @inlineCallbacks
     def put(self, user_id):
         """
         Update the specified user.
         """
         request = self.validate_message(self.request.content.read(), requests.UserUserDesc)
 
-        return admin_update_user(self.request.tid, user_id, request, self.request.language)
+        user = yield admin_update_user(self.request.tid, user_id, request, self.request.language)
 
+        if request['password']:
+            Sessions.revoke(self.request.tid, user_id)
+
+        returnValue(user)
+
+    @inlineCallbacks
     def delete(self, user_id):
         """
         Delete the specified user.
         """
-        return delete_user(self.request.tid, user_id)
+        yield delete_user(self.request.tid, user_id)
+
+        Sessions.revoke(self.request.tid, user_id)
 
 
 class UserTenantCollection(BaseHandler):
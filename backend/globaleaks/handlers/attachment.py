@@ -8,6 +8,7 @@ from globaleaks.handlers.base import BaseHandler
 from globaleaks.models import serializers
 from globaleaks.orm import transact
 from globaleaks.utils.utility import datetime_now
+from globaleaks.utils.worksignals import db_emit_signals
 
 
 @transact
@@ -28,6 +29,8 @@ def register_ifile_on_db(session, tid, internaltip_id, uploaded_file):
 
     session.add(new_file)
 
+    db_emit_signals(session, 'delivery')
+
     return serializers.serialize_ifile(session, new_file)
 
 
@@ -36,12 +36,14 @@ class FileProducer(object):
 
     @ivar request: The L{IRequest} to write the contents of the file to.
     @ivar fd: The file descriptor from which reading the content to be delivered
+    @ivar length: The optional number of bytes to be delivered
     """
 
-    def __init__(self, request, fo):
+    def __init__(self, request, fo, length=None):
         self.finish = defer.Deferred()
         self.request = request
         self.fo = fo
+        self.length = length
 
     def start(self):
         self.request.registerProducer(self, False)
@@ -51,8 +53,15 @@ class FileProducer(object):
         if not self.request:
             return
 
-        data = self.fo.read(abstract.FileDescriptor.bufferSize)
+        chunk_size = abstract.FileDescriptor.bufferSize
+        if self.length is not None:
+            chunk_size = min(chunk_size, self.length)
+
+        data = self.fo.read(chunk_size) if chunk_size else b''
         if data:
+            if self.length is not None:
+                self.length -= len(data)
+
             self.request.write(data)
         else:
             self.stopProducing()
@@ -262,6 +271,20 @@ class BaseHandler(object):
 
         raise errors.InputValidationError("Unexpected condition!?")
 
+    def get_argument(self, name, parser=text_type):
+        """
+        Return the value of a query argument converted with the provided
+        parser or None if the argument is missing
+        """
+        value = self.request.args.get(name.encode())
+        if value is None:
+            return
+
+        try:
+            return parser(text_type(value[0], 'utf-8'))
+        except Exception:
+            raise errors.InputValidationError('Invalid argument %s' % name)
+
     def redirect(self, url):
         self.request.setResponseCode(301)
         self.request.setHeader(b'location', url)
@@ -290,12 +313,65 @@ class BaseHandler(object):
         fo = self.open_file(filepath)
         return self.write_file_fo(filename, fo)
 
-    def write_file_as_download_fo(self, filename, fo):
+    def parse_range(self, size):
+        """
+        Parse the Range header of the request
+
+        :param size: the size of the resource requested
+        :return: the (start, end) tuple of the bytes requested or None
+                 when the whole resource should be delivered
+        """
+        header = self.request.headers.get(b'range')
+        if header is None:
+            return
+
+        match = re.match(r'^bytes=(\d*)-(\d*)$', text_type(header, 'utf-8').strip())
+        if match is None or match.groups() == ('', ''):
+            # Unsupported or multiple ranges; the whole resource is delivered
+            return
+
+        start, end = match.groups()
+        if start == '':
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+
+        if start > end:
+            raise errors.RangeNotSatisfiable
+
+        return start, end
+
+    def write_file_as_download_fo(self, filename, fo, size=None):
+        """
+        Deliver the content of a file object as a download
+
+        When the size of the content is known the download could be
+        requested in parts; in this case the file object must be seekable.
+        """
         self.request.setHeader(b'X-Download-Options', b'noopen')
         self.request.setHeader(b'Content-Type', b'application/octet-stream')
         self.request.setHeader(b'Content-Disposition', 'attachment; filename="%s"' % filename)
 
-        return FileProducer(self.request, fo).start()
+        if size is None:
+            return FileProducer(self.request, fo).start()
+
+        self.request.setHeader(b'Accept-Ranges', b'bytes')
+
+        try:
+            byte_range = self.parse_range(size)
+            if byte_range is not None:
+                start, end = byte_range
+                fo.seek(start)
+                self.request.setResponseCode(206)
+                self.request.setHeader(b'Content-Range', 'bytes %d-%d/%d' % (start, end, size))
+                size = end - start + 1
+        except:
+            fo.close()
+            raise
+
+        self.request.setHeader(b'Content-Length', '%d' % size)
+
+        return FileProducer(self.request, fo, size).start()
 
     def write_file_as_download(self, filename, filepath):
         fo = self.open_file(filepath)
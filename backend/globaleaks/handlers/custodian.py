@@ -8,14 +8,32 @@ from globaleaks.rest import requests
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now
 
 
-def serialize_identityaccessrequest(session, identityaccessrequest):
-    itip, user = session.query(models.InternalTip, models.User) \
-                      .filter(models.InternalTip.id == models.ReceiverTip.internaltip_id,
-                              models.ReceiverTip.id == identityaccessrequest.receivertip_id,
-                              models.User.id == models.ReceiverTip.receiver_id).one()
+def db_prepare_identityaccessrequests_serialization(session, identityaccessrequests):
+    data = {'tips': {}, 'reply_users': set()}
 
-    reply_user = session.query(models.User) \
-                        .filter(models.User.id == identityaccessrequest.reply_user_id).one_or_none()
+    rtips_ids = set(iar.receivertip_id for iar in identityaccessrequests)
+    users_ids = set(iar.reply_user_id for iar in identityaccessrequests if iar.reply_user_id is not None)
+
+    if rtips_ids:
+        for rtip_id, itip, user in session.query(models.ReceiverTip.id, models.InternalTip, models.User) \
+                                          .filter(models.ReceiverTip.id.in_(rtips_ids),
+                                                  models.InternalTip.id == models.ReceiverTip.internaltip_id,
+                                                  models.User.id == models.ReceiverTip.receiver_id):
+            data['tips'][rtip_id] = (itip, user)
+
+    if users_ids:
+        data['reply_users'] = set(x[0] for x in session.query(models.User.id).filter(models.User.id.in_(users_ids)))
+
+    return data
+
+
+def serialize_identityaccessrequest(session, identityaccessrequest, data=None):
+    if data is None:
+        data = db_prepare_identityaccessrequests_serialization(session, [identityaccessrequest])
+
+    itip, user = data['tips'][identityaccessrequest.receivertip_id]
+
+    reply_user_id = identityaccessrequest.reply_user_id
 
     return {
         'id': identityaccessrequest.id,
@@ -24,7 +42,7 @@ def serialize_identityaccessrequest(session, identityaccessrequest):
         'request_user_name': user.name,
         'request_motivation': identityaccessrequest.request_motivation,
         'reply_date': datetime_to_ISO8601(identityaccessrequest.reply_date),
-        'reply_user_name': reply_user.id if reply_user is not None else '',
+        'reply_user_name': reply_user_id if reply_user_id in data['reply_users'] else '',
         'reply': identityaccessrequest.reply,
         'reply_motivation': identityaccessrequest.reply_motivation,
         'submission_date': datetime_to_ISO8601(itip.creation_date)
@@ -33,11 +51,14 @@ def serialize_identityaccessrequest(session, identityaccessrequest):
 
 @transact
 def get_identityaccessrequest_list(session, tid):
-    return [serialize_identityaccessrequest(session, iar)
-        for iar in session.query(models.IdentityAccessRequest).filter(models.IdentityAccessRequest.reply == u'pending',
-                                                                      models.IdentityAccessRequest.receivertip_id == models.ReceiverTip.id,
-                                                                      models.ReceiverTip.internaltip_id == models.InternalTip.id,
-                                                                      models.InternalTip.tid == tid)]
+    iars = session.query(models.IdentityAccessRequest).filter(models.IdentityAccessRequest.reply == u'pending',
+                                                              models.IdentityAccessRequest.receivertip_id == models.ReceiverTip.id,
+                                                              models.ReceiverTip.internaltip_id == models.InternalTip.id,
+                                                              models.InternalTip.tid == tid).all()
+
+    data = db_prepare_identityaccessrequests_serialization(session, iars)
+
+    return [serialize_identityaccessrequest(session, iar, data) for iar in iars]
 
 
 @transact
@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
 #
 # API handling export of submissions
+import json
 import os
+import threading
 
 from io import BytesIO
 from six import text_type
-from twisted.internet import abstract
-from twisted.internet.defer import Deferred, inlineCallbacks
+from six.moves import queue
+from twisted.internet import abstract, reactor
+from twisted.internet.defer import Deferred, DeferredSemaphore, inlineCallbacks, returnValue
+from twisted.internet.threads import deferToThread
 
 from globaleaks import models
 from globaleaks.handlers.admin.context import admin_serialize_context
@@ -16,34 +20,45 @@ from globaleaks.handlers.base import BaseHandler
 from globaleaks.handlers.rtip import db_access_rtip, serialize_rtip
 from globaleaks.handlers.user import user_serialize_user
 from globaleaks.orm import transact
+from globaleaks.rest import errors, requests
 from globaleaks.settings import Settings
 from globaleaks.utils.crypto import GCE
+from globaleaks.utils.export import ExportList
+from globaleaks.utils.log import log
 from globaleaks.utils.templating import Templating
 from globaleaks.utils.utility import msdos_encode, datetime_now
 from globaleaks.utils.zipstream import ZipStream
 
 
-@transact
-def get_tip_export(session, tid, user_id, rtip_id, language):
-    rtip, itip = db_access_rtip(session, tid, user_id, rtip_id)
+def db_get_tip_export(session, tid, rtip, itip, language, cache):
+    """
+    Serialize a tip for the export
 
-    user, context = session.query(models.User, models.Context) \
-                           .filter(models.User.id == rtip.receiver_id,
-                                   models.Context.id == models.InternalTip.context_id,
-                                   models.InternalTip.id == rtip.internaltip_id,
-                                   models.UserTenant.user_id == models.User.id,
-                                   models.UserTenant.tenant_id == tid).one()
+    :param cache: a dictionary used to share the serialization of node,
+                  notification, user and contexts among multiple exports
+    """
+    if 'node' not in cache:
+        user = models.db_get(session, models.User, models.User.id == rtip.receiver_id)
+
+        cache['node'] = db_admin_serialize_node(session, tid, language)
+        cache['notification'] = db_get_notification(session, tid, language)
+        cache['user'] = user_serialize_user(session, user, language)
+        cache['contexts'] = {}
+
+    if itip.context_id not in cache['contexts']:
+        context = models.db_get(session, models.Context, models.Context.id == itip.context_id)
+        cache['contexts'][itip.context_id] = admin_serialize_context(session, context, language)
 
     rtip_dict = serialize_rtip(session, rtip, itip, language)
 
     export_dict = {
         'type': u'export_template',
-        'node': db_admin_serialize_node(session, tid, language),
-        'notification': db_get_notification(session, tid, language),
+        'node': cache['node'],
+        'notification': cache['notification'],
         'tip': rtip_dict,
         'crypto_tip_prv_key': rtip.crypto_tip_prv_key,
-        'user': user_serialize_user(session, user, language),
-        'context': admin_serialize_context(session, context, language),
+        'user': cache['user'],
+        'context': cache['contexts'][itip.context_id],
         'comments': rtip_dict['comments'],
         'messages': rtip_dict['messages'],
         'files': []
@@ -55,7 +70,7 @@ def get_tip_export(session, tid, user_id, rtip_id, language):
 
     export_dict['files'].append({'fo': BytesIO(export_template), 'name': 'data.txt', 'forged': True})
 
-    for rfile in session.query(models.ReceiverFile).filter(models.ReceiverFile.receivertip_id == rtip_id):
+    for rfile in session.query(models.ReceiverFile).filter(models.ReceiverFile.receivertip_id == rtip.id):
         rfile.last_access = datetime_now()
         rfile.downloads += 1
         file_dict = models.serializers.serialize_rfile(session, tid, rfile)
@@ -76,34 +91,210 @@ def get_tip_export(session, tid, user_id, rtip_id, language):
     return export_dict
 
 
+@transact
+def get_tip_export(session, tid, user_id, rtip_id, language):
+    rtip, itip = db_access_rtip(session, tid, user_id, rtip_id)
+
+    return db_get_tip_export(session, tid, rtip, itip, language, {})
+
+
+@transact
+def get_tips_export(session, tid, user_id, rtips_ids, language):
+    """
+    Serialize for the export all the tips of the list accessible by the user
+
+    Every tip is archived in its own directory and the archive starts
+    with a manifest listing the content of each directory so that an
+    interrupted download could be resumed requesting the missing tips.
+    """
+    cache = {}
+    tip_exports = []
+    manifest = []
+
+    for rtip, itip in session.query(models.ReceiverTip, models.InternalTip) \
+                              .filter(models.ReceiverTip.receiver_id == user_id,
+                                     models.ReceiverTip.id.in_(rtips_ids),
+                                     models.InternalTip.id == models.ReceiverTip.internaltip_id,
+                                     models.InternalTip.tid == tid) \
+                              .order_by(models.InternalTip.progressive):
+        tip_export = db_get_tip_export(session, tid, rtip, itip, language, cache)
+
+        directory = 'submission-%d/' % itip.progressive
+        for file_dict in tip_export['files']:
+            file_dict['name'] = directory + file_dict['name']
+
+        manifest.append({
+            'id': rtip.id,
+            'progressive': itip.progressive,
+            'directory': directory,
+            'files': [file_dict['name'] for file_dict in tip_export['files']]
+        })
+
+        tip_exports.append(tip_export)
+
+    manifest = json.dumps({'tips': manifest}, indent=2).encode('utf-8')
+
+    return [{'fo': BytesIO(manifest), 'name': 'manifest.json', 'forged': True}], tip_exports
+
+
+def prepare_tip_export_files(tip_export):
+    """
+    Prepare the files of a tip export for the archival, marking the ones
+    to be decrypted with the key of the tip when the tip is encrypted
+    """
+    for file_dict in tip_export['files']:
+        if not file_dict['forged'] and tip_export['crypto_tip_prv_key']:
+            file_dict['crypto_tip_prv_key'] = tip_export['crypto_tip_prv_key']
+
+    return tip_export['files']
+
+
+def open_export_files(user_key, files):
+    """
+    Open the encrypted files of the exports as they are reached by the
+    archival, in the thread iterating the ZipStream, so that a single
+    file descriptor is open at a time and no decryption runs on the
+    reactor thread
+    """
+    crypto_tip_prv_key = tip_prv_key = None
+
+    for file_dict in files:
+        if 'crypto_tip_prv_key' in file_dict:
+            # The files of a tip are consecutive: only the key of the current tip is kept
+            if file_dict['crypto_tip_prv_key'] != crypto_tip_prv_key:
+                crypto_tip_prv_key = file_dict['crypto_tip_prv_key']
+                tip_prv_key = GCE.asymmetric_decrypt(user_key, crypto_tip_prv_key)
+
+            file_dict = {
+                'fo': GCE.streaming_encryption_open('DECRYPT', tip_prv_key, file_dict['path']),
+                'name': file_dict['name'],
+                'size': file_dict.get('size'),
+                'content_type': file_dict.get('content_type', '')
+            }
+
+        yield file_dict
+
+
+@transact
+def get_user_crypto_pub_key(session, tid, user_id):
+    return models.db_get(session, models.User, models.User.tid == tid, models.User.id == user_id).crypto_pub_key
+
+
+def stream_export(handler, user_key, files, filename):
+    handler.request.setHeader(b'X-Download-Options', b'noopen')
+    handler.request.setHeader(b'Content-Type', b'application/octet-stream')
+    handler.request.setHeader(b'Content-Disposition', b'attachment; filename="' + filename + b'"')
+
+    return ZipStreamProducer(handler, iter(ZipStream(open_export_files(user_key, files)))).start()
+
+
+# Maximum number of archives generated concurrently; the other downloads
+# wait for a free worker
+MAX_CONCURRENT_STREAMS = 4
+
+stream_semaphore = DeferredSemaphore(MAX_CONCURRENT_STREAMS)
+
+
 class ZipStreamProducer(object):
-    """Streaming producter for ZipStream"""
+    """
+    Streaming producter for ZipStream
+
+    The archive is generated by a worker thread that feeds a bounded buffer
+    so that decryption and compression never run on the reactor thread.
+    """
+    buffer_size = 16
 
     def __init__(self, handler, zipstreamObject):
         self.finish = Deferred()
         self.handler = handler
         self.zipstreamObject = zipstreamObject
+        self.buffer = queue.Queue(self.buffer_size)
+        self.stopped = threading.Event()
+        self.waiting = False
+        self.error = None
 
     def start(self):
+        stream_semaphore.run(deferToThread, self.produce)
+
         self.handler.request.registerProducer(self, False)
         return self.finish
 
+    def produce(self):
+        """
+        Executed in the worker thread; generates the archive chunks
+        """
+        try:
+            while not self.stopped.is_set():
+                data = self.zip_chunk()
+                if not data or not self.put(data):
+                    break
+        except Exception as excep:
+            self.error = excep
+        finally:
+            self.put(None)
+
+    def put(self, data):
+        while not self.stopped.is_set():
+            try:
+                self.buffer.put(data, timeout=1)
+            except queue.Full:
+                continue
+
+            reactor.callFromThread(self.wakeup)
+            return True
+
+        return False
+
+    def wakeup(self):
+        if self.waiting:
+            self.waiting = False
+            self.resumeProducing()
+
     def resumeProducing(self):
         if not self.handler:
             return
 
-        data = self.zip_chunk()
+        try:
+            data = self.buffer.get_nowait()
+        except queue.Empty:
+            # the worker will resume the production as soon as a chunk is available
+            self.waiting = True
+            return
+
         if data:
             self.handler.request.write(data)
+        elif self.error is not None:
+            self.abort()
         else:
             self.stopProducing()
 
     def stopProducing(self):
+        if not self.handler:
+            return
+
+        self.stopped.set()
         self.handler.request.unregisterProducer()
         self.handler.request.finish()
         self.handler = None
         self.finish.callback(None)
 
+    def abort(self):
+        """
+        Abort the connection so that the client does not receive a
+        truncated archive looking complete
+        """
+        log.err("Unable to complete the export: %s", self.error)
+
+        request = self.handler.request
+
+        self.stopped.set()
+        request.unregisterProducer()
+        self.handler = None
+
+        # The request is concluded by the loss of the connection
+        request.notifyFinish().addBoth(lambda _: self.finish.callback(None))
+        request.transport.abortConnection()
+
     def zip_chunk(self):
         chunk = []
         chunk_size = 0
@@ -129,19 +320,117 @@ class ExportHandler(BaseHandler):
                                           rtip_id,
                                           self.request.language)
 
-        if tip_export['crypto_tip_prv_key']:
-            for file_dict in tip_export['files']:
-                if file_dict['forged']:
-                    continue
+        files = prepare_tip_export_files(tip_export)
+
+        yield stream_export(self, self.current_user.cc, files, b'submission.zip')
+
+
+def build_export(export, user_key, files, key):
+    """
+    Executed in a worker thread; writes the archive encrypted on disk
+    """
+    export.status = u'building'
+
+    with export.open('w', key) as fo:
+        for data in ZipStream(open_export_files(user_key, files)):
+            if export.expired:
+                return
+
+            fo.write(data)
+            export.size += len(data)
+
+    export.status = u'ready'
+
+
+def schedule_export_build(export, user_key, files, key):
+    def on_error(failure):
+        export.status = u'failed'
+        log.err("Unable to build the export %s: %s", export.id, failure.getErrorMessage())
+
+    def on_complete(_):
+        if export.expired:
+            return export.exportlist.secure_delete(export)
+
+    def run():
+        if export.expired:
+            return
+
+        return deferToThread(build_export, export, user_key, files, key) \
+                   .addErrback(on_error) \
+                   .addBoth(on_complete)
+
+    export.estimated_size = sum(f['size'] if 'size' in f else len(f['fo'].getvalue()) for f in files)
+
+    return export.exportlist.semaphore.run(run)
+
+
+class ExportJobCollection(BaseHandler):
+    """
+    Handler used to request exports built in background and to list them
+    """
+    check_roles = 'receiver'
+
+    def get(self):
+        return [export.serialize() for export in self.state.exports.get_user_exports(self.request.tid,
+                                                                                     self.current_user.user_id)]
+
+    @inlineCallbacks
+    def post(self):
+        request = self.validate_message(self.request.content.read(), requests.ExportDesc)
+
+        if len(self.state.exports.get_user_exports(self.request.tid,
+                                                   self.current_user.user_id)) >= ExportList.max_exports_per_user:
+            raise errors.ForbiddenOperation
+
+        files, tip_exports = yield get_tips_export(self.request.tid,
+                                                   self.current_user.user_id,
+                                                   request['rtips'],
+                                                   self.request.language)
+
+        if not tip_exports:
+            raise errors.ResourceNotFound
+
+        for tip_export in tip_exports:
+            files.extend(prepare_tip_export_files(tip_export))
+
+        user_pub_key = yield get_user_crypto_pub_key(self.request.tid, self.current_user.user_id)
+
+        export = self.state.exports.new(self.request.tid,
+                                        self.current_user.user_id,
+                                        [tip_export['tip']['id'] for tip_export in tip_exports])
+
+        key = export.generate_key(user_pub_key)
+
+        # The files are opened only by the build, after the wait for its turn
+        schedule_export_build(export, self.current_user.cc, files, key)
+
+        returnValue(export.serialize())
+
+
+class ExportJobInstance(BaseHandler):
+    """
+    Handler used to download and delete the exports built in background
+    """
+    check_roles = 'receiver'
+    handler_exec_time_threshold = 3600
+
+    def get_export(self, export_id):
+        export = self.state.exports.get(export_id)
+        if export is None or \
+           export.tid != self.request.tid or \
+           export.user_id != self.current_user.user_id:
+            raise errors.ResourceNotFound
+
+        return export
 
-                tip_prv_key = GCE.asymmetric_decrypt(self.current_user.cc, tip_export['crypto_tip_prv_key'])
-                file_dict['fo'] = GCE.streaming_encryption_open('DECRYPT', tip_prv_key, file_dict['path'])
-                del file_dict['path']
+    def get(self, export_id):
+        export = self.get_export(export_id)
+        if export.status != u'ready':
+            raise errors.ForbiddenOperation
 
-        self.request.setHeader(b'X-Download-Options', b'noopen')
-        self.request.setHeader(b'Content-Type', b'application/octet-stream')
-        self.request.setHeader(b'Content-Disposition', b'attachment; filename="submission.zip"')
+        fo = export.open('r', export.get_key(self.current_user.cc))
 
-        self.zip_stream = iter(ZipStream(tip_export['files']))
+        return self.write_file_as_download_fo('submissions.zip', fo, export.size)
 
-        yield ZipStreamProducer(self, self.zip_stream).start()
+    def delete(self, export_id):
+        self.state.exports.delete(self.get_export(export_id).id)
@@ -21,6 +21,19 @@ def db_mark_file_for_secure_deletion(session, directory, filename):
     session.add(secure_file_delete)
 
 
+def db_mark_files_for_secure_deletion(session, directory, filenames):
+    """
+    Mark in a single statement a set of files for secure deletion.
+
+    The existence of the files is not verified here in order to not access
+    the filesystem inside the transaction; the files that do not exist are
+    skipped by the cleaning job.
+    """
+    if filenames:
+        session.execute(models.SecureFileDelete.__table__.insert(),
+                        [{'filepath': os.path.join(directory, filename)} for filename in filenames])
+
+
 @transact
 def get_file_id(session, tid, name):
     return models.db_get(session, models.File, models.File.tid == tid, models.File.name == text_type(name)).id
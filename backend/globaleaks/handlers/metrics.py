@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#
+# Implementation of the metrics resource exported in the Prometheus text format
+from twisted.web.resource import Resource
+
+from globaleaks.sessions import Sessions
+from globaleaks.state import State
+from globaleaks.utils.metrics import Metrics
+
+
+def get_job_progress(name, key):
+    for job in State.jobs:
+        if job.name == name:
+            return job.progress.get(key, 0)
+
+    return 0
+
+
+def get_https_workers():
+    if State.process_supervisor is None:
+        return 0
+
+    return len(State.process_supervisor.tls_process_pool)
+
+
+Metrics.gauge('orm_threads', 'Threads of the ORM thread pool',
+              function=lambda: len(State.orm_tp.threads))
+
+Metrics.gauge('orm_threads_busy', 'Busy threads of the ORM thread pool',
+              function=lambda: len(State.orm_tp.working))
+
+Metrics.gauge('orm_queue_size', 'Transactions waiting for a thread of the ORM thread pool',
+              function=lambda: State.orm_tp.q.qsize())
+
+Metrics.gauge('jobs_running', 'Jobs currently executing',
+              function=lambda: len([job for job in State.jobs if job.active is not None]))
+
+Metrics.gauge('mail_queue_size', 'Mails left in the queue by the latest execution of the notification job',
+              function=lambda: get_job_progress('Notification', 'pending'))
+
+Metrics.gauge('delivery_backlog', 'Files found to be processed by the latest execution of the delivery job',
+              ('kind',),
+              function=lambda: [((kind,), get_job_progress('Delivery', kind + 's'))
+                                for kind in ('receiverfile', 'whistleblowerfile')])
+
+Metrics.gauge('sessions', 'Active sessions by tenant',
+              ('tid',),
+              function=lambda: [((tid,), Sessions.count(tid)) for tid in sorted(Sessions.tenants)])
+
+Metrics.gauge('tokens', 'Active tokens',
+              function=lambda: len(State.tokens))
+
+Metrics.gauge('https_workers', 'HTTPS workers running',
+              function=get_https_workers)
+
+
+class MetricsResource(Resource):
+    """
+    This resource exports the metrics of the backend to the monitoring
+    systems; it is served only by the listener on 127.0.0.1 enabled
+    by Settings.metrics_port and never by the API.
+    """
+    isLeaf = True
+
+    def render_GET(self, request):
+        request.setHeader(b'Content-Type', b'text/plain; version=0.0.4; charset=utf-8')
+
+        return Metrics.render().encode('utf-8')
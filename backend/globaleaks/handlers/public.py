@@ -434,7 +434,7 @@ class PublicResource(BaseHandler):
         ret['node']['accept_submissions'] = State.accept_submissions
 
         if (self.state.tenant_cache[self.request.tid]['ip_filter_whistleblower_enable'] and
-            not check_ip(self.state.tenant_cache[self.request.tid]['ip_filter_whistleblower'], self.request.client_ip)):
+            not check_ip(self.request.client_ip, self.state.tenant_cache[self.request.tid]['ip_filter_whistleblower'])):
             ret['node']['accept_submissions'] = False
 
         returnValue(ret)
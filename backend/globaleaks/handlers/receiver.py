@@ -1,17 +1,25 @@
 # -*- coding: utf-8 -*-
 #
 # API handling recipient user functionalities
-from sqlalchemy.sql.expression import func, distinct
+import base64
+import json
+
+from datetime import datetime
+from six import text_type
+from sqlalchemy import DateTime
+from sqlalchemy.sql.expression import and_, func, or_
+from twisted.internet.defer import inlineCallbacks, returnValue
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.handlers.rtip import db_postpone_expiration_date, db_delete_itip
+from globaleaks.handlers.export import get_tips_export, prepare_tip_export_files, stream_export
+from globaleaks.handlers.rtip import db_delete_itips, db_postpone_expiration_dates, db_update_submission_statuses
 from globaleaks.handlers.submission import db_serialize_archived_preview_schema
 from globaleaks.handlers.user import db_get_user, db_user_update_user, user_serialize_user
 from globaleaks.orm import transact
 from globaleaks.rest import requests, errors
 from globaleaks.state import State
-from globaleaks.utils.utility import datetime_to_ISO8601
+from globaleaks.utils.utility import datetime_to_ISO8601, ISO8601_to_datetime
 
 
 def receiver_serialize_receiver(session, tid, user, language):
@@ -48,56 +56,139 @@ def update_receiver_settings(session, tid, user_session, request, language):
     return receiver_serialize_receiver(session, tid, user, language)
 
 
-@transact
-def get_receivertip_list(session, tid, receiver_id, language):
-    rtip_summary_list = []
+TIPS_SORT_KEYS = {
+    'creation_date': models.InternalTip.creation_date,
+    'update_date': models.InternalTip.update_date,
+    'expiration_date': models.InternalTip.expiration_date,
+    'last_access': models.ReceiverTip.last_access,
+    'progressive': models.InternalTip.progressive,
+    'total_score': models.InternalTip.total_score
+}
+
+TIPS_PAGE_MAX_SIZE = 1000
+
+
+def encode_tips_cursor(value, rtip_id):
+    if isinstance(value, datetime):
+        value = value.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+    return text_type(base64.urlsafe_b64encode(json.dumps([value, rtip_id]).encode()), 'utf-8')
+
+
+def decode_tips_cursor(cursor, sort_key):
+    try:
+        value, rtip_id = json.loads(text_type(base64.urlsafe_b64decode(cursor.encode()), 'utf-8'))
+        if isinstance(TIPS_SORT_KEYS[sort_key].type, DateTime):
+            value = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f')
+    except Exception:
+        raise errors.InputValidationError('Invalid cursor')
+
+    return value, rtip_id
+
+
+def db_get_receivertip_list(session, tid, receiver_id, language, filters=None, sort='creation_date', limit=None, cursor=None):
+    """
+    Serialize the list of the tips of a receiver
+
+    :param filters: a dictionary of conditions on status, substatus,
+                    context_id, label, min_score, max_score, date_from, date_to
+    :param sort: the key used to sort the tips, prefixed by '-' for a
+                 descending order
+    :param limit: the maximum number of tips to be returned
+    :param cursor: the cursor returned by a previous invocation
+    :return: the tuple (tips, cursor) where cursor, if not None, allows
+             to fetch the next page of the list
+    """
+    filters = filters or {}
+    descending = sort.startswith('-')
+    sort_key = sort.lstrip('-')
+    sort_column = TIPS_SORT_KEYS[sort_key]
+
+    conditions = [models.ReceiverTip.receiver_id == receiver_id,
+                  models.InternalTip.id == models.ReceiverTip.internaltip_id,
+                  models.InternalTip.tid == tid]
+
+    if 'status' in filters:
+        conditions.append(models.InternalTip.status == filters['status'])
+
+    if 'substatus' in filters:
+        conditions.append(models.InternalTip.substatus == filters['substatus'])
+
+    if 'context_id' in filters:
+        conditions.append(models.InternalTip.context_id == filters['context_id'])
+
+    if 'label' in filters:
+        conditions.append(models.ReceiverTip.label == filters['label'])
+
+    if 'min_score' in filters:
+        conditions.append(models.InternalTip.total_score >= filters['min_score'])
+
+    if 'max_score' in filters:
+        conditions.append(models.InternalTip.total_score <= filters['max_score'])
+
+    if 'date_from' in filters:
+        conditions.append(models.InternalTip.creation_date >= filters['date_from'])
+
+    if 'date_to' in filters:
+        conditions.append(models.InternalTip.creation_date <= filters['date_to'])
+
+    if cursor is not None:
+        value, rtip_id = decode_tips_cursor(cursor, sort_key)
+        if descending:
+            conditions.append(or_(sort_column < value,
+                                  and_(sort_column == value, models.ReceiverTip.id < rtip_id)))
+        else:
+            conditions.append(or_(sort_column > value,
+                                  and_(sort_column == value, models.ReceiverTip.id > rtip_id)))
+
+    if descending:
+        order = [sort_column.desc(), models.ReceiverTip.id.desc()]
+    else:
+        order = [sort_column, models.ReceiverTip.id]
+
+    query = session.query(models.ReceiverTip, models.InternalTip).filter(*conditions).order_by(*order)
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    tips = query.all()
+
+    next_cursor = None
+    if limit is not None and len(tips) > limit:
+        tips = tips[:limit]
+        rtip, itip = tips[-1]
+        next_cursor = encode_tips_cursor(getattr(rtip if sort_key == 'last_access' else itip, sort_key), rtip.id)
+
+    if not tips:
+        return [], None
+
+    rtips_ids = [rtip.id for rtip, _ in tips]
+    itips_ids = [itip.id for _, itip in tips]
+
+    hash_by_itip = dict(session.query(models.InternalTipAnswers.internaltip_id,
+                                      models.InternalTipAnswers.questionnaire_hash)
+                               .filter(models.InternalTipAnswers.internaltip_id.in_(itips_ids)))
 
-    rtips = session.query(models.ReceiverTip).filter(models.ReceiverTip.receiver_id == receiver_id,
-                                                     models.ReceiverTip.internaltip_id == models.InternalTip.id,
-                                                     models.InternalTip.tid == tid)
-
-    itips_ids = [rtip.internaltip_id for rtip in rtips]
-
-    if not itips_ids:
-        return []
-
-    itips_by_id = {}
-    aqs_by_itip = {}
-    comments_by_itip = {}
-    internalfiles_by_itip = {}
-    messages_by_rtip = {}
-
-    for itip, archivedschema in session.query(models.InternalTip, models.ArchivedSchema) \
-                                       .filter(models.InternalTip.id.in_(itips_ids),
-                                               models.ArchivedSchema.hash == models.InternalTipAnswers.questionnaire_hash,
-                                               models.InternalTipAnswers.internaltip_id == models.InternalTip.id,
-                                               models.InternalTip.tid == tid):
-        itips_by_id[itip.id] = itip
-        aqs_by_itip[itip.id] = archivedschema
-
-    result = session.query(models.ReceiverTip.id, func.count(distinct(models.Message.id))) \
-                    .filter(models.ReceiverTip.receiver_id == receiver_id,
-                            models.ReceiverTip.id == models.Message.receivertip_id,
-                            models.InternalTip.id == models.ReceiverTip.internaltip_id).group_by(models.ReceiverTip.id)
-    for rtip_id, count in result:
-        messages_by_rtip[rtip_id] = count
-
-    result = session.query(models.InternalTip.id, func.count(distinct(models.Comment.id))) \
-                    .filter(models.Comment.internaltip_id == models.InternalTip.id,
-                            models.InternalTip.id.in_(itips_ids)).group_by(models.InternalTip.id)
-    for itip_id, count in result:
-        comments_by_itip[itip_id] = count
-
-    result = session.query(models.InternalTip.id, func.count(distinct(models.InternalFile.id))) \
-                    .filter(models.InternalFile.internaltip_id == models.InternalTip.id,
-                            models.InternalTip.id.in_(itips_ids)).group_by(models.InternalTip.id)
-    for itip_id, count in result:
-        internalfiles_by_itip[itip_id] = count
-
-    for rtip in rtips:
-        internaltip = itips_by_id[rtip.internaltip_id]
-        archivedschema = aqs_by_itip[rtip.internaltip_id]
+    # The localized preview schemas are shared among all the tips using the same questionnaire
+    preview_schemas = {}
+    for questionnaire_hash, preview in session.query(models.ArchivedSchema.hash, models.ArchivedSchema.preview) \
+                                              .filter(models.ArchivedSchema.hash.in_(set(hash_by_itip.values()))):
+        preview_schemas[questionnaire_hash] = db_serialize_archived_preview_schema(preview, language)
 
+    messages_by_rtip = dict(session.query(models.Message.receivertip_id, func.count(models.Message.id))
+                                   .filter(models.Message.receivertip_id.in_(rtips_ids))
+                                   .group_by(models.Message.receivertip_id))
+
+    comments_by_itip = dict(session.query(models.Comment.internaltip_id, func.count(models.Comment.id))
+                                   .filter(models.Comment.internaltip_id.in_(itips_ids))
+                                   .group_by(models.Comment.internaltip_id))
+
+    internalfiles_by_itip = dict(session.query(models.InternalFile.internaltip_id, func.count(models.InternalFile.id))
+                                        .filter(models.InternalFile.internaltip_id.in_(itips_ids))
+                                        .group_by(models.InternalFile.internaltip_id))
+
+    rtip_summary_list = []
+
+    for rtip, internaltip in tips:
         rtip_summary_list.append({
             'id': rtip.id,
             'creation_date': datetime_to_ISO8601(internaltip.creation_date),
@@ -113,7 +204,7 @@ def get_receivertip_list(session, tid, receiver_id, language):
             'comment_count': comments_by_itip.get(internaltip.id, 0),
             'message_count': messages_by_rtip.get(rtip.id, 0),
             'https': internaltip.https,
-            'preview_schema': db_serialize_archived_preview_schema(archivedschema.preview, language),
+            'preview_schema': preview_schemas.get(hash_by_itip.get(internaltip.id), []),
             'preview': internaltip.preview,
             'total_score': internaltip.total_score,
             'label': rtip.label,
@@ -121,29 +212,73 @@ def get_receivertip_list(session, tid, receiver_id, language):
             'substatus': internaltip.substatus
         })
 
-    return rtip_summary_list
+    return rtip_summary_list, next_cursor
+
+
+@transact
+def get_receivertip_list(session, tid, receiver_id, language):
+    return db_get_receivertip_list(session, tid, receiver_id, language)[0]
+
+
+@transact
+def get_receivertip_page(session, tid, receiver_id, language, filters, sort, limit, cursor):
+    return db_get_receivertip_list(session, tid, receiver_id, language, filters, sort, limit, cursor)
 
 
 @transact
-def perform_tips_operation(session, tid, receiver_id, operation, rtips_ids):
+def perform_tips_operation(session, tid, receiver_id, operation, args, rtips_ids):
+    """
+    Apply an operation to a set of tips with a constant number of statements
+
+    :return: a dictionary reporting for each of the requested tips if the operation
+             has been applied ('ok') or if the tip is not accessible ('not_found')
+    """
     receiver = models.db_get(session, models.User, models.User.id == receiver_id)
 
-    can_postpone_expiration = State.tenant_cache[tid].can_postpone_expiration or receiver.can_postpone_expiration
-    can_delete_submission = State.tenant_cache[tid].can_delete_submission or receiver.can_delete_submission
+    if operation == 'postpone' and not (State.tenant_cache[tid].can_postpone_expiration or
+                                        receiver.can_postpone_expiration):
+        raise errors.ForbiddenOperation
 
-    for itip in session.query(models.InternalTip) \
-                       .filter(models.ReceiverTip.receiver_id == receiver_id,
-                               models.ReceiverTip.id.in_(rtips_ids),
-                               models.InternalTip.id == models.ReceiverTip.internaltip_id,
-                               models.InternalTip.tid == tid):
-        if operation == 'postpone' and can_postpone_expiration:
-            db_postpone_expiration_date(session, tid, itip)
+    if operation == 'delete' and not (State.tenant_cache[tid].can_delete_submission or
+                                      receiver.can_delete_submission):
+        raise errors.ForbiddenOperation
 
-        elif operation == 'delete' and can_delete_submission:
-            db_delete_itip(session, itip)
+    if operation == 'update_status':
+        models.db_get(session, models.SubmissionStatus,
+                      models.SubmissionStatus.id == args['status'],
+                      models.SubmissionStatus.tid == tid)
 
-        else:
-            raise errors.ForbiddenOperation
+        if args['substatus']:
+            models.db_get(session, models.SubmissionSubStatus,
+                          models.SubmissionSubStatus.id == args['substatus'],
+                          models.SubmissionSubStatus.submissionstatus_id == args['status'])
+
+    rtips = {}
+    if rtips_ids:
+        rtips = dict(session.query(models.ReceiverTip.id, models.ReceiverTip.internaltip_id)
+                            .filter(models.ReceiverTip.receiver_id == receiver_id,
+                                    models.ReceiverTip.id.in_(rtips_ids),
+                                    models.InternalTip.id == models.ReceiverTip.internaltip_id,
+                                    models.InternalTip.tid == tid))
+
+    itips_ids = list(rtips.values())
+
+    if operation == 'postpone':
+        db_postpone_expiration_dates(session, tid, itips_ids)
+
+    elif operation == 'delete':
+        if itips_ids:
+            db_delete_itips(session, itips_ids)
+
+    elif operation == 'update_status':
+        db_update_submission_statuses(session, receiver_id, itips_ids, args['status'], args['substatus'])
+
+    elif operation == 'update_label' and rtips:
+        session.query(models.ReceiverTip) \
+               .filter(models.ReceiverTip.id.in_(list(rtips))) \
+               .update({'label': args['value']}, synchronize_session=False)
+
+    return {rtip_id: u'ok' if rtip_id in rtips else u'not_found' for rtip_id in rtips_ids}
 
 
 class ReceiverInstance(BaseHandler):
@@ -174,29 +309,101 @@ class TipsCollection(BaseHandler):
     """
     This interface return the summary list of the Tips available for the authenticated Receiver
     GET /tips
+
+    The list could be filtered, sorted and paginated with the query arguments:
+        - status, substatus, context_id, label, min_score, max_score,
+          date_from, date_to
+        - sort: one of the TIPS_SORT_KEYS, prefixed by '-' for a descending order
+        - limit: the size of the page
+        - cursor: the value of the X-Next-Cursor header of the previous page
     """
     check_roles = 'receiver'
 
+    @inlineCallbacks
     def get(self):
-        return get_receivertip_list(self.request.tid,
-                                    self.current_user.user_id,
-                                    self.request.language)
+        filters = {}
+        for key, parser in [('status', text_type),
+                            ('substatus', text_type),
+                            ('context_id', text_type),
+                            ('label', text_type),
+                            ('min_score', int),
+                            ('max_score', int),
+                            ('date_from', ISO8601_to_datetime),
+                            ('date_to', ISO8601_to_datetime)]:
+            value = self.get_argument(key, parser)
+            if value is not None:
+                filters[key] = value
+
+        sort = self.get_argument('sort') or 'creation_date'
+        if sort.lstrip('-') not in TIPS_SORT_KEYS:
+            raise errors.InputValidationError('Invalid argument sort')
+
+        limit = self.get_argument('limit', int)
+        if limit is not None and not 0 < limit <= TIPS_PAGE_MAX_SIZE:
+            raise errors.InputValidationError('Invalid argument limit')
+
+        tips, cursor = yield get_receivertip_page(self.request.tid,
+                                                  self.current_user.user_id,
+                                                  self.request.language,
+                                                  filters,
+                                                  sort,
+                                                  limit,
+                                                  self.get_argument('cursor'))
+
+        if cursor is not None:
+            self.request.setHeader(b'X-Next-Cursor', cursor.encode())
+
+        returnValue(tips)
 
 
 class TipsOperations(BaseHandler):
     """
-    This interface receive some operation (postpone or delete) and a list of
-    tips to apply.
+    This interface receive some operation (postpone, delete, update_status,
+    update_label or export) and a list of tips to apply.
     """
     check_roles = 'receiver'
+    handler_exec_time_threshold = 3600
+
+    # The validators of the arguments of each of the operations
+    operations = {
+        'postpone': None,
+        'delete': None,
+        'export': None,
+        'update_status': {'status': text_type, 'substatus': text_type},
+        'update_label': {'value': text_type}
+    }
 
     def put(self):
-        request = self.validate_message(self.request.content.read(), requests.ReceiverOperationDesc)
+        content = self.request.content.read()
 
-        if request['operation'] not in ['postpone', 'delete']:
+        request = self.validate_message(content, requests.ReceiverOperationDesc)
+
+        if request['operation'] not in self.operations:
             raise errors.ForbiddenOperation
 
+        if request['operation'] == 'export':
+            return self.export(request['rtips'])
+
+        args = {}
+        if self.operations[request['operation']] is not None:
+            request = self.validate_message(content, requests.ReceiverOperationWithArgsDesc)
+            self.validate_jmessage(request['args'], self.operations[request['operation']])
+            args = request['args']
+
         return perform_tips_operation(self.request.tid,
                                       self.current_user.user_id,
                                       request['operation'],
+                                      args,
                                       request['rtips'])
+
+    @inlineCallbacks
+    def export(self, rtips_ids):
+        files, tip_exports = yield get_tips_export(self.request.tid,
+                                                   self.current_user.user_id,
+                                                   rtips_ids,
+                                                   self.request.language)
+
+        for tip_export in tip_exports:
+            files.extend(prepare_tip_export_files(tip_export))
+
+        yield stream_export(self, self.current_user.cc, files, b'submissions.zip')
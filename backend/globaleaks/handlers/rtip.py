@@ -5,6 +5,7 @@ import base64
 import os
 
 from six import text_type
+from sqlalchemy.sql.expression import and_, func, or_
 from twisted.internet.threads import deferToThread
 from twisted.internet.defer import inlineCallbacks, returnValue
 
@@ -13,10 +14,11 @@ from globaleaks.handlers.admin.context import admin_serialize_context
 from globaleaks.handlers.admin.node import db_admin_serialize_node
 from globaleaks.handlers.admin.notification import db_get_notification
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.handlers.custodian import serialize_identityaccessrequest
-from globaleaks.handlers.file import db_mark_file_for_secure_deletion
+from globaleaks.handlers.custodian import db_prepare_identityaccessrequests_serialization, \
+    serialize_identityaccessrequest
+from globaleaks.handlers.file import db_mark_file_for_secure_deletion, db_mark_files_for_secure_deletion
 from globaleaks.handlers.operation import OperationHandler
-from globaleaks.handlers.submission import serialize_usertip, decrypt_tip
+from globaleaks.handlers.submission import serialize_usertip, decrypt_tip, decrypt_tip_history
 from globaleaks.handlers.user import user_serialize_user
 from globaleaks.models import serializers
 from globaleaks.orm import transact
@@ -28,6 +30,11 @@ from globaleaks.utils.fs import directory_traversal_check
 from globaleaks.utils.log import log
 from globaleaks.utils.templating import Templating
 from globaleaks.utils.utility import get_expiration, datetime_now, datetime_never, datetime_to_ISO8601
+from globaleaks.utils.worksignals import db_emit_signals
+
+
+# The maximum number of comments or messages that can be requested at once
+TIP_HISTORY_PAGE_MAX_SIZE = 1000
 
 
 def db_update_submission_status(session, user_id, itip, submission_status_id, submission_substatus_id):
@@ -43,10 +50,79 @@ def db_update_submission_status(session, user_id, itip, submission_status_id, su
     session.add(submission_status_change)
 
 
-def receiver_serialize_rfile(session, rfile):
-    ifile = session.query(models.InternalFile) \
-                   .filter(models.InternalFile.id == models.ReceiverFile.internalfile_id,
-                           models.ReceiverFile.id == rfile.id).one()
+def db_update_submission_statuses(session, user_id, itips_ids, submission_status_id, submission_substatus_id):
+    if not itips_ids:
+        return
+
+    session.query(models.InternalTip) \
+           .filter(models.InternalTip.id.in_(itips_ids)) \
+           .update({'status': submission_status_id,
+                    'substatus': submission_substatus_id or None}, synchronize_session=False)
+
+    session.execute(models.SubmissionStatusChange.__table__.insert(),
+                    [{'internaltip_id': itip_id,
+                      'status': submission_status_id,
+                      'substatus': submission_substatus_id or None,
+                      'changed_by': user_id} for itip_id in itips_ids])
+
+
+def db_prepare_rfiles_serialization(session, rfiles):
+    data = {'ifiles': {}}
+
+    ifiles_ids = set(rfile.internalfile_id for rfile in rfiles)
+
+    if ifiles_ids:
+        for ifile in session.query(models.InternalFile).filter(models.InternalFile.id.in_(ifiles_ids)):
+            data['ifiles'][ifile.id] = ifile
+
+    return data
+
+
+def db_prepare_wbfiles_serialization(session, wbfiles):
+    data = {'receivers': {}}
+
+    rtips_ids = set(wbfile.receivertip_id for wbfile in wbfiles)
+
+    if rtips_ids:
+        for rtip_id, receiver_id in session.query(models.ReceiverTip.id, models.ReceiverTip.receiver_id) \
+                                           .filter(models.ReceiverTip.id.in_(rtips_ids)):
+            data['receivers'][rtip_id] = receiver_id
+
+    return data
+
+
+def db_prepare_comments_serialization(session, comments):
+    data = {'authors': {}}
+
+    users_ids = set(comment.author_id for comment in comments if comment.author_id is not None)
+
+    if users_ids:
+        for user_id, user_name in session.query(models.User.id, models.User.name) \
+                                         .filter(models.User.id.in_(users_ids)):
+            data['authors'][user_id] = user_name
+
+    return data
+
+
+def db_prepare_messages_serialization(session, messages):
+    data = {'receivers': {}}
+
+    rtips_ids = set(message.receivertip_id for message in messages)
+
+    if rtips_ids:
+        for rtip_id, user_id, user_name in session.query(models.ReceiverTip.id, models.User.id, models.User.name) \
+                                                  .filter(models.ReceiverTip.id.in_(rtips_ids),
+                                                          models.User.id == models.ReceiverTip.receiver_id):
+            data['receivers'][rtip_id] = (user_id, user_name)
+
+    return data
+
+
+def receiver_serialize_rfile(session, rfile, data=None):
+    if data is None:
+        data = db_prepare_rfiles_serialization(session, [rfile])
+
+    ifile = data['ifiles'][rfile.internalfile_id]
 
     if rfile.status == 'unavailable':
         return {
@@ -75,8 +151,9 @@ def receiver_serialize_rfile(session, rfile):
     }
 
 
-def receiver_serialize_wbfile(session, wbfile):
-    rtip = models.db_get(session, models.ReceiverTip, models.ReceiverTip.id == wbfile.receivertip_id)
+def receiver_serialize_wbfile(session, wbfile, data=None):
+    if data is None:
+        data = db_prepare_wbfiles_serialization(session, [wbfile])
 
     return {
         'id': wbfile.id,
@@ -86,21 +163,20 @@ def receiver_serialize_wbfile(session, wbfile):
         'size': wbfile.size,
         'content_type': wbfile.content_type,
         'downloads': wbfile.downloads,
-        'author': rtip.receiver_id
+        'author': data['receivers'][wbfile.receivertip_id]
     }
 
 
-def serialize_comment(session, comment):
+def serialize_comment(session, comment, data=None):
+    if data is None:
+        data = db_prepare_comments_serialization(session, [comment])
+
     author = 'Recipient'
 
     if comment.type == 'whistleblower':
         author = 'Whistleblower'
-    elif comment.author_id is not None:
-        _author = session.query(models.User) \
-                         .filter(models.User.id == comment.author_id).one_or_none()
-
-        if _author is not None:
-            author = _author.name
+    elif comment.author_id in data['authors']:
+        author = data['authors'][comment.author_id]
 
     return {
         'id': comment.id,
@@ -111,16 +187,16 @@ def serialize_comment(session, comment):
     }
 
 
-def serialize_message(session, message):
-    receiver_involved = session.query(models.User) \
-                               .filter(models.User.id == models.ReceiverTip.receiver_id,
-                                       models.ReceiverTip.id == models.Message.receivertip_id,
-                                       models.Message.id == message.id).one()
+def serialize_message(session, message, data=None):
+    if data is None:
+        data = db_prepare_messages_serialization(session, [message])
+
+    receiver_id, receiver_name = data['receivers'][message.receivertip_id]
 
     if message.type == 'whistleblower':
         author = 'Whistleblower'
     else:
-        author = receiver_involved.name
+        author = receiver_name
 
     return {
         'id': message.id,
@@ -128,11 +204,16 @@ def serialize_message(session, message):
         'type': message.type,
         'creation_date': datetime_to_ISO8601(message.creation_date),
         'content': message.content,
-        'receiver_involved': receiver_involved.id
+        'receiver_involved': receiver_id
     }
 
 
-def serialize_rtip(session, rtip, itip, language):
+def serialize_rtip(session, rtip, itip, language, limit=None):
+    """
+    Serialize a receiver tip
+
+    :param limit: if set only the latest comments and messages are included
+    """
     user_id = rtip.receiver_id
 
     ret = serialize_usertip(session, rtip, itip, language)
@@ -143,8 +224,12 @@ def serialize_rtip(session, rtip, itip, language):
     ret['id'] = rtip.id
     ret['receiver_id'] = user_id
     ret['label'] = rtip.label
-    ret['comments'] = db_get_itip_comment_list(session, itip.id)
-    ret['messages'] = db_get_itip_message_list(session, rtip.id)
+    ret['comments'] = db_get_itip_comment_list(session, itip.id, limit=limit)
+    ret['messages'] = db_get_itip_message_list(session, rtip.id, limit=limit)
+    ret['comments_count'] = db_get_tip_history_count(session, ret['comments'], limit, models.Comment,
+                                                     models.Comment.internaltip_id == itip.id)
+    ret['messages_count'] = db_get_tip_history_count(session, ret['messages'], limit, models.Message,
+                                                     models.Message.receivertip_id == rtip.id)
     ret['rfiles'] = db_receiver_get_rfile_list(session, rtip.id)
     ret['wbfiles'] = db_receiver_get_wbfile_list(session, itip.id)
     ret['iars'] = db_get_rtip_identityaccessrequest_list(session, rtip.id)
@@ -185,23 +270,26 @@ def db_access_wbfile(session, tid, user_id, wbfile_id):
 def db_receiver_get_rfile_list(session, rtip_id):
     rfiles = session.query(models.ReceiverFile) \
                     .filter(models.ReceiverFile.receivertip_id == models.ReceiverTip.id,
-                            models.ReceiverTip.id == rtip_id)
+                            models.ReceiverTip.id == rtip_id).all()
+
+    data = db_prepare_rfiles_serialization(session, rfiles)
 
-    return [receiver_serialize_rfile(session, rfile) for rfile in rfiles]
+    return [receiver_serialize_rfile(session, rfile, data) for rfile in rfiles]
 
 
 def db_receiver_get_wbfile_list(session, itip_id):
-    rtips = session.query(models.ReceiverTip) \
-                   .filter(models.ReceiverTip.internaltip_id == itip_id)
+    data = {'receivers': {}}
 
-    rtips_ids = [rt.id for rt in rtips]
+    for rtip_id, receiver_id in session.query(models.ReceiverTip.id, models.ReceiverTip.receiver_id) \
+                                       .filter(models.ReceiverTip.internaltip_id == itip_id):
+        data['receivers'][rtip_id] = receiver_id
 
     wbfiles = []
-    if rtips_ids:
+    if data['receivers']:
         wbfiles = session.query(models.WhistleblowerFile) \
-                         .filter(models.WhistleblowerFile.receivertip_id.in_(rtips_ids))
+                         .filter(models.WhistleblowerFile.receivertip_id.in_(list(data['receivers'])))
 
-    return [receiver_serialize_wbfile(session, wbfile) for wbfile in wbfiles]
+    return [receiver_serialize_wbfile(session, wbfile, data) for wbfile in wbfiles]
 
 
 @transact
@@ -223,6 +311,8 @@ def register_wbfile_on_db(session, tid, rtip_id, uploaded_file):
 
     session.add(new_file)
 
+    db_emit_signals(session, 'delivery')
+
     return serializers.serialize_wbfile(session, tid, new_file)
 
 
@@ -244,7 +334,7 @@ def db_set_itip_open_if_new(session, tid, user_id, itip):
         db_update_submission_status(session, user_id, itip, open_status_id, '')
 
 
-def db_get_rtip(session, tid, user_id, rtip_id, language):
+def db_get_rtip(session, tid, user_id, rtip_id, language, limit=None):
     rtip, itip = db_access_rtip(session, tid, user_id, rtip_id)
 
     db_set_itip_open_if_new(session, tid, user_id, itip)
@@ -252,7 +342,7 @@ def db_get_rtip(session, tid, user_id, rtip_id, language):
     rtip.access_counter += 1
     rtip.last_access = datetime_now()
 
-    return serialize_rtip(session, rtip, itip, language), rtip.crypto_tip_prv_key
+    return serialize_rtip(session, rtip, itip, language, limit), rtip.crypto_tip_prv_key
 
 
 def db_delete_itips_files(session, itips_ids):
@@ -275,8 +365,7 @@ def db_delete_itips_files(session, itips_ids):
                                      .filter(models.ReceiverFile.internalfile_id.in_(ifiles_ids)):
             files_names.add(rfile_filename[0])
 
-    for filename in files_names:
-        db_mark_file_for_secure_deletion(session, Settings.attachments_path, filename)
+    db_mark_files_for_secure_deletion(session, Settings.attachments_path, files_names)
 
 
 def db_delete_itips(session, itips_ids):
@@ -299,6 +388,28 @@ def db_postpone_expiration_date(session, tid, itip):
         itip.expiration_date = datetime_never()
 
 
+def db_postpone_expiration_dates(session, tid, itips_ids):
+    """
+    Postpone the expiration date of a set of tips with a statement for each
+    of the distinct times to live of the contexts involved
+    """
+    itips_by_ttl = {}
+
+    if itips_ids:
+        for itip_id, ttl in session.query(models.InternalTip.id, models.Context.tip_timetolive) \
+                                   .filter(models.InternalTip.id.in_(itips_ids),
+                                           models.Context.id == models.InternalTip.context_id,
+                                           models.Context.tid == tid):
+            itips_by_ttl.setdefault(ttl, []).append(itip_id)
+
+    for ttl, ids in itips_by_ttl.items():
+        expiration_date = get_expiration(ttl) if ttl > 0 else datetime_never()
+
+        session.query(models.InternalTip) \
+               .filter(models.InternalTip.id.in_(ids)) \
+               .update({'expiration_date': expiration_date}, synchronize_session=False)
+
+
 @transact
 def delete_rtip(session, tid, user_id, rtip_id):
     """
@@ -356,12 +467,74 @@ def update_tip_submission_status(session, tid, user_id, rtip_id, submission_stat
 
 
 @transact
-def get_rtip(session, tid, user_id, rtip_id, language):
-    return db_get_rtip(session, tid, user_id, rtip_id, language)
+def get_rtip(session, tid, user_id, rtip_id, language, limit=None):
+    return db_get_rtip(session, tid, user_id, rtip_id, language, limit)
+
+
+def db_get_tip_history(session, model, conditions, since=None, before=None, limit=None):
+    """
+    Return the comments or the messages matching the conditions ordered
+    by creation date
+
+    :param since: the id of an item; only the items following it are returned
+    :param before: the id of an item; only the items preceding it are returned
+    :param limit: the maximum number of items to be returned; unless since
+                  is set, the most recent ones are returned
+    """
+    query = session.query(model).filter(*conditions)
+
+    for item_id, following in [(since, True), (before, False)]:
+        if item_id is None:
+            continue
+
+        item = session.query(model.creation_date).filter(model.id == item_id, *conditions).one_or_none()
+        if item is None:
+            raise errors.InputValidationError('Invalid argument %s' % ('since' if following else 'before'))
+
+        if following:
+            query = query.filter(or_(model.creation_date > item[0],
+                                     and_(model.creation_date == item[0], model.id > item_id)))
+        else:
+            query = query.filter(or_(model.creation_date < item[0],
+                                     and_(model.creation_date == item[0], model.id < item_id)))
+
+    if limit is not None and since is None:
+        items = query.order_by(model.creation_date.desc(), model.id.desc()).limit(limit).all()
+        items.reverse()
+        return items
+
+    return query.order_by(model.creation_date, model.id).limit(limit).all()
+
+
+def db_get_tip_history_count(session, items, limit, model, *conditions):
+    if limit is None:
+        return len(items)
+
+    return session.query(func.count(model.id)).filter(*conditions).scalar()
+
+
+@transact
+def get_comment_list(session, tid, user_id, rtip_id, since, before, limit):
+    rtip, itip = db_access_rtip(session, tid, user_id, rtip_id)
+
+    return db_get_itip_comment_list(session, itip.id, since, before, limit), rtip.crypto_tip_prv_key
+
+
+@transact
+def get_message_list(session, tid, user_id, rtip_id, since, before, limit):
+    rtip, _ = db_access_rtip(session, tid, user_id, rtip_id)
+
+    return db_get_itip_message_list(session, rtip.id, since, before, limit), rtip.crypto_tip_prv_key
 
 
-def db_get_itip_comment_list(session, itip_id):
-    return [serialize_comment(session, comment) for comment in session.query(models.Comment).filter(models.Comment.internaltip_id == itip_id)]
+def db_get_itip_comment_list(session, itip_id, since=None, before=None, limit=None):
+    comments = db_get_tip_history(session, models.Comment,
+                                  [models.Comment.internaltip_id == itip_id],
+                                  since, before, limit)
+
+    data = db_prepare_comments_serialization(session, comments)
+
+    return [serialize_comment(session, comment, data) for comment in comments]
 
 
 def db_create_identityaccessrequest_notifications(session, tid, itip, rtip, iar):
@@ -394,6 +567,8 @@ def db_create_identityaccessrequest_notifications(session, tid, itip, rtip, iar)
             'tid': tid
         }))
 
+        db_emit_signals(session, 'notification')
+
 
 @transact
 def create_identityaccessrequest(session, tid, user_id, rtip_id, request):
@@ -429,18 +604,30 @@ def create_comment(session, tid, user_id, user_key, rtip_id, content):
     session.add(comment)
     session.flush()
 
+    db_emit_signals(session, 'notification')
+
     ret = serialize_comment(session, comment)
     ret['content'] = content
 
     return ret
 
 
-def db_get_itip_message_list(session, rtip_id):
-    return [serialize_message(session, message) for message in session.query(models.Message).filter(models.Message.receivertip_id == rtip_id)]
+def db_get_itip_message_list(session, rtip_id, since=None, before=None, limit=None):
+    messages = db_get_tip_history(session, models.Message,
+                                  [models.Message.receivertip_id == rtip_id],
+                                  since, before, limit)
+
+    data = db_prepare_messages_serialization(session, messages)
+
+    return [serialize_message(session, message, data) for message in messages]
 
 
 def db_get_rtip_identityaccessrequest_list(session, rtip_id):
-    return [serialize_identityaccessrequest(session, iar) for iar in session.query(models.IdentityAccessRequest).filter(models.IdentityAccessRequest.receivertip_id == rtip_id)]
+    iars = session.query(models.IdentityAccessRequest).filter(models.IdentityAccessRequest.receivertip_id == rtip_id).all()
+
+    data = db_prepare_identityaccessrequests_serialization(session, iars)
+
+    return [serialize_identityaccessrequest(session, iar, data) for iar in iars]
 
 
 @transact
@@ -461,6 +648,8 @@ def create_message(session, tid, user_id, user_key, rtip_id, content):
     session.add(msg)
     session.flush()
 
+    db_emit_signals(session, 'notification')
+
     ret = serialize_message(session, msg)
     ret['content'] = content
     return ret
@@ -473,6 +662,14 @@ def delete_wbfile(session, tid, user_id, file_id):
     session.delete(wbfile)
 
 
+def get_history_limit(handler):
+    limit = handler.get_argument('limit', int)
+    if limit is not None and not 0 < limit <= TIP_HISTORY_PAGE_MAX_SIZE:
+        raise errors.InputValidationError('Invalid argument limit')
+
+    return limit
+
+
 class RTipInstance(OperationHandler):
     """
     This interface exposes the Receiver's Tip
@@ -481,7 +678,10 @@ class RTipInstance(OperationHandler):
 
     @inlineCallbacks
     def get(self, tip_id):
-        tip, crypto_tip_prv_key = yield get_rtip(self.request.tid, self.current_user.user_id, tip_id, self.request.language)
+        limit = get_history_limit(self)
+
+        tip, crypto_tip_prv_key = yield get_rtip(self.request.tid, self.current_user.user_id, tip_id,
+                                                 self.request.language, limit)
 
         if State.tenant_cache[self.request.tid].encryption and crypto_tip_prv_key:
             tip = yield deferToThread(decrypt_tip, self.current_user.cc, crypto_tip_prv_key, tip)
@@ -525,24 +725,63 @@ class RTipInstance(OperationHandler):
         return delete_rtip(self.request.tid, self.current_user.user_id, tip_id)
 
 
-class RTipCommentCollection(BaseHandler):
+class TipHistoryCollection(BaseHandler):
+    """
+    Base class of the interfaces exposing the comments and the messages of a tip.
+
+    The history could be paginated and polled incrementally by means of the
+    optional arguments:
+      - since: the id of the last item known; only the following ones are returned
+      - before: the id of the first item known; only the preceding ones are returned
+      - limit: the maximum number of items returned
+    """
+    def get_history_arguments(self):
+        return self.get_argument('since'), self.get_argument('before'), get_history_limit(self)
+
+    @inlineCallbacks
+    def decrypt_history(self, history, crypto_tip_prv_key):
+        if State.tenant_cache[self.request.tid].encryption and crypto_tip_prv_key:
+            history = yield deferToThread(decrypt_tip_history, self.current_user.cc, crypto_tip_prv_key, history)
+
+        returnValue(history)
+
+
+class RTipCommentCollection(TipHistoryCollection):
     """
-    Interface use to write rtip comments
+    Interface use to read and write rtip comments
     """
     check_roles = 'receiver'
 
+    @inlineCallbacks
+    def get(self, tip_id):
+        comments, crypto_tip_prv_key = yield get_comment_list(self.request.tid, self.current_user.user_id, tip_id,
+                                                              *self.get_history_arguments())
+
+        comments = yield self.decrypt_history(comments, crypto_tip_prv_key)
+
+        returnValue(comments)
+
     def post(self, tip_id):
         request = self.validate_message(self.request.content.read(), requests.CommentDesc)
 
         return create_comment(self.request.tid, self.current_user.user_id, self.current_user.cc, tip_id, request['content'])
 
 
-class ReceiverMsgCollection(BaseHandler):
+class ReceiverMsgCollection(TipHistoryCollection):
     """
-    Interface use to write rtip messages
+    Interface use to read and write rtip messages
     """
     check_roles = 'receiver'
 
+    @inlineCallbacks
+    def get(self, tip_id):
+        messages, crypto_tip_prv_key = yield get_message_list(self.request.tid, self.current_user.user_id, tip_id,
+                                                              *self.get_history_arguments())
+
+        messages = yield self.decrypt_history(messages, crypto_tip_prv_key)
+
+        returnValue(messages)
+
     def post(self, tip_id):
         request = self.validate_message(self.request.content.read(), requests.CommentDesc)
 
@@ -12,6 +12,7 @@ from globaleaks.handlers.admin.questionnaire import db_get_questionnaire
 from globaleaks.handlers.admin.submission_statuses import db_get_id_for_system_status
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.models import get_localized_values
+from globaleaks.models.config import ConfigFactory
 from globaleaks.orm import transact
 from globaleaks.rest import errors, requests
 from globaleaks.state import State
@@ -19,24 +20,48 @@ from globaleaks.utils.crypto import sha256, GCE
 from globaleaks.utils.log import log
 from globaleaks.utils.utility import get_expiration, \
     datetime_never, datetime_to_ISO8601
+from globaleaks.utils.worksignals import db_emit_signals
+
+
+def decrypt_tip_values(tip_key, items):
+    """
+    Decrypt in a batch the values referenced by a list of tuples
+    (object, key, json encoded)
+    """
+    values = GCE.asymmetric_decrypt_batch(tip_key, [base64.b64decode(obj[key].encode()) for obj, key, _ in items])
+
+    for (obj, key, is_json), value in zip(items, values):
+        value = value.decode()
+        obj[key] = json.loads(value) if is_json else value
 
 
 def decrypt_tip(user_key, tip_prv_key, tip):
     tip_key = GCE.asymmetric_decrypt(user_key, tip_prv_key)
 
-    for questionnaire in tip['questionnaires']:
-        questionnaire['answers'] = json.loads(GCE.asymmetric_decrypt(tip_key, base64.b64decode(questionnaire['answers'].encode())).decode())
+    items = [(questionnaire, 'answers', True) for questionnaire in tip['questionnaires']]
 
     for k in ['whistleblower_identity']:
         if k in tip['data'] and tip['data'][k]['encrypted'] and tip['data'][k]['value']:
-            tip['data'][k]['value'] = json.loads(GCE.asymmetric_decrypt(tip_key, base64.b64decode(tip['data'][k]['value'].encode())).decode())
+            items.append((tip['data'][k], 'value', True))
+
+    items.extend((x, 'content', False) for x in tip['comments'] + tip['messages'])
 
-    for x in tip['comments'] + tip['messages']:
-        x['content'] = GCE.asymmetric_decrypt(tip_key, base64.b64decode(x['content'].encode())).decode()
+    decrypt_tip_values(tip_key, items)
 
     return tip
 
 
+def decrypt_tip_history(user_key, tip_prv_key, history):
+    """
+    Decrypt a list of serialized comments or messages
+    """
+    tip_key = GCE.asymmetric_decrypt(user_key, tip_prv_key)
+
+    decrypt_tip_values(tip_key, [(x, 'content', False) for x in history])
+
+    return history
+
+
 def db_set_internaltip_answers(session, itip_id, questionnaire_hash, answers, encrypted):
     ita = session.query(models.InternalTipAnswers) \
                  .filter(models.InternalTipAnswers.internaltip_id == itip_id, models.InternalTipAnswers.questionnaire_hash == questionnaire_hash).one_or_none()
@@ -67,7 +92,7 @@ def db_set_internaltip_data(session, itip_id, key, value, encrypted):
 
 
 def db_assign_submission_progressive(session, tid):
-    counter = session.query(models.Config).filter(models.Config.tid == tid, models.Config.var_name == u'counter_submissions').one()
+    counter = ConfigFactory(session, tid).get_cfg(u'counter_submissions')
     counter.value += 1
     return counter.value
 
@@ -405,6 +430,8 @@ def db_create_submission(session, tid, request, token, client_using_tor):
 
         db_create_receivertip(session, user, itip, can_access_whistleblower_identity, _tip_key)
 
+    db_emit_signals(session, 'delivery', 'notification')
+
     return {'receipt': receipt}
 
 
@@ -33,6 +33,7 @@ class TokenCreate(BaseHandler):
             # Due to https://github.com/globaleaks/GlobaLeaks/issues/2088 the proof of work if currently
             # implemented only over Tor and HTTPS that are the production conditions.
             token.solved = True
+            self.state.tokens.persist(token.id)
 
         return token.serialize()
 
@@ -51,5 +52,6 @@ class TokenInstance(BaseHandler):
             raise errors.InvalidAuthentication
 
         token.update(request['answer'])
+        self.state.tokens.persist(token.id)
 
         return token.serialize()
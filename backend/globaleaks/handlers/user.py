@@ -9,8 +9,8 @@ from globaleaks.handlers.base import BaseHandler
 from globaleaks.models import get_localized_values
 from globaleaks.orm import transact
 from globaleaks.rest import errors, requests
+from globaleaks.sessions import Sessions
 from globaleaks.state import State
-from globaleaks.utils.pgp import PGPContext
 from globaleaks.utils.crypto import GCE, generateRandomKey
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now, datetime_null
 
@@ -24,9 +24,7 @@ def parse_pgp_options(user, request):
 
     k = None
     if not remove_key and pgp_key_public:
-        pgpctx = PGPContext(State.settings.tmp_path)
-
-        k = pgpctx.load_key(pgp_key_public)
+        k = State.pgp_keyring.load_key(pgp_key_public)
 
     if k is not None:
         user.pgp_key_public = pgp_key_public
@@ -234,10 +232,18 @@ class UserInstance(BaseHandler):
         returnValue(user)
 
 
+    @inlineCallbacks
     def put(self):
         request = self.validate_message(self.request.content.read(), requests.UserUserDesc)
 
-        return update_user_settings(self.request.tid,
-                                    self.current_user,
-                                    request,
-                                    self.request.language)
+        user = yield update_user_settings(self.request.tid,
+                                          self.current_user,
+                                          request,
+                                          self.request.language)
+
+        # The other sessions of the user are revoked on password change
+        if request['password']:
+            Sessions.revoke(self.request.tid, self.current_user.user_id, keep=self.current_user.id)
+            Sessions.persist(self.current_user.id)
+
+        returnValue(user)
@@ -8,7 +8,9 @@ from twisted.internet.defer import inlineCallbacks, returnValue
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.handlers.rtip import serialize_comment, serialize_message, db_get_itip_comment_list, WBFileHandler
+from globaleaks.handlers.rtip import serialize_comment, serialize_message, db_get_itip_comment_list, \
+    db_get_tip_history, db_get_tip_history_count, db_prepare_messages_serialization, \
+    db_prepare_wbfiles_serialization, TipHistoryCollection, WBFileHandler, get_history_limit
 from globaleaks.handlers.submission import serialize_usertip, \
     db_save_questionnaire_answers, decrypt_tip, \
     db_set_internaltip_answers, db_get_questionnaire, db_archive_questionnaire_schema, db_set_internaltip_data
@@ -18,6 +20,7 @@ from globaleaks.state import State
 from globaleaks.utils.crypto import GCE
 from globaleaks.utils.log import log
 from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601
+from globaleaks.utils.worksignals import db_emit_signals
 
 
 def wb_serialize_ifile(ifile):
@@ -30,9 +33,9 @@ def wb_serialize_ifile(ifile):
     }
 
 
-def wb_serialize_wbfile(session, wbfile):
-    receiver_id = session.query(models.ReceiverTip.receiver_id) \
-                         .filter(models.ReceiverTip.id == wbfile.receivertip_id).one()[0]
+def wb_serialize_wbfile(session, wbfile, data=None):
+    if data is None:
+        data = db_prepare_wbfiles_serialization(session, [wbfile])
 
     return {
         'id': wbfile.id,
@@ -41,7 +44,7 @@ def wb_serialize_wbfile(session, wbfile):
         'description': wbfile.description,
         'size': wbfile.size,
         'content_type': wbfile.content_type,
-        'author': receiver_id
+        'author': data['receivers'][wbfile.receivertip_id]
     }
 
 
@@ -54,12 +57,14 @@ def db_get_rfile_list(session, itip_id):
 def db_get_wbfile_list(session, itip_id):
     wbfiles = session.query(models.WhistleblowerFile) \
                      .filter(models.WhistleblowerFile.receivertip_id == models.ReceiverTip.id,
-                             models.ReceiverTip.internaltip_id == itip_id)
+                             models.ReceiverTip.internaltip_id == itip_id).all()
 
-    return [wb_serialize_wbfile(session, wbfile) for wbfile in wbfiles]
+    data = db_prepare_wbfiles_serialization(session, wbfiles)
 
+    return [wb_serialize_wbfile(session, wbfile, data) for wbfile in wbfiles]
 
-def db_get_wbtip(session, itip_id, language):
+
+def db_get_wbtip(session, itip_id, language, limit=None):
     wbtip, itip = models.db_get(session,
                                 (models.WhistleblowerTip, models.InternalTip),
                                 models.WhistleblowerTip.id == models.InternalTip.id,
@@ -68,19 +73,55 @@ def db_get_wbtip(session, itip_id, language):
     itip.wb_access_counter += 1
     itip.wb_last_access = datetime_now()
 
-    return serialize_wbtip(session, wbtip, itip, language), wbtip.crypto_tip_prv_key
+    return serialize_wbtip(session, wbtip, itip, language, limit), wbtip.crypto_tip_prv_key
 
 
 @transact
-def get_wbtip(session, itip_id, language):
-    return db_get_wbtip(session, itip_id, language)
+def get_wbtip(session, itip_id, language, limit=None):
+    return db_get_wbtip(session, itip_id, language, limit)
+
+
+def db_access_wbtip(session, tid, wbtip_id):
+    wbtip = session.query(models.WhistleblowerTip) \
+                   .filter(models.WhistleblowerTip.id == wbtip_id,
+                           models.InternalTip.id == models.WhistleblowerTip.id,
+                           models.InternalTip.tid == tid).one_or_none()
 
+    if wbtip is None:
+        raise errors.ModelNotFound(models.WhistleblowerTip)
+
+    return wbtip
+
+
+@transact
+def get_comment_list(session, tid, wbtip_id, since, before, limit):
+    wbtip = db_access_wbtip(session, tid, wbtip_id)
+
+    return db_get_itip_comment_list(session, wbtip.id, since, before, limit), wbtip.crypto_tip_prv_key
+
+
+@transact
+def get_message_list(session, tid, wbtip_id, receiver_id, since, before, limit):
+    wbtip = db_access_wbtip(session, tid, wbtip_id)
+
+    return db_get_itip_message_list(session, wbtip.id, since, before, limit, receiver_id), wbtip.crypto_tip_prv_key
+
+
+def serialize_wbtip(session, wbtip, itip, language, limit=None):
+    """
+    Serialize a whistleblower tip
 
-def serialize_wbtip(session, wbtip, itip, language):
+    :param limit: if set only the latest comments and messages are included
+    """
     ret = serialize_usertip(session, itip, itip, language)
 
-    ret['comments'] = db_get_itip_comment_list(session, itip.id)
-    ret['messages'] = db_get_itip_message_list(session, itip.id)
+    ret['comments'] = db_get_itip_comment_list(session, itip.id, limit=limit)
+    ret['messages'] = db_get_itip_message_list(session, itip.id, limit=limit)
+    ret['comments_count'] = db_get_tip_history_count(session, ret['comments'], limit, models.Comment,
+                                                     models.Comment.internaltip_id == itip.id)
+    ret['messages_count'] = db_get_tip_history_count(session, ret['messages'], limit, models.Message,
+                                                     models.Message.receivertip_id == models.ReceiverTip.id,
+                                                     models.ReceiverTip.internaltip_id == itip.id)
     ret['rfiles'] = db_get_rfile_list(session, itip.id)
     ret['wbfiles'] = db_get_wbfile_list(session, itip.id)
 
@@ -111,19 +152,26 @@ def create_comment(session, tid, wbtip_id, user_key, content):
     session.add(comment)
     session.flush()
 
+    db_emit_signals(session, 'notification')
+
     ret = serialize_comment(session, comment)
     ret['content'] = content
 
     return ret
 
 
-def db_get_itip_message_list(session, wbtip_id):
-    messages = session.query(models.Message) \
-                      .filter(models.Message.receivertip_id == models.ReceiverTip.id,
-                              models.ReceiverTip.internaltip_id == models.InternalTip.id,
-                              models.InternalTip.id == wbtip_id)
+def db_get_itip_message_list(session, wbtip_id, since=None, before=None, limit=None, receiver_id=None):
+    conditions = [models.Message.receivertip_id == models.ReceiverTip.id,
+                  models.ReceiverTip.internaltip_id == wbtip_id]
+
+    if receiver_id is not None:
+        conditions.append(models.ReceiverTip.receiver_id == receiver_id)
+
+    messages = db_get_tip_history(session, models.Message, conditions, since, before, limit)
 
-    return [serialize_message(session, message) for message in messages]
+    data = db_prepare_messages_serialization(session, messages)
+
+    return [serialize_message(session, message, data) for message in messages]
 
 
 @transact
@@ -152,6 +200,8 @@ def create_message(session, tid, wbtip_id, user_key, receiver_id, content):
     session.add(msg)
     session.flush()
 
+    db_emit_signals(session, 'notification')
+
     ret = serialize_message(session, msg)
     ret['content'] = content
 
@@ -208,7 +258,9 @@ class WBTipInstance(BaseHandler):
 
     @inlineCallbacks
     def get(self):
-        tip, crypto_tip_prv_key = yield get_wbtip(self.current_user.user_id, self.request.language)
+        limit = get_history_limit(self)
+
+        tip, crypto_tip_prv_key = yield get_wbtip(self.current_user.user_id, self.request.language, limit)
 
         if State.tenant_cache[self.request.tid].encryption and crypto_tip_prv_key:
             tip = yield deferToThread(decrypt_tip, self.current_user.cc, crypto_tip_prv_key, tip)
@@ -216,7 +268,7 @@ class WBTipInstance(BaseHandler):
         returnValue(tip)
 
 
-class WBTipCommentCollection(BaseHandler):
+class WBTipCommentCollection(TipHistoryCollection):
     """
     Interface use to write comments inside of a Tip, is not implemented as CRUD because we've not
     needs, at the moment, to delete/update comments once has been published. Comments is intended, now,
@@ -225,12 +277,21 @@ class WBTipCommentCollection(BaseHandler):
     """
     check_roles = 'whistleblower'
 
+    @inlineCallbacks
+    def get(self):
+        comments, crypto_tip_prv_key = yield get_comment_list(self.request.tid, self.current_user.user_id,
+                                                              *self.get_history_arguments())
+
+        comments = yield self.decrypt_history(comments, crypto_tip_prv_key)
+
+        returnValue(comments)
+
     def post(self):
         request = self.validate_message(self.request.content.read(), requests.CommentDesc)
         return create_comment(self.request.tid, self.current_user.user_id, self.current_user.cc, request['content'])
 
 
-class WBTipMessageCollection(BaseHandler):
+class WBTipMessageCollection(TipHistoryCollection):
     """
     This interface return the lists of the private messages exchanged between
     whistleblower and the specified receiver requested in GET
@@ -239,6 +300,15 @@ class WBTipMessageCollection(BaseHandler):
     """
     check_roles = 'whistleblower'
 
+    @inlineCallbacks
+    def get(self, receiver_id):
+        messages, crypto_tip_prv_key = yield get_message_list(self.request.tid, self.current_user.user_id, receiver_id,
+                                                              *self.get_history_arguments())
+
+        messages = yield self.decrypt_history(messages, crypto_tip_prv_key)
+
+        returnValue(messages)
+
     def post(self, receiver_id):
         request = self.validate_message(self.request.content.read(), requests.CommentDesc)
 
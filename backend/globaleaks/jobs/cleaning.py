@@ -1,13 +1,16 @@
 # -*- coding: utf-8
 # Implementation of the daily operations.
 import fnmatch
+import json
 import os
+import time
 from datetime import datetime, timedelta
 
 from sqlalchemy import not_
 from sqlalchemy.sql.expression import func
 
 from twisted.internet.defer import inlineCallbacks
+from twisted.internet.threads import deferToThread
 
 from globaleaks import models
 from globaleaks.handlers.admin.node import db_admin_serialize_node
@@ -16,101 +19,150 @@ from globaleaks.handlers.file import db_mark_file_for_secure_deletion
 from globaleaks.handlers.rtip import db_delete_itips
 from globaleaks.handlers.user import user_serialize_user
 from globaleaks.jobs.job import DailyJob
+from globaleaks.models.config import ConfigFactory
 from globaleaks.orm import transact
-from globaleaks.utils.fs import overwrite_and_remove
+from globaleaks.utils.fs import overwrite_and_remove_files
+from globaleaks.utils.log import log
 from globaleaks.utils.templating import Templating
 from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601, is_expired
+from globaleaks.utils.worksignals import db_emit_signals
 
 
 __all__ = ['Cleaning']
 
 
+def db_get_cleaning_cursor(session):
+    cursor = ConfigFactory(session, 1).get_val(u'cleaning_cursor')
+    return json.loads(cursor) if cursor else None
+
+
+def db_set_cleaning_cursor(session, cursor):
+    ConfigFactory(session, 1).set_val(u'cleaning_cursor', json.dumps(cursor) if cursor else u'')
+
+
 class Cleaning(DailyJob):
+    """
+    The cleaning is split in phases executed for each tenant or once for the
+    whole node; each step (phase, tenant) is executed with a sequence of
+    transactions of bounded size in order to not hold the database lock for
+    a long time.
+
+    The step to be executed is persisted as a cursor on the database so that
+    an interrupted execution is resumed by the next one.
+    """
     monitor_interval = 5 * 60
 
-    def db_clean_expired_wbtips(self, session):
+    # The maximum number of tips processed within a single transaction
+    batch_size = 100
+
+    # The phases of the cleaning, the boolean tells if the phase is executed for each tenant
+    phases = [
+        ('clean_expired_wbtips', True),
+        ('clean_expired_itips', False),
+        ('check_for_expiring_submissions', True),
+        ('expire_old_passwords', True),
+        ('clean', False)
+    ]
+
+    def db_clean_expired_wbtips(self, session, tid):
         """
         This function checks all the InternalTips and deletes the receipt if the delete threshold is exceeded
         """
-        for tid in self.state.tenant_state:
-            threshold = datetime_now() - timedelta(days=self.state.tenant_cache[tid].wbtip_timetolive)
+        threshold = datetime_now() - timedelta(days=self.state.tenant_cache[tid].wbtip_timetolive)
+
+        wbtips_ids = [r[0] for r in session.query(models.WhistleblowerTip.id)
+                                           .filter(models.WhistleblowerTip.id == models.InternalTip.id,
+                                                   models.InternalTip.tid == tid,
+                                                   models.InternalTip.wb_last_access < threshold)
+                                           .limit(self.batch_size)]
 
-            wbtips_ids = [r[0] for r in session.query(models.InternalTip.id)
-                                               .filter(models.InternalTip.tid == tid,
-                                                       models.InternalTip.wb_last_access < threshold)]
+        if wbtips_ids:
+            session.query(models.WhistleblowerTip).filter(models.WhistleblowerTip.id.in_(wbtips_ids)).delete(synchronize_session='fetch')
 
-            if wbtips_ids:
-                session.query(models.WhistleblowerTip).filter(models.WhistleblowerTip.id.in_(wbtips_ids)).delete(synchronize_session='fetch')
+        return len(wbtips_ids) == self.batch_size
 
-    def db_clean_expired_itips(self, session):
+    def db_clean_expired_itips(self, session, tid):
         """
         This function, checks all the InternalTips and their expiration date.
         if expired InternalTips are found, it removes that along with
         all the related DB entries comment and tip related.
         """
-        itips_ids = [id[0] for id in session.query(models.InternalTip.id).filter(models.InternalTip.expiration_date < datetime_now())]
+        itips_ids = [id[0] for id in session.query(models.InternalTip.id)
+                                            .filter(models.InternalTip.expiration_date < datetime_now())
+                                            .limit(self.batch_size)]
         if itips_ids:
             db_delete_itips(session, itips_ids)
 
-    def db_check_for_expiring_submissions(self, session):
-        for tid in self.state.tenant_state:
-            threshold = datetime_now() + timedelta(hours=self.state.tenant_cache[tid].notification.tip_expiration_threshold)
-
-            for user in session.query(models.User).filter(models.User.role == u'receiver',
-                                                          models.UserTenant.user_id == models.User.id,
-                                                          models.UserTenant.tenant_id == tid):
-                itip_ids = [id[0] for id in session.query(models.InternalTip.id)
-                                                 .filter(models.InternalTip.tid == tid,
-                                                         models.ReceiverTip.internaltip_id == models.InternalTip.id,
-                                                         models.InternalTip.expiration_date < threshold,
-                                                         models.ReceiverTip.receiver_id == user.id)]
-
-                if not len(itip_ids):
-                    continue
-
-                earliest_expiration_date = session.query(func.min(models.InternalTip.expiration_date)) \
-                                                .filter(models.InternalTip.id.in_(itip_ids)).one()[0]
-
-                user_desc = user_serialize_user(session, user, user.language)
-
-                data = {
-                   'type': u'tip_expiration_summary',
-                   'node': db_admin_serialize_node(session, tid, user.language),
-                   'notification': db_get_notification(session, tid, user.language),
-                   'user': user_desc,
-                   'expiring_submission_count': len(itip_ids),
-                   'earliest_expiration_date': datetime_to_ISO8601(earliest_expiration_date)
-                }
-
-                subject, body = Templating().get_mail_subject_and_body(data)
-
-                session.add(models.Mail({
-                    'tid': tid,
-                    'address': user_desc['mail_address'],
-                    'subject': subject,
-                    'body': body
-                 }))
-
-    def db_expire_old_passwords(self, session):
+        return len(itips_ids) == self.batch_size
+
+    def db_check_for_expiring_submissions(self, session, tid):
+        threshold = datetime_now() + timedelta(hours=self.state.tenant_cache[tid].notification.tip_expiration_threshold)
+
+        expiring = {}
+        for user_id, count, earliest_expiration_date in session.query(models.ReceiverTip.receiver_id,
+                                                                      func.count(models.InternalTip.id),
+                                                                      func.min(models.InternalTip.expiration_date)) \
+                                                               .filter(models.InternalTip.tid == tid,
+                                                                       models.ReceiverTip.internaltip_id == models.InternalTip.id,
+                                                                       models.InternalTip.expiration_date < threshold) \
+                                                               .group_by(models.ReceiverTip.receiver_id):
+            expiring[user_id] = (count, earliest_expiration_date)
+
+        if not expiring:
+            return
+
+        # The node and notification settings are serialized once for each language
+        cache = {}
+
+        for user in session.query(models.User).filter(models.User.role == u'receiver',
+                                                      models.User.id.in_(list(expiring)),
+                                                      models.UserTenant.user_id == models.User.id,
+                                                      models.UserTenant.tenant_id == tid):
+            if user.language not in cache:
+                cache[user.language] = (db_admin_serialize_node(session, tid, user.language),
+                                        db_get_notification(session, tid, user.language))
+
+            user_desc = user_serialize_user(session, user, user.language)
+
+            data = {
+               'type': u'tip_expiration_summary',
+               'node': cache[user.language][0],
+               'notification': cache[user.language][1],
+               'user': user_desc,
+               'expiring_submission_count': expiring[user.id][0],
+               'earliest_expiration_date': datetime_to_ISO8601(expiring[user.id][1])
+            }
+
+            subject, body = Templating().get_mail_subject_and_body(data)
+
+            session.add(models.Mail({
+                'tid': tid,
+                'address': user_desc['mail_address'],
+                'subject': subject,
+                'body': body
+             }))
+
+        db_emit_signals(session, 'notification')
+
+    def db_expire_old_passwords(self, session, tid):
         """
         Expires passwords if past the last change date
         """
-        for tid in self.state.tenant_state:
-            # if the expiration threshold is 0, ignore it
-            if self.state.tenant_cache[tid].password_change_period == 0:
-                continue
+        # if the expiration threshold is 0, ignore it
+        if self.state.tenant_cache[tid].password_change_period == 0:
+            return
 
-            threshold = datetime_now() - timedelta(days=self.state.tenant_cache[tid].password_change_period)
+        threshold = datetime_now() - timedelta(days=self.state.tenant_cache[tid].password_change_period)
 
-            ids = [r[0] for r in session.query(models.User.id)
-                                        .join(models.UserTenant)
-                                        .filter(models.User.password_change_date < threshold,
-                                                models.UserTenant.user_id == models.User.id,
-                                                models.UserTenant.tenant_id == tid)]
+        ids = [r[0] for r in session.query(models.User.id)
+                                    .filter(models.User.password_change_date < threshold,
+                                            models.UserTenant.user_id == models.User.id,
+                                            models.UserTenant.tenant_id == tid)]
 
+        if ids:
             session.query(models.User).filter(models.User.id.in_(ids)).update({'password_change_needed': True}, synchronize_session='fetch')
 
-    def db_clean(self, session):
+    def db_clean(self, session, tid):
         # delete stats older than 1 year
         session.query(models.Stats).filter(models.Stats.start < datetime_now() - timedelta(90)).delete(synchronize_session='fetch')
 
@@ -124,7 +176,13 @@ class Cleaning(DailyJob):
 
     @transact
     def get_files_to_secure_delete(self, session):
-        return [x[0] for x in session.query(models.SecureFileDelete.filepath)]
+        """
+        Return the next batch of files marked for secure deletion and the size of the queue
+        """
+        count = session.query(func.count(models.SecureFileDelete.id)).scalar()
+        filepaths = [x[0] for x in session.query(models.SecureFileDelete.filepath).limit(self.batch_size)]
+
+        return filepaths, count
 
     @transact
     def commit_files_deletion(self, session, filepaths):
@@ -132,36 +190,94 @@ class Cleaning(DailyJob):
 
     @inlineCallbacks
     def perform_secure_deletion_of_files(self):
-        # Delete files that are marked for secure deletion
-        files_to_delete = yield self.get_files_to_secure_delete()
-        for file_to_delete in files_to_delete:
-            overwrite_and_remove(file_to_delete)
+        self.progress = {'files': 0, 'bytes': 0, 'pending': 0}
+
+        # Delete the files that are marked for secure deletion;
+        # the queue is processed in batches and each batch is removed
+        # from the queue as soon as its files are deleted
+        while True:
+            files_to_delete, count = yield self.get_files_to_secure_delete()
+            self.progress['pending'] = count
+            if not files_to_delete:
+                break
+
+            self.progress['bytes'] += yield deferToThread(overwrite_and_remove_files, files_to_delete)
 
-        if files_to_delete:
             yield self.commit_files_deletion(files_to_delete)
 
+            self.progress['files'] += len(files_to_delete)
+            self.progress['pending'] = count - len(files_to_delete)
+
+            log.debug("Secure deletion of files: %d deleted, %d pending",
+                      self.progress['files'], self.progress['pending'])
+
         # Delete the outdated AES files older than 1 day
-        files_to_remove = [f for f in os.listdir(self.state.settings.tmp_path) if fnmatch.fnmatch(f, '*.aes')]
-        for f in files_to_remove:
+        files_to_remove = []
+        for f in os.listdir(self.state.settings.tmp_path):
             path = os.path.join(self.state.settings.tmp_path, f)
-            timestamp = datetime.fromtimestamp(os.path.getmtime(path))
-            if is_expired(timestamp, days=1):
-                overwrite_and_remove(path)
+            if fnmatch.fnmatch(f, '*.aes') and is_expired(datetime.fromtimestamp(os.path.getmtime(path)), days=1):
+                files_to_remove.append(path)
+
+        if files_to_remove:
+            yield deferToThread(overwrite_and_remove_files, files_to_remove)
+
+    def get_steps(self):
+        """
+        Return the ordered list of the steps (phase, tenant) of the cleaning
+        """
+        steps = []
+
+        for phase, per_tenant in self.phases:
+            for tid in (sorted(self.state.tenant_state) if per_tenant else [1]):
+                steps.append([phase, tid])
+
+        return steps
+
+    @transact
+    def get_cursor(self, session):
+        return db_get_cleaning_cursor(session)
 
     @transact
-    def daily_clean(self, session):
-        self.db_clean_expired_wbtips(session)
+    def perform_step(self, session, phase, tid, next_step):
+        """
+        Execute a transaction of a step and return True if the step is not completed
+        """
+        pending = getattr(self, 'db_' + phase)(session, tid)
+
+        if not pending:
+            db_set_cleaning_cursor(session, next_step)
 
-        self.db_clean_expired_itips(session)
+        return pending
 
-        self.db_check_for_expiring_submissions(session)
+    @inlineCallbacks
+    def daily_clean(self):
+        steps = self.get_steps()
+
+        cursor = yield self.get_cursor()
+        if cursor in steps:
+            log.info("Resuming the interrupted cleaning from step %s of tenant %d", cursor[0], cursor[1])
+            steps = steps[steps.index(cursor):]
+
+        self.phases_timings = {}
+
+        for i, (phase, tid) in enumerate(steps):
+            next_step = steps[i + 1] if i + 1 < len(steps) else None
 
-        self.db_expire_old_passwords(session)
+            start = time.time()
 
-        self.db_clean(session)
+            while (yield self.perform_step(phase, tid, next_step)):
+                pass
+
+            self.phases_timings[phase] = self.phases_timings.get(phase, 0) + time.time() - start
+
+        log.debug("Cleaning phases timings: %s", self.phases_timings)
 
     @inlineCallbacks
     def operation(self):
         yield self.daily_clean()
 
+        start = time.time()
+
         yield self.perform_secure_deletion_of_files()
+
+        self.phases_timings['secure_deletion_of_files'] = time.time() - start
@@ -10,7 +10,7 @@ from globaleaks.orm import transact
 from globaleaks.settings import Settings
 from globaleaks.utils.crypto import generateRandomKey, GCE
 from globaleaks.utils.log import log
-from globaleaks.utils.pgp import PGPContext
+from globaleaks.utils.worksignals import db_emit_signals
 
 __all__ = ['Delivery']
 
@@ -84,15 +84,11 @@ def file_delivery_planning(session):
     return receiverfiles_maps, whistleblowerfiles_maps
 
 
-def encrypt_file_with_pgp(state, fd, key, fingerprint, dest_path):
+def encrypt_file_with_pgp(state, fd, key, dest_path):
     """
     Encrypt the file for a specific key
     """
-    pgpctx = PGPContext(state.settings.tmp_path)
-
-    pgpctx.load_key(key)
-
-    pgpctx.encrypt_file(fingerprint, fd, dest_path)
+    state.pgp_keyring.encrypt_file(key, fd, dest_path)
 
 
 def write_plaintext_file(sf, dest_path):
@@ -157,7 +153,6 @@ def process_receiverfiles(state, receiverfiles_maps):
                             encrypt_file_with_pgp(state,
                                                   encrypted_file,
                                                   rfileinfo['receiver']['pgp_key_public'],
-                                                  rfileinfo['receiver']['pgp_key_fingerprint'],
                                                   pgp_path)
                             rfileinfo['filename'] = pgp_name
                             rfileinfo['status'] = u'encrypted'
@@ -216,6 +211,8 @@ def update_receiverfiles(session, receiverfiles_maps):
                 rfile.status = rf['status']
                 rfile.filename = rf['filename']
 
+    db_emit_signals(session, 'notification')
+
 
 @transact
 def update_whistleblowerfiles(session, whistleblowerfiles_maps):
@@ -227,7 +224,8 @@ def update_whistleblowerfiles(session, whistleblowerfiles_maps):
 
 
 class Delivery(LoopingJob):
-    interval = 5
+    interval = 60
+    signals = ['delivery']
     monitor_interval = 180
 
     @inlineCallbacks
@@ -236,6 +234,11 @@ class Delivery(LoopingJob):
         This function creates receiver files
         """
         receiverfiles_maps, whistleblowerfiles_maps = yield file_delivery_planning()
+
+        # The files waiting to be processed at the beginning of the execution
+        self.progress = {'receiverfiles': len(receiverfiles_maps),
+                         'whistleblowerfiles': len(whistleblowerfiles_maps)}
+
         if receiverfiles_maps:
             process_receiverfiles(self.state, receiverfiles_maps)
             yield update_receiverfiles(receiverfiles_maps)
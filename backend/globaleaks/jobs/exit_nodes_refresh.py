@@ -15,5 +15,13 @@ class ExitNodesRefresh(HourlyJob):
     def operation(self):
         net_agent = self.state.get_agent()
         log.debug('Fetching list of Tor exit nodes')
-        yield State.tor_exit_set.update(net_agent)
-        log.debug('Retrieved a list of %d exit nodes', len(State.tor_exit_set))
+        stats = yield State.tor_exit_set.update(net_agent)
+        if stats is None:
+            log.err('Discarded an empty list of Tor exit nodes')
+            return
+
+        log.debug('Retrieved a list of %d exit nodes [added: %d, removed: %d]',
+                  len(State.tor_exit_set), stats['added'], stats['removed'])
+
+        # The list is saved in order to be loaded at the next startup
+        State.tor_exit_set.save(self.state.settings.exit_nodes_path)
@@ -5,7 +5,9 @@ from twisted.internet import task, defer, reactor
 
 from globaleaks.state import State, extract_exception_traceback_and_schedule_email
 from globaleaks.utils.log import log
+from globaleaks.utils.metrics import job_duration
 from globaleaks.utils.utility import datetime_now
+from globaleaks.utils.worksignals import Signals
 
 
 TRACK_LAST_N_EXECUTIONS = 10
@@ -21,6 +23,19 @@ class Job(task.LoopingCall):
     active = None
     last_executions = []
 
+    # The duration of the phases of the latest execution
+    phases_timings = {}
+
+    # The counters of the progress of the latest execution
+    progress = {}
+
+    # The signals used to wake up the job when new work is available
+    signals = []
+    wakeup_call = None
+    wakeup_pending = False
+
+    start_call = None
+
     def __init__(self):
         self.name = self.__class__.__name__
 
@@ -30,19 +45,59 @@ class Job(task.LoopingCall):
 
         delay = self.get_delay()
         delay = delay if delay > 0 else 0
-        self.clock.callLater(delay, self.start, self.interval)
+        self.start_call = self.clock.callLater(delay, self.start, self.interval)
 
     def start(self, interval):
+        self.start_call = None
+
+        for signal in self.signals:
+            Signals.subscribe(signal, self.wakeup)
+
         task.LoopingCall.start(self, interval)
 
     def stop(self):
+        if self.start_call is not None:
+            self.start_call.cancel()
+            self.start_call = None
+
+        for signal in self.signals:
+            Signals.unsubscribe(signal, self.wakeup)
+
+        if self.wakeup_call is not None:
+            self.wakeup_call.cancel()
+            self.wakeup_call = None
+
+        self.wakeup_pending = False
+
         if self.running:
             task.LoopingCall.stop(self)
 
         return self.active if self.active is not None else defer.succeed(None)
 
+    def wakeup(self):
+        """
+        Anticipate the next execution of the job
+
+        Multiple wakeups are coalesced and a wakeup received during an
+        execution causes a new execution as soon as the current one ends.
+        """
+        if self.active is not None:
+            self.wakeup_pending = True
+        elif self.wakeup_call is None:
+            self.wakeup_call = self.clock.callLater(0, self._wakeup)
+
+    def _wakeup(self):
+        self.wakeup_call = None
+
+        if self.running:
+            self.run()
+
     @defer.inlineCallbacks
     def run(self):
+        if self.active is not None:
+            # The job is already running
+            return
+
         self.begin()
 
         try:
@@ -66,6 +121,8 @@ class Job(task.LoopingCall):
 
         current_run_time = self.end_time - self.start_time
 
+        job_duration.observe(current_run_time / 1000.0, (self.name,))
+
         # discard empty cycles from stats
         if self.mean_time == -1:
             self.mean_time = current_run_time
@@ -81,6 +138,10 @@ class Job(task.LoopingCall):
         self.active.callback(None)
         self.active = None
 
+        if self.wakeup_pending:
+            self.wakeup_pending = False
+            self.wakeup()
+
     def operation(self):
         return
 
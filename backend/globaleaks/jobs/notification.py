@@ -13,7 +13,6 @@ from globaleaks.handlers.user import user_serialize_user
 from globaleaks.jobs.job import LoopingJob
 from globaleaks.orm import transact
 from globaleaks.utils.log import log
-from globaleaks.utils.pgp import PGPContext
 from globaleaks.utils.templating import Templating
 
 
@@ -198,9 +197,7 @@ class MailGenerator(object):
 
         # If the receiver has encryption enabled encrypt the mail body
         if data['user']['pgp_key_public']:
-            pgpctx = PGPContext(self.state.settings.tmp_path)
-            fingerprint = pgpctx.load_key(data['user']['pgp_key_public'])['fingerprint']
-            body = pgpctx.encrypt_message(fingerprint, body)
+            body = self.state.pgp_keyring.encrypt_message(data['user']['pgp_key_public'], body)
 
         session.add(models.Mail({
             'address': data['user']['mail_address'],
@@ -273,7 +270,8 @@ def get_mails_from_the_pool(session):
 
 
 class Notification(LoopingJob):
-    interval = 5
+    interval = 60
+    signals = ['notification']
     monitor_interval = 3 * 60
     mails_to_delete = []
 
@@ -286,15 +284,21 @@ class Notification(LoopingJob):
     @defer.inlineCallbacks
     def spool_emails(self):
         mails = yield get_mails_from_the_pool()
+        self.progress['pending'] = len(mails)
+
         for mail in mails:
             yield self.sendmail(mail)
 
+        self.progress['sent'] = len(self.mails_to_delete)
+        self.progress['pending'] = len(mails) - len(self.mails_to_delete)
+
         if self.mails_to_delete:
             yield delete_sent_mails(self.mails_to_delete)
 
     @defer.inlineCallbacks
     def operation(self):
         del self.mails_to_delete[:]
+        self.progress = {'sent': 0, 'pending': 0}
 
         yield MailGenerator(self.state).generate()
 
@@ -13,10 +13,7 @@ def get_statistics(state):
     stats = {}
 
     for tid in state.tenant_state:
-        stats[tid] = {}
-        for e in state.tenant_state[tid].EventQ:
-            stats[tid].setdefault(e.event_type, 0)
-            stats[tid][e.event_type] += 1
+        stats[tid] = state.tenant_state[tid].count_events()
 
     return stats
 
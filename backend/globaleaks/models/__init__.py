@@ -303,7 +303,9 @@ class _Comment(Model):
 
     @declared_attr
     def __table_args__(self):
-        return (ForeignKeyConstraint(['internaltip_id'], ['internaltip.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),)
+        return (ForeignKeyConstraint(['internaltip_id'], ['internaltip.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
+                Index('idx_comment_internaltip_id', 'internaltip_id'),
+                Index('idx_comment_new', 'new', sqlite_where=self.new == True))
 
 
 class _Config(Model):
@@ -749,7 +751,9 @@ class _InternalFile(Model):
 
     @declared_attr
     def __table_args__(self):
-        return (ForeignKeyConstraint(['internaltip_id'], ['internaltip.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),)
+        return (ForeignKeyConstraint(['internaltip_id'], ['internaltip.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
+                Index('idx_internalfile_internaltip_id', 'internaltip_id'),
+                Index('idx_internalfile_new', 'new', sqlite_where=self.new == True))
 
 
 class _InternalTip(Model):
@@ -791,7 +795,8 @@ class _InternalTip(Model):
     @declared_attr
     def __table_args__(self):
         return (ForeignKeyConstraint(['tid'], ['tenant.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
-                UniqueConstraint('tid', 'progressive'))
+                UniqueConstraint('tid', 'progressive'),
+                Index('idx_internaltip_expiration_date', 'expiration_date'))
 
 
 class _InternalTipAnswers(Model):
@@ -847,7 +852,8 @@ class _Mail(Model):
 
     @declared_attr
     def __table_args__(self):
-        return (ForeignKeyConstraint(['tid'], ['tenant.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),)
+        return (ForeignKeyConstraint(['tid'], ['tenant.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
+                Index('idx_mail_creation_date', 'creation_date'))
 
 
 class _Message(Model):
@@ -868,7 +874,9 @@ class _Message(Model):
     @declared_attr
     def __table_args__(self):
         return (ForeignKeyConstraint(['receivertip_id'], ['receivertip.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
-                CheckConstraint(self.type.in_(['receiver', 'whistleblower'])))
+                CheckConstraint(self.type.in_(['receiver', 'whistleblower'])),
+                Index('idx_message_receivertip_id', 'receivertip_id'),
+                Index('idx_message_new', 'new', sqlite_where=self.new == True))
 
 
 class _Questionnaire(Model):
@@ -931,7 +939,10 @@ class _ReceiverFile(Model):
     def __table_args__(self):
         return (ForeignKeyConstraint(['internalfile_id'], ['internalfile.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
                 ForeignKeyConstraint(['receivertip_id'], ['receivertip.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
-                CheckConstraint(self.status.in_(['processing', 'reference', 'encrypted', 'unavailable', 'nokey'])))
+                CheckConstraint(self.status.in_(['processing', 'reference', 'encrypted', 'unavailable', 'nokey'])),
+                Index('idx_receiverfile_internalfile_id', 'internalfile_id'),
+                Index('idx_receiverfile_receivertip_id', 'receivertip_id'),
+                Index('idx_receiverfile_new', 'new', sqlite_where=self.new == True))
 
 
 class _ReceiverTip(Model):
@@ -964,7 +975,10 @@ class _ReceiverTip(Model):
     @declared_attr
     def __table_args__(self):
         return (ForeignKeyConstraint(['receiver_id'], ['user.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
-                ForeignKeyConstraint(['internaltip_id'], ['internaltip.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'))
+                ForeignKeyConstraint(['internaltip_id'], ['internaltip.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
+                Index('idx_receivertip_internaltip_id', 'internaltip_id'),
+                Index('idx_receivertip_receiver_id', 'receiver_id'),
+                Index('idx_receivertip_new', 'new', sqlite_where=self.new == True))
 
 
 class _SecureFileDelete(Model):
@@ -1292,7 +1306,9 @@ class _WhistleblowerFile(Model):
 
     @declared_attr
     def __table_args__(self):
-        return (ForeignKeyConstraint(['receivertip_id'], ['receivertip.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),)
+        return (ForeignKeyConstraint(['receivertip_id'], ['receivertip.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
+                Index('idx_whistleblowerfile_receivertip_id', 'receivertip_id'),
+                Index('idx_whistleblowerfile_new', 'new', sqlite_where=self.new == True))
 
 
 class _WhistleblowerIdentity(Model):
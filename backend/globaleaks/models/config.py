@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
-from sqlalchemy import not_
+import threading
+from itertools import chain
+
+from sqlalchemy import event, not_
+from sqlalchemy.orm import Session
 
 from globaleaks import __version__
 from globaleaks.models import Config, ConfigL10N, EnabledLanguage
@@ -22,13 +26,159 @@ def get_default(default):
     return default
 
 
+class ConfigCacheClass(object):
+    """
+    Process level cache of the values of the configuration of the tenants
+
+    The values are cached per tenant, or per tenant and language, and are
+    invalidated after the commit of the transactions changing them.
+
+    A generation counter incremented by each invalidation prevents the
+    values read before a change from being stored after its invalidation.
+
+    The values read by a session holding uncommitted changes of the
+    configuration of a tenant are never cached, as they would survive a
+    rollback of the session.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.generation = 0
+
+    def get(self, key, load, dirty=None):
+        ret = self.values.get(key)
+        if ret is None:
+            generation = self.generation
+            ret = load()
+            if dirty is not None and dirty():
+                return ret
+
+            with self.lock:
+                if generation == self.generation:
+                    self.values[key] = ret
+
+        return ret
+
+    def invalidate(self, tids=None):
+        with self.lock:
+            self.generation += 1
+
+            if tids is None:
+                self.values.clear()
+            else:
+                for key in [key for key in self.values if key[0] in tids]:
+                    del self.values[key]
+
+
+ConfigCache = ConfigCacheClass()
+
+
+def get_snapshot(session, key, load):
+    """
+    Return the configuration rows of a tenant, or of a tenant and language,
+    loaded once per session; the changes are applied to the rows of the
+    snapshot that are then used for every following read of the session.
+    """
+    snapshots = session.info.setdefault('config', {})
+    if key not in snapshots:
+        snapshots[key] = load()
+
+    return snapshots[key]
+
+
+def is_dirty(session, tid):
+    """Return True if the session flushed changes of the configuration of the tenant"""
+    return session.info.get('config_dirty_all', False) or tid in session.info.get('config_dirty', ())
+
+
+def get_cached(session, key, load_values):
+    if is_dirty(session, key[0]):
+        return load_values()
+
+    # The load could autoflush changes of the configuration
+    return ConfigCache.get(key, load_values, lambda: is_dirty(session, key[0]))
+
+
+def get_values(session, key, load_values):
+    snapshot = session.info.get('config', {}).get(key)
+    if snapshot is not None:
+        return {k: v.value for k, v in snapshot.items()}
+
+    return get_cached(session, key, load_values)
+
+
+def get_value(session, key, load_values, var_name):
+    snapshot = session.info.get('config', {}).get(key)
+    if snapshot is not None:
+        return snapshot[var_name].value
+
+    return get_cached(session, key, load_values)[var_name]
+
+
+def config_before_flush(session, flush_context, instances):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (Config, ConfigL10N)):
+            session.info.setdefault('config_dirty', set()).add(obj.tid)
+
+
+def config_after_bulk_operation(context):
+    mapper = getattr(context, 'mapper', None)
+    if mapper is not None and issubclass(mapper.class_, (Config, ConfigL10N)):
+        # The rows affected are unknown: the snapshots and the whole cache are discarded
+        context.session.info.pop('config', None)
+        context.session.info['config_dirty_all'] = True
+
+
+def config_after_commit(session):
+    session.info.pop('config', None)
+
+    if session.info.pop('config_dirty_all', False):
+        session.info.pop('config_dirty', None)
+        ConfigCache.invalidate()
+    else:
+        tids = session.info.pop('config_dirty', None)
+        if tids:
+            ConfigCache.invalidate(tids)
+
+
+def config_after_rollback(session):
+    for key in ('config', 'config_dirty', 'config_dirty_all'):
+        session.info.pop(key, None)
+
+
+event.listen(Session, 'before_flush', config_before_flush)
+event.listen(Session, 'after_bulk_update', config_after_bulk_operation)
+event.listen(Session, 'after_bulk_delete', config_after_bulk_operation)
+event.listen(Session, 'after_commit', config_after_commit)
+event.listen(Session, 'after_rollback', config_after_rollback)
+
+
 class ConfigFactory(object):
+    """
+    Accessor of the configuration of a tenant
+
+    The reads are served by the ConfigCache until the session loads the
+    rows of the tenant, all at once, in order to change them.
+    """
     def __init__(self, session, tid):
         self.session = session
         self.tid = tid
 
+    def load_cfgs(self):
+        return {c.var_name: c for c in self.session.query(Config).filter(Config.tid == self.tid)}
+
+    def load_values(self):
+        return dict(self.session.query(Config.var_name, Config.value).filter(Config.tid == self.tid))
+
+    def get_cfgs(self):
+        return get_snapshot(self.session, (self.tid,), self.load_cfgs)
+
+    def get_values(self):
+        return get_values(self.session, (self.tid,), self.load_values)
+
     def get_all(self, group):
-        return {c.var_name: c for c in self.session.query(Config).filter(Config.tid == self.tid, Config.var_name.in_(ConfigFilters[group]))}
+        cfgs = self.get_cfgs()
+        return {k: cfgs[k] for k in ConfigFilters[group] if k in cfgs}
 
     def update(self, group, data):
         for k, v in self.get_all(group).items():
@@ -36,16 +186,17 @@ class ConfigFactory(object):
                 v.set_v(data[k])
 
     def get_cfg(self, var_name):
-        return self.session.query(Config).filter(Config.tid == self.tid, Config.var_name == var_name).one()
+        return self.get_cfgs()[var_name]
 
     def get_val(self, var_name):
-        return self.get_cfg(var_name).value
+        return get_value(self.session, (self.tid,), self.load_values, var_name)
 
     def set_val(self, var_name, value):
         self.get_cfg(var_name).set_v(value)
 
     def serialize(self, group):
-        return {k: v.value for k, v in self.get_all(group).items()}
+        values = self.get_values()
+        return {k: values[k] for k in ConfigFilters[group] if k in values}
 
     def update_defaults(self):
         actual = set([c[0] for c in self.session.query(Config.var_name).filter(Config.tid == self.tid)])
@@ -59,23 +210,49 @@ class ConfigFactory(object):
         for key in missing:
             self.session.add(Config({'tid': self.tid, 'var_name': key, 'value': get_default(ConfigDescriptor[key].default)}))
 
+        self.session.info.get('config', {}).pop((self.tid,), None)
+
 
 class ConfigL10NFactory(object):
+    """
+    Accessor of the localized configuration of a tenant
+
+    The rows are loaded per language as for the ConfigFactory.
+    """
     def __init__(self, session, tid):
         self.session = session
         self.tid = tid
 
+    def load_cfgs(self, lang):
+        return {c.var_name: c for c in self.session.query(ConfigL10N).filter(ConfigL10N.tid == self.tid, ConfigL10N.lang == lang)}
+
+    def load_values(self, lang):
+        return dict(self.session.query(ConfigL10N.var_name, ConfigL10N.value).filter(ConfigL10N.tid == self.tid, ConfigL10N.lang == lang))
+
+    def get_cfgs(self, lang):
+        return get_snapshot(self.session, (self.tid, lang), lambda: self.load_cfgs(lang))
+
+    def get_values(self, lang):
+        return get_values(self.session, (self.tid, lang), lambda: self.load_values(lang))
+
     def initialize(self, keys, lang, data):
+        cfgs = self.session.info.get('config', {}).get((self.tid, lang))
+
         for key in keys:
             value = data[key][lang] if key in data else ''
-            self.session.add(ConfigL10N({'tid': self.tid, 'lang': lang, 'var_name': key, 'value': value}))
+            cfg = ConfigL10N({'tid': self.tid, 'lang': lang, 'var_name': key, 'value': value})
+            self.session.add(cfg)
+
+            if cfgs is not None:
+                cfgs[key] = cfg
 
     def get_all(self, group, lang):
-        return [r for r in self.session.query(ConfigL10N).filter(ConfigL10N.tid == self.tid, ConfigL10N.lang == lang, ConfigL10N.var_name.in_(ConfigL10NFilters[group]))]
+        cfgs = self.get_cfgs(lang)
+        return [cfgs[k] for k in ConfigL10NFilters[group] if k in cfgs]
 
     def serialize(self, group, lang):
-        rows = self.get_all(group, lang)
-        return {c.var_name: c.value for c in rows if c.var_name in ConfigL10NFilters[group]}
+        values = self.get_values(lang)
+        return {k: values[k] for k in ConfigL10NFilters[group] if k in values}
 
     def update(self, group, data, lang):
         c_map = {c.var_name: c for c in self.get_all(group, lang)}
@@ -97,15 +274,13 @@ class ConfigL10NFactory(object):
             ConfigL10NFactory.initialize(self, list(set(ConfigL10NFilters[group]) - set(old_keys)), lang, data)
 
     def get_val(self, var_name, lang):
-        cfg = self.session.query(ConfigL10N.value).filter(ConfigL10N.tid == self.tid, ConfigL10N.lang == lang, ConfigL10N.var_name == var_name).one_or_none()
-        if cfg is None:
+        try:
+            return get_value(self.session, (self.tid, lang), lambda: self.load_values(lang), var_name)
+        except KeyError:
             return ''
 
-        return cfg.value
-
     def set_val(self, var_name, lang, value):
-        cfg = self.session.query(ConfigL10N).filter(ConfigL10N.tid == self.tid, ConfigL10N.lang == lang, ConfigL10N.var_name == var_name).one()
-        cfg.set_v(value)
+        self.get_cfgs(lang)[var_name].set_v(value)
 
     def reset(self, group, data):
         langs = EnabledLanguage.list(self.session, self.tid)
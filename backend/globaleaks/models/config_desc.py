@@ -40,6 +40,8 @@ ConfigDescriptor = {
     u'version_db': Int(default=DATABASE_VERSION),
     u'latest_version': Unicode(default=text_type(__version__)),
 
+    u'cleaning_cursor': Unicode(default=u''),
+
     u'acme': Bool(default=False),
     u'acme_accnt_key': Unicode(),
 
@@ -1,7 +1,9 @@
 # -*- coding: utf-8
 import platform
 import random
+import threading
 import time
+from collections import deque
 
 from sqlalchemy import create_engine, event
 from sqlalchemy.exc import OperationalError
@@ -10,12 +12,88 @@ from sqlalchemy.orm import sessionmaker
 from twisted.internet import reactor
 from twisted.internet.threads import deferToThreadPool
 
+from globaleaks.utils.metrics import transaction_retries
+from globaleaks.utils.utility import datetime_now
+from globaleaks.utils.worksignals import Signals
+
 
 __DB_URI = 'sqlite:'
 __THREAD_POOL = None
 
 TRANSACTION_RETRIES = 20
 
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_LOG_SIZE = 100
+
+
+class QueryLogClass(object):
+    """
+    Counts and times the statements executed on the database attributing
+    them to the transaction that issued them, and keeps a ring buffer of
+    the slowest ones.
+
+    Only the statements are recorded and never the bound parameters in
+    order to not leak any data.
+    """
+    def __init__(self, threshold=SLOW_QUERY_THRESHOLD, size=SLOW_QUERY_LOG_SIZE):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.count = 0
+        self.transactions = {}
+        self.slow_queries = deque(maxlen=size)
+
+    def start_transaction(self, name):
+        previous = getattr(self.local, 'transaction', None)
+        self.local.transaction = [name, 0, 0]
+        return previous
+
+    def end_transaction(self, previous):
+        name, count, duration = self.local.transaction
+        self.local.transaction = previous
+
+        with self.lock:
+            stats = self.transactions.setdefault(name, {'name': name,
+                                                        'executions': 0,
+                                                        'queries': 0,
+                                                        'max_queries': 0,
+                                                        'time': 0})
+            stats['executions'] += 1
+            stats['queries'] += count
+            stats['max_queries'] = max(stats['max_queries'], count)
+            stats['time'] += duration
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.time())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.time() - conn.info['query_start_time'].pop()
+
+        transaction = getattr(self.local, 'transaction', None)
+        if transaction is not None:
+            transaction[1] += 1
+            transaction[2] += duration
+
+        with self.lock:
+            self.count += 1
+
+            if duration >= self.threshold:
+                self.slow_queries.append({
+                    'date': datetime_now(),
+                    'transaction': transaction[0] if transaction is not None else None,
+                    'statement': statement,
+                    'duration': duration
+                })
+
+    def reset(self):
+        with self.lock:
+            self.count = 0
+            self.transactions.clear()
+            self.slow_queries.clear()
+
+
+QueryLog = QueryLogClass()
+
 
 def make_db_uri(db_file):
     # ugly ugly hack to allow this to work properly on windows
@@ -56,6 +134,9 @@ def get_engine(db_uri=None, foreign_keys=True):
         if foreign_keys:
             conn.execute('pragma foreign_keys=ON')
 
+    event.listen(engine, 'before_cursor_execute', QueryLog.before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', QueryLog.after_cursor_execute)
+
     return engine
 
 
@@ -93,6 +174,13 @@ class transact(object):
     def __call__(self, *args, **kwargs):
         return self.run(self._wrap, self.method, *args, **kwargs)
 
+    def get_name(self, function, args):
+        # Transactions run through tw are attributed to the wrapped function
+        if self.method is tw.method and args:
+            function = args[0]
+
+        return '%s.%s' % (function.__module__, function.__name__)
+
     def run(self, function, *args, **kwargs):
         return deferToThreadPool(reactor,
                                  get_thread_pool(),
@@ -108,8 +196,12 @@ class transact(object):
         session = get_session()
         retries = 0
 
+        previous = QueryLog.start_transaction(self.get_name(function, args))
+
         try:
             while True:
+                session.info.pop('signals', None)
+
                 try:
                     if self.instance:
                         result = function(self.instance, session, *args, **kwargs)
@@ -124,6 +216,7 @@ class transact(object):
                         raise
 
                     retries += 1
+                    transaction_retries.inc()
 
                     if retries >= TRANSACTION_RETRIES:
                         raise Exception("Transaction failed with too many retries")
@@ -133,9 +226,14 @@ class transact(object):
                     session.rollback()
                     raise
                 else:
+                    signals = session.info.pop('signals', None)
+                    if signals:
+                        reactor.callFromThread(Signals.emit, *signals)
+
                     return result
         finally:
             session.close()
+            QueryLog.end_transaction(previous)
 
 
 class transact_sync(transact):
@@ -7,6 +7,7 @@
 import json
 import re
 import sys
+import time
 
 from six import text_type, binary_type
 from six.moves.urllib.parse import urlsplit, urlunparse, urlunsplit  # pylint: disable=import-error
@@ -56,6 +57,7 @@ from globaleaks.handlers.admin import submission_statuses as admin_submission_st
 from globaleaks.rest import cache, decorators, requests, errors
 from globaleaks.settings import Settings
 from globaleaks.state import State, extract_exception_traceback_and_schedule_email
+from globaleaks.utils.metrics import request_duration, request_status
 
 tid_regexp = r'([0-9]+)'
 uuid_regexp = r'([a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12})'
@@ -94,6 +96,8 @@ api_spec = [
     (r'/rtip/' + uuid_regexp + r'/messages', rtip.ReceiverMsgCollection),
     (r'/rtip/' + uuid_regexp + r'/identityaccessrequests', rtip.IdentityAccessRequestsCollection),
     (r'/rtip/' + uuid_regexp + r'/export', export.ExportHandler),
+    (r'/exports', export.ExportJobCollection),
+    (r'/exports/' + uuid_regexp, export.ExportJobInstance),
     (r'/rtip/' + uuid_regexp + r'/wbfile', rtip.WhistleblowerFileHandler),
     (r'/rtip/rfile/' + uuid_regexp, rtip.ReceiverFileDownload),
     (r'/rtip/wbfile/' + uuid_regexp, rtip.RTipWBFileHandler),
@@ -149,6 +153,8 @@ api_spec = [
     (r'/admin/activities/(summary|details)', admin_statistics.RecentEventsCollection),
     (r'/admin/anomalies', admin_statistics.AnomalyCollection),
     (r'/admin/jobs', admin_statistics.JobsTiming),
+    (r'/admin/queries', admin_statistics.QueriesTiming),
+    (r'/admin/sessions', admin_statistics.SessionsCount),
     (r'/admin/l10n/(' + '|'.join(LANGUAGES_SUPPORTED_CODES) + ')', admin_l10n.AdminL10NHandler),
     (r'/admin/files/(logo|favicon|css|homepage|script)', admin_file.FileInstance),
     (r'/admin/config', admin_operation.AdminOperationHandler),
@@ -339,10 +345,20 @@ class APIResourceWrapper(Resource):
         @return: empty `str` or `NOT_DONE_YET`
         """
         request_finished = [False]
+        request.handler_name = u'None'
+        start_time = time.time()
 
         def _finish(ret):
             request_finished[0] = True
 
+            # The methods are restricted to the known ones in order to bound the labels
+            method = request.method.lower().decode('utf-8')
+            if method not in self.method_map and method != 'head':
+                method = u'other'
+
+            request_duration.observe(time.time() - start_time, (request.handler_name, method))
+            request_status.inc((request.code,))
+
         request.notifyFinish().addBoth(_finish)
 
         self.preprocess(request)
@@ -397,6 +413,7 @@ class APIResourceWrapper(Resource):
         f = getattr(handler, method)
         groups = [text_type(g) for g in match.groups()]
 
+        request.handler_name = handler.__name__
         self.handler = handler(State, request, **args)
 
         request.setResponseCode(self.method_map[method])
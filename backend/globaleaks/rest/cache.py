@@ -4,6 +4,8 @@ import io
 
 from six import text_type
 
+from globaleaks.utils.metrics import cache_requests
+
 
 def gzipdata(data):
     if isinstance(data, text_type):
@@ -25,8 +27,11 @@ class Cache(object):
         if tid in cls.memory_cache_dict \
            and resource in cls.memory_cache_dict[tid] \
            and language in cls.memory_cache_dict[tid][resource]:
+            cache_requests.inc(('hit',))
             return cls.memory_cache_dict[tid][resource][language]
 
+        cache_requests.inc(('miss',))
+
     @classmethod
     def set(cls, tid, resource, language, content_type, data):
         data = gzipdata(data)
@@ -189,3 +189,12 @@ class AccessLocationInvalid(GLException):
     reason = "IP Address not allows to login from this location"
     error_code = 16
     status_code = 401
+
+
+class RangeNotSatisfiable(GLException):
+    """
+    The range requested for a download is not satisfiable
+    """
+    reason = "Requested range not satisfiable"
+    error_code = 17
+    status_code = 416  # Range Not Satisfiable
@@ -182,6 +182,16 @@ ReceiverOperationDesc = {
     'rtips': [uuid_regexp]
 }
 
+ReceiverOperationWithArgsDesc = {
+    'operation': text_type,
+    'rtips': [uuid_regexp],
+    'args': dict
+}
+
+ExportDesc = {
+    'rtips': [uuid_regexp]
+}
+
 CommentDesc = {
     'content': text_type
 }
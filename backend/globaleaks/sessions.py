@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from collections import OrderedDict
 
 from globaleaks.settings import Settings
 from globaleaks.utils.crypto import generateRandomKey
@@ -13,10 +14,10 @@ class Session(object):
         self.user_role = user_role
         self.pcn = pcn
         self.cc = cc
-        self.expireCall = None
+        self.expireTime = 0
 
     def getTime(self):
-        return self.expireCall.getTime() if self.expireCall else 0
+        return self.expireTime
 
     def serialize(self):
         return {
@@ -29,15 +30,119 @@ class Session(object):
 
 
 class SessionsFactory(TempDict):
-    """Extends TempDict to provide session management functions ontop of temp session keys"""
+    """
+    Extends TempDict to provide session management functions ontop of temp session keys
 
-    def revoke(self, tid, user_id):
-        for k, v in list(self.items()):
-            if v.tid == tid and v.user_id == user_id:
-                del self[k]
+    The sessions are indexed by (tid, user_id) and by tid in order to
+    revoke and count them without scanning the whole dictionary.
+    """
+    def __init__(self, *args, **kwargs):
+        self.users = {}
+        self.tenants = {}
+        TempDict.__init__(self, *args, **kwargs)
+
+    def __setitem__(self, key, session):
+        if key in self:
+            self._unindex(key, self[key])
+
+        TempDict.__setitem__(self, key, session)
+
+        self.users.setdefault((session.tid, session.user_id), OrderedDict())[key] = None
+        self.tenants.setdefault(session.tid, set()).add(key)
+
+    def __delitem__(self, key):
+        session = self[key]
+        TempDict.__delitem__(self, key)
+        self._unindex(key, session)
+
+    def pop(self, key, *args):
+        if key in self:
+            self._unindex(key, self[key])
+
+        return TempDict.pop(self, key, *args)
+
+    def clear(self):
+        TempDict.clear(self)
+        self.users.clear()
+        self.tenants.clear()
+
+    def dump_item(self, session):
+        # The private key of the user is never persisted: it lives only in
+        # the memory of the process where the user logged in
+        return {
+            'id': session.id,
+            'tid': session.tid,
+            'user_id': session.user_id,
+            'user_role': session.user_role,
+            'pcn': session.pcn,
+            'cc': bool(session.cc)
+        }
+
+    def load_item(self, record):
+        if record['cc']:
+            # The user needs to login again in order to unlock the key
+            return
+
+        session = Session(record['tid'], record['user_id'], record['user_role'], record['pcn'], u'')
+        session.id = record['id']
+        return session
+
+    def update_item(self, session, record):
+        session.pcn = record['pcn']
+
+    def item_group(self, session):
+        return u'%d:%s:%s' % (session.tid, session.user_id, session.user_role)
+
+    def _unindex(self, key, session):
+        user_key = (session.tid, session.user_id)
+        ids = self.users.get(user_key)
+        if ids is not None:
+            ids.pop(key, None)
+            if not ids:
+                del self.users[user_key]
+
+        ids = self.tenants.get(session.tid)
+        if ids is not None:
+            ids.discard(key)
+            if not ids:
+                del self.tenants[session.tid]
+
+    def revoke(self, tid, user_id, keep=None):
+        """Revokes the sessions of a user, with the exception of the session keep"""
+        for session_id in list(self.users.get((tid, user_id), ())):
+            if session_id != keep:
+                self.delete(session_id)
+
+        # The sessions of other processes
+        if self.store is not None:
+            self.call_store('delete_group', u'%d:%s:%%' % (tid, user_id), keep, self.store_origin)
+
+    def revoke_tenant(self, tid, role=None):
+        """Revokes the sessions of a tenant, optionally only the ones of a role"""
+        for session_id in list(self.tenants.get(tid, ())):
+            if role is None or self[session_id].user_role == role:
+                self.delete(session_id)
+
+        if self.store is not None:
+            self.call_store('delete_group', u'%d:%%:%s' % (tid, role if role is not None else u'%'), None, self.store_origin)
+
+    def count(self, tid):
+        return len(self.tenants.get(tid, ()))
+
+    def count_by_role(self, tid):
+        ret = {}
+        for session_id in self.tenants.get(tid, ()):
+            role = self[session_id].user_role
+            ret[role] = ret.get(role, 0) + 1
+
+        return ret
 
     def new(self, tid, user_id, user_role, pcn, cc):
-        self.revoke(tid, user_id)
+        # The oldest sessions of the user exceeding the limit are revoked
+        ids = self.users.get((tid, user_id), ())
+        while ids and len(ids) >= Settings.max_sessions_per_user:
+            self.delete(next(iter(ids)))
+
         session = Session(tid, user_id, user_role, pcn, cc)
         self.set(session.id, session)
         return session
@@ -48,5 +153,4 @@ class SessionsFactory(TempDict):
         self.set(session.id, session)
         return session
 
-
 Sessions = SessionsFactory(timeout=Settings.authentication_lifetime)
@@ -78,6 +78,17 @@ class SettingsClass(object):
 
         self.authentication_lifetime = 3600
 
+        # maximum number of concurrent sessions of a user;
+        # the oldest session is revoked on login
+        self.max_sessions_per_user = 1
+
+        # store of the sessions and of the tokens: memory or sqlite
+        self.sessions_store = 'memory'
+
+        # port of the listener bound to 127.0.0.1 serving the metrics;
+        # 0 to disable it
+        self.metrics_port = 0
+
         self.accept_submissions = True
 
         # statistical, referred to latest period
@@ -166,6 +177,11 @@ class SettingsClass(object):
         self.db_schema = os.path.join(self.static_db_source, 'sqlite.sql')
         self.db_file_path = os.path.abspath(os.path.join(self.working_path, 'globaleaks.db'))
 
+        self.sessions_store_path = os.path.abspath(os.path.join(self.working_path, 'sessions.db'))
+        self.sessions_store_key_path = os.path.abspath(os.path.join(self.working_path, 'sessions.key'))
+
+        self.exit_nodes_path = os.path.abspath(os.path.join(self.working_path, 'exit-addresses'))
+
         self.logfile = os.path.abspath(os.path.join(self.log_path, 'globaleaks.log'))
         self.accesslogfile = os.path.abspath(os.path.join(self.log_path, "access.log"))
 
@@ -227,6 +243,19 @@ class SettingsClass(object):
 
         self.orm_debug = self.cmdline_options.orm_debug
 
+        if self.cmdline_options.max_sessions_per_user < 1:
+            self.print_msg("Invalid maximum number of sessions per user ( < 1 can't work! )")
+            sys.exit(1)
+
+        self.max_sessions_per_user = self.cmdline_options.max_sessions_per_user
+
+        self.sessions_store = self.cmdline_options.sessions_store
+
+        if self.cmdline_options.metrics_port and not self.validate_port(self.cmdline_options.metrics_port):
+            sys.exit(1)
+
+        self.metrics_port = self.cmdline_options.metrics_port
+
         if self.cmdline_options.working_path:
             self.working_path = self.cmdline_options.working_path
 
@@ -3,6 +3,7 @@ import os
 import re
 import sys
 import traceback
+from collections import deque
 
 from six import text_type
 
@@ -17,13 +18,16 @@ from globaleaks.orm import tw
 from globaleaks.settings import Settings
 from globaleaks.transactions import db_schedule_email
 from globaleaks.utils.agent import get_tor_agent, get_web_agent
+from globaleaks.utils.counters import SlidingWindowCounter
 from globaleaks.utils.crypto import sha256
+from globaleaks.utils.export import ExportList
 from globaleaks.utils.log import log
 from globaleaks.utils.mail import sendmail
 from globaleaks.utils.objectdict import ObjectDict
-from globaleaks.utils.pgp import PGPContext
+from globaleaks.utils.pgp import PGPKeyring
 from globaleaks.utils.singleton import Singleton
 from globaleaks.utils.tempdict import TempDict
+from globaleaks.utils.tempstore import SQLiteTempStore, ThreadedTempStore
 from globaleaks.utils.templating import Templating
 from globaleaks.utils.token import TokenList
 from globaleaks.utils.tor_exit_set import TorExitSet
@@ -36,9 +40,12 @@ def getAlarm(state):
 
 
 class TenantState(object):
+    # number of recent events kept for the activities page
+    event_queue_size = 1000
+
     def __init__(self, state):
-        self.RecentEventQ = []
-        self.EventQ = []
+        self.EventQ = deque(maxlen=self.event_queue_size)
+        self.EventCounters = {}
         self.AnomaliesQ = []
 
         # An ACME challenge will have 5 minutes to resolve
@@ -46,6 +53,30 @@ class TenantState(object):
 
         self.Alarm = getAlarm(state)
 
+    def add_event(self, event):
+        self.EventQ.append(event)
+
+        if event.event_type not in self.EventCounters:
+            self.EventCounters[event.event_type] = SlidingWindowCounter()
+
+        self.EventCounters[event.event_type].increment()
+
+    def count_events(self, window=None):
+        """
+        Return the number of the events of each type in the latest window
+        seconds or, if window is None, since the latest hourly reset
+        """
+        if window is None:
+            return {k: v.total for k, v in self.EventCounters.items() if v.total}
+
+        ret = {}
+        for k, v in self.EventCounters.items():
+            count = v.count(window)
+            if count:
+                ret[k] = count
+
+        return ret
+
 
 class StateClass(ObjectDict):
     __metaclass__ = Singleton
@@ -58,6 +89,7 @@ class StateClass(ObjectDict):
 
         self.https_socks = []
         self.http_socks = []
+        self.metrics_socks = []
 
         self.jobs = []
         self.jobs_monitor = None
@@ -80,6 +112,10 @@ class StateClass(ObjectDict):
         self.set_orm_tp(ThreadPool(4, 16))
         self.TempUploadFiles = TempDict(timeout=3600)
 
+        self.pgp_keyring = PGPKeyring()
+
+        self.sessions_store = None
+
         self.shutdown = False
 
     def init_environment(self):
@@ -89,6 +125,38 @@ class StateClass(ObjectDict):
         self.cleaning_dead_files()
 
         self.tokens = TokenList(self.settings.tmp_path)
+        self.exports = ExportList(self.settings.tmp_path)
+
+        self.pgp_keyring.clear()
+        self.pgp_keyring = PGPKeyring(self.settings.tmp_path)
+
+        # Tor users are recognized since the startup using the list of the latest run
+        self.tor_exit_set.load(self.settings.exit_nodes_path)
+
+    def open_sessions_store(self):
+        """
+        Persist the sessions and the tokens in the configured store, loading
+        the ones still valid from a previous run or from other processes
+        """
+        from globaleaks.sessions import Sessions
+
+        if self.settings.sessions_store != 'sqlite':
+            return
+
+        self.sessions_store = ThreadedTempStore(SQLiteTempStore(self.settings.sessions_store_path,
+                                                                self.settings.sessions_store_key_path))
+
+        Sessions.attach_store(self.sessions_store, u'sessions')
+        self.tokens.attach_store(self.sessions_store, u'tokens')
+
+    def close_sessions_store(self):
+        from globaleaks.sessions import Sessions
+
+        if self.sessions_store is not None:
+            Sessions.detach_store()
+            self.tokens.detach_store()
+            self.sessions_store.close()
+            self.sessions_store = None
 
     def set_orm_tp(self, orm_tp):
         self.orm_tp = orm_tp
@@ -241,13 +309,12 @@ class StateClass(ObjectDict):
         for mail_address, pgp_key_public in delivery_list:
             # Opportunisticly encrypt the mail body. NOTE that mails will go out
             # unencrypted if one address in the list does not have a public key set.
+            body = mail_body
             if pgp_key_public:
-                pgpctx = PGPContext(self.settings.tmp_path)
-                fingerprint = pgpctx.load_key(pgp_key_public)['fingerprint']
-                mail_body = pgpctx.encrypt_message(fingerprint, mail_body)
+                body = self.pgp_keyring.encrypt_message(pgp_key_public, mail_body)
 
             # avoid waiting for the notification to send and instead rely on threads to handle it
-            tw(db_schedule_email, 1, mail_address, mail_subject, mail_body)
+            tw(db_schedule_email, 1, mail_address, mail_subject, body)
 
     def refresh_connection_handpoints(self):
         # Remove selected onion services and add missing services
@@ -263,9 +330,7 @@ class StateClass(ObjectDict):
         subject, body = Templating().get_mail_subject_and_body(template_vars)
 
         if user_desc.get('pgp_key_public', ''):
-            pgpctx = PGPContext(self.settings.tmp_path)
-            fingerprint = pgpctx.load_key(user_desc['pgp_key_public'])['fingerprint']
-            body = pgpctx.encrypt_message(fingerprint, body)
+            body = self.pgp_keyring.encrypt_message(user_desc['pgp_key_public'], body)
 
         db_schedule_email(session, tid, user_desc['mail_address'], subject, body)
 
@@ -133,4 +133,4 @@ class TestAdminResetSubmissions(helpers.TestHandlerWithPopulatedDB):
         yield self.test_model_count(models.Comment, 0)
         yield self.test_model_count(models.Message, 0)
         yield self.test_model_count(models.Mail, 0)
-        yield self.test_model_count(models.SecureFileDelete, 8)
+        yield self.test_model_count(models.SecureFileDelete, 12)
@@ -5,6 +5,7 @@ from globaleaks import anomaly
 from globaleaks.handlers.admin import statistics
 from globaleaks.jobs.anomalies import Anomalies
 from globaleaks.jobs.statistics import Statistics
+from globaleaks.orm import QueryLog, SLOW_QUERY_THRESHOLD
 from globaleaks.tests import helpers
 
 
@@ -84,3 +85,38 @@ class TestJobsTiming(helpers.TestHandler):
         handler = self.request({}, role='admin')
 
         yield handler.get()
+
+
+class TestQueriesTiming(helpers.TestHandler):
+    _handler = statistics.QueriesTiming
+
+    @inlineCallbacks
+    def test_get(self):
+        QueryLog.threshold = 0
+
+        try:
+            yield statistics.get_stats(1, 0)
+        finally:
+            QueryLog.threshold = SLOW_QUERY_THRESHOLD
+
+        handler = self.request({}, role='admin')
+        response = yield handler.get()
+
+        self.assertTrue(response['queries'] > 0)
+        self.assertIn('globaleaks.handlers.admin.statistics.get_stats',
+                      [x['name'] for x in response['transactions']])
+
+        self.assertTrue(len(response['slow_queries']) > 0)
+        for query in response['slow_queries']:
+            self.assertNotIn('parameters', query)
+
+
+class TestSessionsCount(helpers.TestHandler):
+    _handler = statistics.SessionsCount
+
+    @inlineCallbacks
+    def test_get(self):
+        handler = self.request({}, role='admin')
+        response = yield handler.get()
+
+        self.assertEqual(response, [{'tid': 1, 'count': 1, 'roles': {'admin': 1}}])
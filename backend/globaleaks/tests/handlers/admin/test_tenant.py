@@ -5,6 +5,7 @@ from globaleaks.db import refresh_memory_variables
 from globaleaks.handlers.admin import tenant
 from globaleaks.models import config
 from globaleaks.orm import tw
+from globaleaks.state import State
 from globaleaks.tests import helpers
 
 
@@ -64,3 +65,21 @@ class TestTenantInstance(helpers.TestHandlerWithPopulatedDB):
 
     def test_delete(self):
         return self.handler.delete(4)
+
+    @inlineCallbacks
+    def test_refresh_hostnames(self):
+        yield tw(config.db_set_config_variable, 4, u'hostname', u'www.example.org')
+        yield refresh_memory_variables([4])
+        self.assertEqual(State.tenant_hostname_id_map[b'www.example.org'], 4)
+
+        # The previous hostname of the tenant is removed from the map
+        yield tw(config.db_set_config_variable, 4, u'hostname', u'www.example.com')
+        yield refresh_memory_variables([4])
+        self.assertNotIn(b'www.example.org', State.tenant_hostname_id_map)
+        self.assertEqual(State.tenant_hostname_id_map[b'www.example.com'], 4)
+        self.assertEqual(len(State.tenant_cache[4].languages_enabled),
+                         len(set(State.tenant_cache[4].languages_enabled)))
+
+        yield self.handler.delete(4)
+        self.assertNotIn(b'www.example.com', State.tenant_hostname_id_map)
+        self.assertNotIn(4, State.tenant_cache)
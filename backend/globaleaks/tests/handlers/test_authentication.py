@@ -30,6 +30,30 @@ class TestAuthentication(helpers.TestHandlerWithPopulatedDB):
         self.assertTrue('session_id' in response)
         self.assertEqual(len(Sessions), 1)
 
+    @inlineCallbacks
+    def test_max_sessions_per_user(self):
+        session_ids = []
+
+        Settings.max_sessions_per_user = 2
+
+        try:
+            for _ in range(3):
+                handler = self.request({
+                    'tid': 1,
+                    'username': 'admin',
+                    'password': helpers.VALID_PASSWORD1,
+                    'authcode': ''
+                })
+                response = yield handler.post()
+                session_ids.append(response['session_id'])
+        finally:
+            Settings.max_sessions_per_user = 1
+
+        # The oldest session is revoked by the login exceeding the limit
+        self.assertEqual(len(Sessions), 2)
+        self.assertTrue(Sessions.get(session_ids[0]) is None)
+        self.assertTrue(Sessions.get(session_ids[2]) is not None)
+
     @inlineCallbacks
     def test_successful_multitenant_login(self):
         handler = self.request({
@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
+import threading
+
+from io import BytesIO
+from zipfile import ZipFile
 
 from globaleaks.handlers import export
 from globaleaks.jobs.delivery import Delivery
 from globaleaks.tests import helpers
-from twisted.internet.defer import inlineCallbacks
+from globaleaks.rest import errors
+from globaleaks.state import State
+from globaleaks.utils.utility import deferred_sleep
+from twisted.internet.defer import Deferred, inlineCallbacks
 
 
 class TestExportHandler(helpers.TestHandlerWithPopulatedDB):
@@ -32,3 +39,174 @@ class TestExportHandler(helpers.TestHandlerWithPopulatedDB):
 
         yield handler.get(rtips_desc[0]['id'])
         self.assertNotEqual(handler.request.getResponseBody(), b'')
+
+        with ZipFile(BytesIO(handler.request.getResponseBody()), 'r') as f:
+            self.assertIsNone(f.testzip())
+
+
+class TestOpenExportFiles(helpers.TestGL):
+    def test_files_are_opened_lazily(self):
+        unwrapped = []
+        opened = []
+
+        def asymmetric_decrypt(user_key, crypto_tip_prv_key):
+            unwrapped.append(crypto_tip_prv_key)
+            return b'tip_prv_key'
+
+        def streaming_encryption_open(mode, tip_prv_key, path):
+            opened.append(path)
+            return BytesIO(b'data')
+
+        self.patch(export.GCE, 'asymmetric_decrypt', asymmetric_decrypt)
+        self.patch(export.GCE, 'streaming_encryption_open', streaming_encryption_open)
+
+        files = [{'fo': BytesIO(b'data'), 'name': 'data.txt', 'forged': True}]
+        files.extend({'name': 'files/%d' % i, 'path': '/path/%d' % i, 'crypto_tip_prv_key': b'key'} for i in range(3))
+
+        files = export.open_export_files(b'user_key', files)
+        self.assertEqual(opened, [])
+
+        next(files)
+        self.assertEqual(opened, [])
+
+        for i in range(3):
+            self.assertEqual(next(files)['name'], 'files/%d' % i)
+            self.assertEqual(opened, ['/path/%d' % j for j in range(i + 1)])
+
+        # The key of the tip is unwrapped once for all its files
+        self.assertEqual(unwrapped, [b'key'])
+
+
+class TestZipStreamProducer(helpers.TestHandler):
+    _handler = export.ExportHandler
+
+    @inlineCallbacks
+    def test_error_aborts_the_connection(self):
+        handler = self.request({}, role='receiver')
+        request = handler.request
+
+        connection_lost = Deferred()
+        aborted = []
+
+        class Transport(object):
+            def abortConnection(self):
+                aborted.append(True)
+                connection_lost.errback(Exception('connection aborted'))
+
+        request.transport = Transport()
+        request.notifyFinish = lambda: connection_lost
+
+        def chunks():
+            yield b'x' * 1024
+            raise Exception('unable to decrypt')
+
+        yield export.ZipStreamProducer(handler, chunks()).start()
+
+        # The truncated archive is not concluded as a complete response
+        self.assertEqual(aborted, [True])
+        self.assertEqual(request.finished, 0)
+
+
+class TestExportJobs(helpers.TestHandlerWithPopulatedDB):
+    complex_field_population = True
+    _handler = export.ExportJobCollection
+
+    @inlineCallbacks
+    def setUp(self):
+        yield helpers.TestHandlerWithPopulatedDB.setUp(self)
+
+        yield self.perform_full_submission_actions()
+
+        yield Delivery().run()
+
+    @inlineCallbacks
+    def test_export_job(self):
+        rtips_desc = yield self.get_rtips()
+        receiver_id = rtips_desc[0]['receiver_id']
+        rtips_ids = [x['id'] for x in rtips_desc if x['receiver_id'] == receiver_id]
+
+        handler = self.request({'rtips': rtips_ids}, role='receiver', user_id=receiver_id)
+        export_desc = yield handler.post()
+        self.assertEqual(sorted(export_desc['rtips']), sorted(rtips_ids))
+
+        exp = State.exports.get(export_desc['id'])
+        while exp.status not in (u'ready', u'failed'):
+            yield deferred_sleep(0.1)
+
+        self.assertEqual(exp.status, u'ready')
+
+        handler = self.request(role='receiver', user_id=receiver_id)
+        response = yield handler.get()
+        self.assertEqual(response[0]['progress'], 100)
+
+        handler = self.request(role='receiver', user_id=receiver_id, handler_cls=export.ExportJobInstance)
+        yield handler.get(exp.id)
+        body = handler.request.getResponseBody()
+        self.assertEqual(len(body), exp.size)
+
+        with ZipFile(BytesIO(body), 'r') as f:
+            self.assertIsNone(f.testzip())
+            self.assertIn('manifest.json', f.namelist())
+
+        handler = self.request(role='receiver', user_id=receiver_id, handler_cls=export.ExportJobInstance,
+                               headers={'range': b'bytes=10-109'})
+        yield handler.get(exp.id)
+        self.assertEqual(handler.request.responseCode, 206)
+        self.assertEqual(handler.request.getResponseBody(), body[10:110])
+
+        opened = []
+        open_export = exp.open
+
+        def track_open(mode, key):
+            opened.append(open_export(mode, key))
+            return opened[-1]
+
+        exp.open = track_open
+
+        handler = self.request(role='receiver', user_id=receiver_id, handler_cls=export.ExportJobInstance,
+                               headers={'range': b'bytes=%d-' % exp.size})
+        self.assertRaises(errors.RangeNotSatisfiable, handler.get, exp.id)
+
+        # The export opened is closed when the range is invalid
+        self.assertIsNone(opened[0].fd)
+
+        del exp.open
+
+        handler = self.request(role='receiver', user_id=receiver_id, handler_cls=export.ExportJobInstance)
+        yield handler.delete(exp.id)
+        self.assertIsNone(State.exports.get(exp.id))
+        self.assertRaises(errors.ResourceNotFound, handler.get, exp.id)
+
+    @inlineCallbacks
+    def test_files_are_opened_by_the_build(self):
+        rtips_desc = yield self.get_rtips()
+        receiver_id = rtips_desc[0]['receiver_id']
+        rtips_ids = [x['id'] for x in rtips_desc if x['receiver_id'] == receiver_id]
+
+        opened = []
+        open_export_files = export.open_export_files
+
+        def track_open(user_key, files):
+            for file_dict in open_export_files(user_key, files):
+                opened.append(threading.current_thread())
+                yield file_dict
+
+        self.patch(export, 'open_export_files', track_open)
+
+        # Another build is in progress
+        yield State.exports.semaphore.acquire()
+
+        handler = self.request({'rtips': rtips_ids}, role='receiver', user_id=receiver_id)
+        export_desc = yield handler.post()
+        exp = State.exports.get(export_desc['id'])
+
+        # The queued export does not hold any file open
+        self.assertEqual(opened, [])
+
+        State.exports.semaphore.release()
+        while exp.status not in (u'ready', u'failed'):
+            yield deferred_sleep(0.1)
+
+        self.assertEqual(exp.status, u'ready')
+        self.assertNotEqual(opened, [])
+        self.assertNotIn(threading.current_thread(), opened)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from twisted.web.test.requesthelper import DummyRequest
+
+from globaleaks.handlers import metrics
+from globaleaks.rest.api import APIResourceWrapper
+from globaleaks.tests import helpers
+from globaleaks.utils.metrics import job_duration, request_status
+
+
+class TestMetricsResource(helpers.TestGL):
+    def test_get(self):
+        request_status.inc((200,))
+        job_duration.observe(0.2, ('Notification',))
+
+        request = DummyRequest([b'metrics'])
+
+        response = metrics.MetricsResource().render_GET(request).decode('utf-8')
+
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'Content-Type'),
+                         [b'text/plain; version=0.0.4; charset=utf-8'])
+
+        self.assertIn('# TYPE globaleaks_http_responses_total counter\n', response)
+        self.assertIn('globaleaks_http_responses_total{code="200"}', response)
+        self.assertIn('globaleaks_job_duration_seconds_bucket{job="Notification",le="0.25"}', response)
+        self.assertIn('globaleaks_job_duration_seconds_bucket{job="Notification",le="+Inf"}', response)
+        self.assertIn('globaleaks_orm_queue_size 0\n', response)
+        self.assertIn('globaleaks_tokens ', response)
+
+    def test_not_served_by_the_api(self):
+        # The metrics are reachable only through the dedicated local listener
+        for _, handler, _ in APIResourceWrapper()._registry:
+            self.assertNotEqual(handler.__module__, metrics.__name__)
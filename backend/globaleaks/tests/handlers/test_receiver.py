@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
+import json
+
+from io import BytesIO
+from zipfile import ZipFile
+
 from twisted.internet.defer import inlineCallbacks
 
 from globaleaks import models
 from globaleaks.handlers import receiver
 from globaleaks.handlers.admin import user
-from globaleaks.orm import transact
+from globaleaks.jobs.delivery import Delivery
+from globaleaks.orm import transact, QueryLog
+from globaleaks.rest import errors
 from globaleaks.tests import helpers
 from globaleaks.utils.utility import datetime_never
 
@@ -14,6 +21,13 @@ def set_expiration_of_all_rtips_to_unlimited(session):
     session.query(models.InternalTip).update({'expiration_date': datetime_never()})
 
 
+@transact
+def get_closed_submission_status_id(session):
+    return session.query(models.SubmissionStatus.id) \
+                  .filter(models.SubmissionStatus.tid == 1,
+                          models.SubmissionStatus.system_usage == u'closed').one()[0]
+
+
 class TestUserInstance(helpers.TestHandlerWithPopulatedDB):
     _handler = receiver.ReceiverInstance
 
@@ -51,6 +65,74 @@ class TestTipsCollection(helpers.TestHandlerWithPopulatedDB):
             self.assertEqual(ret[idx]['comment_count'], 3)
             self.assertEqual(ret[idx]['message_count'], 2)
 
+    @inlineCallbacks
+    def test_get_executes_a_constant_number_of_queries(self):
+        handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+        count = QueryLog.count
+        yield handler.get()
+        count = QueryLog.count - count
+
+        yield self.perform_full_submission_actions()
+
+        handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+        with self.assert_max_queries(count):
+            yield handler.get()
+
+    @inlineCallbacks
+    def test_get_paginated(self):
+        for _ in range(2):
+            yield self.perform_full_submission_actions()
+
+        handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+        tips = yield handler.get()
+        self.assertTrue(len(tips) > 2)
+
+        for sort in ['progressive', '-progressive', 'creation_date', '-last_access']:
+            ret = []
+            cursor = None
+            while True:
+                handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+                handler.request.args = {b'sort': [sort.encode()], b'limit': [b'2']}
+                if cursor is not None:
+                    handler.request.args[b'cursor'] = [cursor]
+
+                page = yield handler.get()
+                self.assertTrue(len(page) <= 2)
+                ret.extend(page)
+
+                cursor = handler.request.responseHeaders.getRawHeaders(b'X-Next-Cursor', [None])[0]
+                if cursor is None:
+                    break
+
+            self.assertEqual(sorted(x['id'] for x in ret), sorted(x['id'] for x in tips))
+
+            if sort == 'progressive':
+                self.assertEqual([x['progressive'] for x in ret], sorted(x['progressive'] for x in tips))
+            elif sort == '-progressive':
+                self.assertEqual([x['progressive'] for x in ret], sorted((x['progressive'] for x in tips), reverse=True))
+
+    @inlineCallbacks
+    def test_get_filtered(self):
+        handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+        tips = yield handler.get()
+
+        handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+        handler.request.args = {b'context_id': [tips[0]['context_id'].encode()],
+                                b'min_score': [b'%d' % tips[0]['total_score']]}
+        ret = yield handler.get()
+        self.assertEqual(sorted(x['id'] for x in ret),
+                         sorted(x['id'] for x in tips if x['context_id'] == tips[0]['context_id'] and
+                                                        x['total_score'] >= tips[0]['total_score']))
+
+        handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+        handler.request.args = {b'label': [b'unexistent']}
+        ret = yield handler.get()
+        self.assertEqual(ret, [])
+
+        handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+        handler.request.args = {b'sort': [b'unexistent']}
+        yield self.assertFailure(handler.get(), errors.InputValidationError)
+
 
 class TestTipsOperations(helpers.TestHandlerWithPopulatedDB):
     _handler = receiver.TipsOperations
@@ -101,8 +183,119 @@ class TestTipsOperations(helpers.TestHandlerWithPopulatedDB):
         }
 
         handler = self.request(data_request, user_id=self.dummyReceiver_1['id'], role='receiver')
-        yield handler.put()
+        ret = yield handler.put()
+
+        self.assertEqual(ret, {rtip_id: u'ok' for rtip_id in rtips_ids})
 
         rtips = yield receiver.get_receivertip_list(1, self.dummyReceiver_1['id'], 'en')
 
         self.assertEqual(len(rtips), 0)
+
+    @inlineCallbacks
+    def test_put_delete_executes_a_constant_number_of_queries(self):
+        for _ in range(3):
+            yield self.perform_full_submission_actions()
+
+        rtips = yield receiver.get_receivertip_list(1, self.dummyReceiver_1['id'], 'en')
+
+        data_request = {
+            'operation': 'delete',
+            'rtips': [rtips[0]['id']]
+        }
+
+        handler = self.request(data_request, user_id=self.dummyReceiver_1['id'], role='receiver')
+        count = QueryLog.count
+        yield handler.put()
+        count = QueryLog.count - count
+
+        data_request = {
+            'operation': 'delete',
+            'rtips': [rtip['id'] for rtip in rtips[1:]]
+        }
+
+        handler = self.request(data_request, user_id=self.dummyReceiver_1['id'], role='receiver')
+        with self.assert_max_queries(count):
+            yield handler.put()
+
+    @inlineCallbacks
+    def test_put_update_status(self):
+        status_id = yield get_closed_submission_status_id()
+
+        rtips = yield receiver.get_receivertip_list(1, self.dummyReceiver_1['id'], 'en')
+        rtips_ids = [rtip['id'] for rtip in rtips]
+
+        data_request = {
+            'operation': 'update_status',
+            'rtips': rtips_ids,
+            'args': {'status': status_id, 'substatus': u''}
+        }
+
+        handler = self.request(data_request, user_id=self.dummyReceiver_1['id'], role='receiver')
+        yield handler.put()
+
+        rtips = yield receiver.get_receivertip_list(1, self.dummyReceiver_1['id'], 'en')
+        for rtip in rtips:
+            self.assertEqual(rtip['status'], status_id)
+            self.assertIsNone(rtip['substatus'])
+
+        yield self.test_model_count(models.SubmissionStatusChange, len(rtips_ids))
+
+        data_request['args']['status'] = u'unexistent'
+        handler = self.request(data_request, user_id=self.dummyReceiver_1['id'], role='receiver')
+        yield self.assertFailure(handler.put(), errors.ModelNotFound)
+
+    @inlineCallbacks
+    def test_put_update_label(self):
+        rtips = yield receiver.get_receivertip_list(1, self.dummyReceiver_1['id'], 'en')
+        rtips_ids = [rtip['id'] for rtip in rtips]
+
+        data_request = {
+            'operation': 'update_label',
+            'rtips': rtips_ids + [u'00000000-0000-0000-0000-000000000000'],
+            'args': {'value': u'spam'}
+        }
+
+        handler = self.request(data_request, user_id=self.dummyReceiver_1['id'], role='receiver')
+        ret = yield handler.put()
+
+        self.assertEqual(ret[u'00000000-0000-0000-0000-000000000000'], u'not_found')
+        for rtip_id in rtips_ids:
+            self.assertEqual(ret[rtip_id], u'ok')
+
+        rtips = yield receiver.get_receivertip_list(1, self.dummyReceiver_1['id'], 'en')
+        for rtip in rtips:
+            self.assertEqual(rtip['label'], u'spam')
+
+        # The arguments are mandatory for the operations requiring them
+        del data_request['args']
+        handler = self.request(data_request, user_id=self.dummyReceiver_1['id'], role='receiver')
+        self.assertRaises(errors.InputValidationError, handler.put)
+
+    @inlineCallbacks
+    def test_put_export(self):
+        for _ in range(3):
+            yield self.perform_full_submission_actions()
+
+        yield Delivery().run()
+
+        rtips = yield receiver.get_receivertip_list(1, self.dummyReceiver_1['id'], 'en')
+        rtips_ids = [rtip['id'] for rtip in rtips]
+
+        data_request = {
+            'operation': 'export',
+            'rtips': rtips_ids
+        }
+
+        handler = self.request(data_request, user_id=self.dummyReceiver_1['id'], role='receiver')
+        yield handler.put()
+
+        with ZipFile(BytesIO(handler.request.getResponseBody()), 'r') as f:
+            self.assertIsNone(f.testzip())
+
+            manifest = json.loads(f.read('manifest.json').decode('utf-8'))
+            self.assertEqual(set(tip['id'] for tip in manifest['tips']), set(rtips_ids))
+
+            for tip in manifest['tips']:
+                for filename in tip['files']:
+                    self.assertTrue(filename.startswith(tip['directory']))
+                    f.getinfo(filename)
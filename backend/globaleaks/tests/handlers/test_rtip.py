@@ -4,6 +4,7 @@ from twisted.internet.defer import inlineCallbacks
 from globaleaks import models
 from globaleaks.handlers import rtip
 from globaleaks.jobs.delivery import Delivery
+from globaleaks.orm import QueryLog
 from globaleaks.rest import errors
 from globaleaks.state import State
 from globaleaks.tests import helpers
@@ -26,6 +27,42 @@ class TestRTipInstance(helpers.TestHandlerWithPopulatedDB):
             handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
             yield handler.get(rtip_desc['id'])
 
+    @inlineCallbacks
+    def test_get_executes_a_constant_number_of_queries(self):
+        rtip_desc = (yield self.get_rtips())[0]
+
+        # The first access also updates the status of the submission
+        handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+        yield handler.get(rtip_desc['id'])
+
+        handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+        count = QueryLog.count
+        ret = yield handler.get(rtip_desc['id'])
+        count = QueryLog.count - count
+
+        for _ in range(3):
+            yield self.perform_post_submission_actions()
+
+        handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+        with self.assert_max_queries(count):
+            tip = yield handler.get(rtip_desc['id'])
+
+        self.assertTrue(len(tip['comments']) > len(ret['comments']))
+        self.assertTrue(len(tip['messages']) > len(ret['messages']))
+
+    @inlineCallbacks
+    def test_get_with_limit(self):
+        rtip_desc = (yield self.get_rtips())[0]
+
+        handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+        handler.request.args = {b'limit': [b'1']}
+        tip = yield handler.get(rtip_desc['id'])
+
+        self.assertEqual([c['id'] for c in tip['comments']], [c['id'] for c in rtip_desc['comments'][-1:]])
+        self.assertEqual([m['id'] for m in tip['messages']], [m['id'] for m in rtip_desc['messages'][-1:]])
+        self.assertEqual(tip['comments_count'], len(rtip_desc['comments']))
+        self.assertEqual(tip['messages_count'], len(rtip_desc['messages']))
+
     @inlineCallbacks
     def test_put_postpone(self):
         now = datetime_now()
@@ -183,7 +220,9 @@ class TestRTipInstance(helpers.TestHandlerWithPopulatedDB):
 
         self.assertEqual(len(rtip_descs), self.population_of_submissions * self.population_of_recipients - self.population_of_recipients)
 
-        yield self.test_model_count(models.SecureFileDelete, self.population_of_attachments * self.population_of_recipients)
+        # The files of the submission and of the receivers are marked for secure deletion
+        # without checking their existence, that is verified by the cleaning job
+        yield self.test_model_count(models.SecureFileDelete, self.population_of_attachments * (self.population_of_recipients + 1))
 
     @inlineCallbacks
     def test_delete_unexistent_tip_by_existent_and_logged_receiver(self):
@@ -221,6 +260,48 @@ class TestRTipCommentCollection(helpers.TestHandlerWithPopulatedDB):
             handler = self.request(body, role='receiver', user_id=rtip_desc['receiver_id'])
             yield handler.post(rtip_desc['id'])
 
+    @inlineCallbacks
+    def test_get(self):
+        rtip_desc = (yield self.get_rtips())[0]
+
+        for i in range(3):
+            handler = self.request({'content': u'comment %d' % i}, role='receiver', user_id=rtip_desc['receiver_id'])
+            yield handler.post(rtip_desc['id'])
+
+        handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+        comments = yield handler.get(rtip_desc['id'])
+        self.assertTrue(len(comments) >= 3)
+        self.assertEqual([c['content'] for c in comments[-3:]], [u'comment 0', u'comment 1', u'comment 2'])
+
+        handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+        handler.request.args = {b'limit': [b'2']}
+        page = yield handler.get(rtip_desc['id'])
+        self.assertEqual(page, comments[-2:])
+
+        handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+        handler.request.args = {b'before': [page[0]['id'].encode()], b'limit': [b'1']}
+        page = yield handler.get(rtip_desc['id'])
+        self.assertEqual(page, comments[-3:-2])
+
+        handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+        handler.request.args = {b'since': [comments[-3]['id'].encode()]}
+        page = yield handler.get(rtip_desc['id'])
+        self.assertEqual(page, comments[-2:])
+
+        handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+        handler.request.args = {b'since': [comments[-1]['id'].encode()]}
+        page = yield handler.get(rtip_desc['id'])
+        self.assertEqual(page, [])
+
+    @inlineCallbacks
+    def test_get_with_invalid_arguments(self):
+        rtip_desc = (yield self.get_rtips())[0]
+
+        for args in [{b'since': [b'unexistent']}, {b'limit': [b'0']}, {b'limit': [b'a']}]:
+            handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+            handler.request.args = args
+            yield self.assertFailure(handler.get(rtip_desc['id']), errors.InputValidationError)
+
 
 class TestReceiverMsgCollection(helpers.TestHandlerWithPopulatedDB):
     _handler = rtip.ReceiverMsgCollection
@@ -241,6 +322,23 @@ class TestReceiverMsgCollection(helpers.TestHandlerWithPopulatedDB):
             handler = self.request(body, role='receiver', user_id=rtip_desc['receiver_id'])
             yield handler.post(rtip_desc['id'])
 
+    @inlineCallbacks
+    def test_get(self):
+        rtip_desc = (yield self.get_rtips())[0]
+
+        handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+        messages = yield handler.get(rtip_desc['id'])
+        self.assertEqual([m['id'] for m in messages], [m['id'] for m in rtip_desc['messages']])
+
+        handler = self.request({'content': u'message'}, role='receiver', user_id=rtip_desc['receiver_id'])
+        yield handler.post(rtip_desc['id'])
+
+        handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'])
+        handler.request.args = {b'since': [messages[-1]['id'].encode()]}
+        page = yield handler.get(rtip_desc['id'])
+        self.assertEqual(len(page), 1)
+        self.assertEqual(page[0]['content'], u'message')
+
 
 class TestReceiverFileDownload(helpers.TestHandlerWithPopulatedDB):
     _handler = rtip.ReceiverFileDownload
@@ -36,6 +36,7 @@ class Test_TokenInstance(helpers.TestHandlerWithPopulatedDB):
         token = self.state.tokens.new(1, 'submission')
         token.solved = False
         token.question = '7GJ4Sl37AEnP10Zk9p7q'
+        token.difficulty = 8
 
         request_payload = token.serialize()
         request_payload['answer'] = 26
@@ -56,6 +57,7 @@ class Test_TokenInstance(helpers.TestHandlerWithPopulatedDB):
         token = self.state.tokens.new(1, 'submission')
         token.solved = False
         token.question = '7GJ4Sl37AEnP10Zk9p7q'
+        token.difficulty = 8
 
         request_payload = token.serialize()
         request_payload['answer'] = 0
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 from globaleaks.handlers import wbtip
+from globaleaks.orm import QueryLog
+from globaleaks.rest import errors
 from globaleaks.tests import helpers
 from twisted.internet.defer import inlineCallbacks
 
@@ -20,6 +22,37 @@ class TestWBTipInstance(helpers.TestHandlerWithPopulatedDB):
 
             yield handler.get()
 
+    @inlineCallbacks
+    def test_get_executes_a_constant_number_of_queries(self):
+        wbtip_desc = (yield self.get_wbtips())[0]
+
+        handler = self.request(role='whistleblower', user_id=wbtip_desc['id'])
+        count = QueryLog.count
+        ret = yield handler.get()
+        count = QueryLog.count - count
+
+        for _ in range(3):
+            yield self.perform_post_submission_actions()
+
+        handler = self.request(role='whistleblower', user_id=wbtip_desc['id'])
+        with self.assert_max_queries(count):
+            tip = yield handler.get()
+
+        self.assertTrue(len(tip['comments']) > len(ret['comments']))
+        self.assertTrue(len(tip['messages']) > len(ret['messages']))
+
+    @inlineCallbacks
+    def test_get_with_limit(self):
+        wbtip_desc = (yield self.get_wbtips())[0]
+
+        handler = self.request(role='whistleblower', user_id=wbtip_desc['id'])
+        handler.request.args = {b'limit': [b'1']}
+        tip = yield handler.get()
+
+        self.assertEqual([c['id'] for c in tip['comments']], [c['id'] for c in wbtip_desc['comments'][-1:]])
+        self.assertEqual(tip['comments_count'], len(wbtip_desc['comments']))
+        self.assertEqual(tip['messages_count'], len(wbtip_desc['messages']))
+
 
 class TestWBTipCommentCollection(helpers.TestHandlerWithPopulatedDB):
     _handler = wbtip.WBTipCommentCollection
@@ -41,6 +74,28 @@ class TestWBTipCommentCollection(helpers.TestHandlerWithPopulatedDB):
 
             yield handler.post()
 
+    @inlineCallbacks
+    def test_get(self):
+        wbtip_desc = (yield self.get_wbtips())[0]
+
+        handler = self.request(role='whistleblower', user_id=wbtip_desc['id'])
+        comments = yield handler.get()
+        self.assertEqual([c['id'] for c in comments], [c['id'] for c in wbtip_desc['comments']])
+
+        handler = self.request({'content': u'comment'}, role='whistleblower', user_id=wbtip_desc['id'])
+        yield handler.post()
+
+        handler = self.request(role='whistleblower', user_id=wbtip_desc['id'])
+        handler.request.args = {b'since': [comments[-1]['id'].encode()]}
+        page = yield handler.get()
+        self.assertEqual(len(page), 1)
+        self.assertEqual(page[0]['content'], u'comment')
+
+        handler = self.request(role='whistleblower', user_id=wbtip_desc['id'])
+        handler.request.args = {b'before': [page[0]['id'].encode()], b'limit': [b'1']}
+        page = yield handler.get()
+        self.assertEqual([c['id'] for c in page], [comments[-1]['id']])
+
 
 class TestWBTipMessageCollection(helpers.TestHandlerWithPopulatedDB):
     _handler = wbtip.WBTipMessageCollection
@@ -63,6 +118,20 @@ class TestWBTipMessageCollection(helpers.TestHandlerWithPopulatedDB):
             for rcvr_id in wbtip_desc['receivers_ids']:
                 yield handler.post(rcvr_id)
 
+    @inlineCallbacks
+    def test_get(self):
+        wbtip_desc = (yield self.get_wbtips())[0]
+        rcvr_id = wbtip_desc['receivers_ids'][0]
+
+        handler = self.request(role='whistleblower', user_id=wbtip_desc['id'])
+        messages = yield handler.get(rcvr_id)
+        self.assertEqual(set(m['id'] for m in messages),
+                         set(m['id'] for m in wbtip_desc['messages'] if m['receiver_involved'] == rcvr_id))
+
+        handler = self.request(role='whistleblower', user_id=wbtip_desc['id'])
+        handler.request.args = {b'since': [b'unexistent']}
+        yield self.assertFailure(handler.get(rcvr_id), errors.InputValidationError)
+
 
 class WBTipIdentityHandler(helpers.TestHandlerWithPopulatedDB):
     _handler = wbtip.WBTipIdentityHandler
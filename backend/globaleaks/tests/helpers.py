@@ -18,6 +18,7 @@ import shutil
 import signal
 import six
 
+from contextlib import contextmanager
 from datetime import timedelta
 
 # pylint: disable=no-name-in-module
@@ -640,8 +641,7 @@ class TestGL(unittest.TestCase):
             for event_obj in event.events_monitored:
                 for x in range(2):
                     e = event.Event(event_obj, timedelta(seconds=1.0 * x))
-                    self.state.tenant_state[1].RecentEventQ.append(e)
-                    self.state.tenant_state[1].EventQ.append(e)
+                    self.state.tenant_state[1].add_event(e)
 
     @transact
     def get_rtips(self, session):
@@ -715,6 +715,19 @@ class TestGL(unittest.TestCase):
     def get_model_count(self, session, model):
         return session.query(model).count()
 
+    @contextmanager
+    def assert_max_queries(self, n):
+        """
+        Asserts that the code executed within the context does not
+        execute more than n queries on the database
+        """
+        count = orm.QueryLog.count
+
+        yield
+
+        count = orm.QueryLog.count - count
+        self.assertTrue(count <= n, "%d queries executed, expected at most %d" % (count, n))
+
 
 class TestGLWithPopulatedDB(TestGL):
     complex_field_population = False
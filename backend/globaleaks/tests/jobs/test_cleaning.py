@@ -3,7 +3,7 @@ import os
 
 from globaleaks import models
 from globaleaks.jobs import cleaning, delivery
-from globaleaks.orm import transact
+from globaleaks.orm import transact, tw
 from globaleaks.settings import Settings
 from globaleaks.state import State
 from globaleaks.tests import helpers
@@ -11,6 +11,15 @@ from twisted.internet.defer import inlineCallbacks
 
 
 class TestCleaning(helpers.TestGLWithPopulatedDB):
+    @inlineCallbacks
+    def setUp(self):
+        yield helpers.TestGLWithPopulatedDB.setUp(self)
+        self.job = cleaning.Cleaning()
+
+    @inlineCallbacks
+    def tearDown(self):
+        yield self.job.stop()
+        helpers.TestGLWithPopulatedDB.tearDown(self)
     @transact
     def check0(self, session):
         self.assertTrue(os.listdir(Settings.attachments_path) == [])
@@ -99,28 +108,28 @@ class TestCleaning(helpers.TestGLWithPopulatedDB):
         # verify tip creation
         yield self.check1()
 
-        yield cleaning.Cleaning().run()
+        yield self.job.run()
 
         # verify tips survive the scheduler if they are not expired
         yield self.check1()
 
         yield self.force_wbtip_expiration()
 
-        yield cleaning.Cleaning().run()
+        yield self.job.run()
 
         # verify rtips survive the scheduler if the wbtip expires
         yield self.check2()
 
         yield self.set_itips_near_to_expire()
 
-        yield cleaning.Cleaning().run()
+        yield self.job.run()
 
         # verify mail creation and that rtips survive the scheduler
         yield self.check3()
 
         yield self.force_itip_expiration()
 
-        yield cleaning.Cleaning().run()
+        yield self.job.run()
 
         # verify cascade deletion when tips expire
         yield self.check4()
@@ -128,5 +137,45 @@ class TestCleaning(helpers.TestGLWithPopulatedDB):
         # Make sure password resets actually happen
         State.tenant_cache[1]['password_change_period'] = 90
         yield self.set_passwords_ready_to_expire(1)
-        yield cleaning.Cleaning().run()
+        yield self.job.run()
         yield self.check5()
+
+    @inlineCallbacks
+    def test_job_in_batches(self):
+        for _ in range(3):
+            yield self.perform_full_submission_actions()
+
+        yield delivery.Delivery().run()
+
+        yield self.force_itip_expiration()
+
+        self.job.batch_size = 1
+        yield self.job.run()
+
+        yield self.test_model_count(models.InternalTip, 0)
+        yield self.test_model_count(models.SecureFileDelete, 0)
+
+        self.assertTrue(all(phase in self.job.phases_timings for phase, _ in self.job.phases))
+
+        self.assertTrue(self.job.progress['files'] > 1)
+        self.assertEqual(self.job.progress['pending'], 0)
+
+    @inlineCallbacks
+    def test_job_resumes_from_cursor(self):
+        yield self.perform_full_submission_actions()
+
+        yield self.force_itip_expiration()
+
+        # Emulate an execution interrupted after the deletion of the expired tips
+        yield tw(cleaning.db_set_cleaning_cursor, ['check_for_expiring_submissions', 1])
+
+        yield self.job.run()
+
+        yield self.test_model_count(models.InternalTip, self.population_of_submissions)
+
+        cursor = yield tw(cleaning.db_get_cleaning_cursor)
+        self.assertIsNone(cursor)
+
+        yield self.job.run()
+
+        yield self.test_model_count(models.InternalTip, 0)
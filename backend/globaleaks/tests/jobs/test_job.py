@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
+from twisted.internet import defer
+
 from globaleaks.jobs.job import LoopingJob
 
 from globaleaks.tests import helpers
+from globaleaks.utils.worksignals import Signals
 
 
 class LoopingJobX(LoopingJob):
@@ -12,6 +15,22 @@ class LoopingJobX(LoopingJob):
         self.operation_called += 1
 
 
+class LoopingJobY(LoopingJob):
+    interval = 3600
+    signals = ['test']
+    operation_called = 0
+
+    def operation(self):
+        self.operation_called += 1
+
+
+class LoopingJobZ(LoopingJobY):
+    def operation(self):
+        self.operation_called += 1
+        self.pending = defer.Deferred()
+        return self.pending
+
+
 class TestLoopingJob(helpers.TestGL):
     def test_base_scheduler(self):
         """
@@ -35,3 +54,49 @@ class TestLoopingJob(helpers.TestGL):
             self.assertEqual(job.operation_called, i)
 
         return job.stop()
+
+    def test_wakeup(self):
+        job = LoopingJobY()
+
+        self.test_reactor.advance(0)
+        self.assertEqual(job.operation_called, 1)
+
+        # multiple signals are coalesced in a single execution
+        Signals.emit('test')
+        Signals.emit('test')
+        self.test_reactor.advance(0)
+        self.assertEqual(job.operation_called, 2)
+
+        # signals of other jobs are ignored
+        Signals.emit('other')
+        self.test_reactor.advance(0)
+        self.assertEqual(job.operation_called, 2)
+
+        # a stopped job is not woken up
+        job.stop()
+        Signals.emit('test')
+        self.test_reactor.advance(0)
+        self.assertEqual(job.operation_called, 2)
+
+    def test_wakeup_pending_is_reset_on_stop(self):
+        job = LoopingJobZ()
+
+        self.test_reactor.advance(0)
+        self.assertEqual(job.operation_called, 1)
+
+        # a signal received during the execution is recorded
+        Signals.emit('test')
+        self.assertTrue(job.wakeup_pending)
+
+        job.stop()
+        job.pending.callback(None)
+
+        # a restarted job does not execute the wakeup received before the stop
+        job.start(job.interval)
+        self.assertEqual(job.operation_called, 2)
+        job.pending.callback(None)
+
+        self.test_reactor.advance(0)
+        self.assertEqual(job.operation_called, 2)
+
+        return job.stop()
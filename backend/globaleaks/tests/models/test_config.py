@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
+from twisted.internet.defer import inlineCallbacks
+
 from globaleaks import models
 from globaleaks.models import config
-from globaleaks.orm import transact
+from globaleaks.orm import transact, tw
 from globaleaks.tests import helpers
 
 
@@ -30,3 +32,84 @@ class TestModels(helpers.TestGL):
             config.ConfigFactory(session, 1).update_defaults()
 
         return transaction()
+
+
+def db_get_name(session):
+    return config.ConfigFactory(session, 1).get_val(u'name')
+
+
+def db_set_name(session, name):
+    config.ConfigFactory(session, 1).set_val(u'name', name)
+
+    # The session reads its own changes
+    assert config.ConfigFactory(session, 1).get_val(u'name') == name
+
+
+class TestConfigCache(helpers.TestGL):
+    @inlineCallbacks
+    def test_cache(self):
+        name = yield tw(db_get_name)
+        self.assertIn((1,), config.ConfigCache.values)
+
+        yield tw(db_set_name, u'changed')
+        self.assertNotIn((1,), config.ConfigCache.values)
+        name = yield tw(db_get_name)
+        self.assertEqual(name, u'changed')
+
+        # The changes applied out of the factories invalidate the cache as well
+        def db_rename(session, name):
+            session.query(models.Config).filter(models.Config.tid == 1, models.Config.var_name == u'name').one().value = name
+
+        yield tw(db_rename, u'renamed')
+        name = yield tw(db_get_name)
+        self.assertEqual(name, u'renamed')
+
+        def db_bulk_rename(session, name):
+            session.query(models.Config).filter(models.Config.tid == 1, models.Config.var_name == u'name').update({'value': name})
+
+        yield tw(db_bulk_rename, u'bulk')
+        name = yield tw(db_get_name)
+        self.assertEqual(name, u'bulk')
+
+    @inlineCallbacks
+    def test_rollback(self):
+        def db_set_name_and_fail(session, name):
+            db_set_name(session, name)
+            raise Exception
+
+        name = yield tw(db_get_name)
+
+        yield self.assertFailure(tw(db_set_name_and_fail, u'changed'), Exception)
+
+        self.assertEqual((yield tw(db_get_name)), name)
+
+    @inlineCallbacks
+    def test_rollback_of_uncommitted_reads(self):
+        def db_bulk_update_and_fail(session):
+            session.query(models.Config).filter(models.Config.tid == 1, models.Config.var_name == u'counter_submissions').update({'value': 777})
+
+            # The session reads its own changes without caching them
+            assert config.ConfigFactory(session, 1).get_val(u'counter_submissions') == 777
+            raise Exception
+
+        def db_get_counter(session):
+            return (session.query(models.Config.value).filter(models.Config.tid == 1, models.Config.var_name == u'counter_submissions').one()[0],
+                    config.ConfigFactory(session, 1).get_val(u'counter_submissions'))
+
+        yield self.assertFailure(tw(db_bulk_update_and_fail), Exception)
+
+        value, cached = yield tw(db_get_counter)
+        self.assertEqual(value, 0)
+        self.assertEqual(cached, 0)
+
+        def db_add_and_fail(session):
+            session.query(models.Config).filter(models.Config.tid == 1, models.Config.var_name == u'name').delete()
+            session.add(models.Config({'tid': 1, 'var_name': u'name', 'value': u'uncommitted'}))
+
+            # The read autoflushes the pending row
+            assert config.ConfigFactory(session, 1).get_val(u'name') == u'uncommitted'
+            raise Exception
+
+        name = yield tw(db_get_name)
+        yield self.assertFailure(tw(db_add_and_fail), Exception)
+        self.assertEqual((yield tw(db_get_name)), name)
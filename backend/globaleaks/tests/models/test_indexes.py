@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from six import text_type
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks import models
+from globaleaks.orm import transact
+from globaleaks.tests import helpers
+from globaleaks.utils.utility import datetime_now, uuid4
+
+
+def explain_query_plan(session, query):
+    compiled = query.statement.compile(dialect=session.bind.dialect)
+    params = [compiled.params[k] for k in compiled.positiontup]
+
+    cursor = session.connection().connection.cursor()
+    cursor.execute('EXPLAIN QUERY PLAN ' + text_type(compiled), params)
+
+    return [row[3] for row in cursor.fetchall()]
+
+
+class TestQueryPlans(helpers.TestGLWithPopulatedDB):
+    """
+    Verify that the queries executed by jobs and handlers on the hot
+    paths are resolved through the indexes and not with full table scans.
+    """
+    population_size = 2000
+
+    @transact
+    def populate(self, session):
+        now = datetime_now()
+
+        itips, rtips, ifiles, rfiles, comments, messages, mails = [], [], [], [], [], [], []
+
+        for i in range(self.population_size):
+            itip_id, rtip_id, ifile_id = uuid4(), uuid4(), uuid4()
+
+            # Only a small fraction of the data is pending to be processed
+            new = i % 100 == 0
+
+            itips.append({'id': itip_id, 'tid': 1, 'context_id': uuid4(), 'preview': '{}', 'progressive': i + 1,
+                          'creation_date': now, 'update_date': now, 'wb_last_access': now,
+                          'expiration_date': now + timedelta(days=i)})
+
+            rtips.append({'id': rtip_id, 'internaltip_id': itip_id, 'receiver_id': self.dummyReceiver_1['id'], 'new': new})
+
+            ifiles.append({'id': ifile_id, 'internaltip_id': itip_id, 'name': u'file', 'filename': ifile_id,
+                           'content_type': u'application/octet-stream', 'size': 0, 'new': new, 'creation_date': now})
+
+            rfiles.append({'id': uuid4(), 'internalfile_id': ifile_id, 'receivertip_id': rtip_id,
+                           'filename': ifile_id, 'new': new})
+
+            comments.append({'id': uuid4(), 'internaltip_id': itip_id, 'content': u'comment', 'type': u'receiver',
+                             'new': new, 'creation_date': now})
+
+            messages.append({'id': uuid4(), 'receivertip_id': rtip_id, 'content': u'message', 'type': u'receiver',
+                             'new': new, 'creation_date': now})
+
+            mails.append({'id': uuid4(), 'tid': 1, 'address': u'test@example.net', 'subject': u'subject', 'body': u'body',
+                          'creation_date': now - timedelta(seconds=i)})
+
+        for model, rows in [(models.InternalTip, itips),
+                            (models.ReceiverTip, rtips),
+                            (models.InternalFile, ifiles),
+                            (models.ReceiverFile, rfiles),
+                            (models.Comment, comments),
+                            (models.Message, messages),
+                            (models.Mail, mails)]:
+            session.execute(model.__table__.insert(), rows)
+
+    def get_hot_queries(self, session):
+        receiver_id = self.dummyReceiver_1['id']
+        itip_id = session.query(models.InternalTip.id).first()[0]
+        rtip_id = session.query(models.ReceiverTip.id).first()[0]
+
+        return {
+            'delivery_internalfiles': session.query(models.InternalFile, models.InternalTip)
+                                             .filter(models.InternalFile.new == True,
+                                                     models.InternalTip.id == models.InternalFile.internaltip_id),
+            'delivery_receivertips': session.query(models.ReceiverTip, models.User)
+                                            .filter(models.ReceiverTip.internaltip_id == itip_id,
+                                                    models.User.id == models.ReceiverTip.receiver_id),
+            'notification_receivertips': session.query(models.ReceiverTip).filter(models.ReceiverTip.new == True),
+            'notification_comments': session.query(models.Comment).filter(models.Comment.new == True),
+            'notification_messages': session.query(models.Message).filter(models.Message.new == True),
+            'notification_receiverfiles': session.query(models.ReceiverFile).filter(models.ReceiverFile.new == True),
+            'notification_whistleblowerfiles': session.query(models.WhistleblowerFile).filter(models.WhistleblowerFile.new == True),
+            'receivertips_of_receiver': session.query(models.ReceiverTip, models.InternalTip)
+                                               .filter(models.ReceiverTip.receiver_id == receiver_id,
+                                                       models.InternalTip.id == models.ReceiverTip.internaltip_id,
+                                                       models.InternalTip.tid == 1),
+            'comments_of_tip': session.query(models.Comment).filter(models.Comment.internaltip_id == itip_id),
+            'messages_of_tip': session.query(models.Message).filter(models.Message.receivertip_id == rtip_id),
+            'receiverfiles_of_tip': session.query(models.ReceiverFile).filter(models.ReceiverFile.receivertip_id == rtip_id),
+            'internalfiles_of_tip': session.query(models.InternalFile).filter(models.InternalFile.internaltip_id == itip_id),
+            'expired_tips': session.query(models.InternalTip.id).filter(models.InternalTip.expiration_date < datetime_now()),
+            'mail_pool': session.query(models.Mail).order_by(models.Mail.creation_date)
+        }
+
+    @transact
+    def get_full_scans(self, session):
+        ret = {}
+
+        for name, query in self.get_hot_queries(session).items():
+            scans = [x for x in explain_query_plan(session, query) if x.startswith('SCAN') and 'INDEX' not in x]
+            if scans:
+                ret[name] = scans
+
+        return ret
+
+    @inlineCallbacks
+    def test_hot_queries_use_indexes(self):
+        yield self.populate()
+
+        full_scans = yield self.get_full_scans()
+
+        self.assertEqual(full_scans, {})
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 from globaleaks.models import Tenant
-from globaleaks.orm import get_session, transact
+from globaleaks.orm import get_session, transact, tw, QueryLog
 from globaleaks.tests import helpers
+from globaleaks.utils.worksignals import db_emit_signals, Signals
 from twisted.internet.defer import inlineCallbacks
 
 
@@ -15,6 +16,13 @@ class TestORM(helpers.TestGL):
         self.assertEqual(session.execute("PRAGMA secure_delete").fetchone()[0], 1)  # ON
         self.assertEqual(session.execute("PRAGMA auto_vacuum").fetchone()[0], 1)   # FULL
 
+    @transact
+    def _transact_with_signal(self, session, fail):
+        db_emit_signals(session, 'test')
+
+        if fail:
+            raise Exception("antani")
+
     @transact
     def _transact_with_success(self, session):
         self.db_add_config(session)
@@ -24,6 +32,11 @@ class TestORM(helpers.TestGL):
         self.db_add_config(session)
         raise Exception("antani")
 
+    @transact
+    def _transact_with_queries(self, session, n):
+        for _ in range(n):
+            session.query(Tenant).count()
+
     def db_add_config(self, session):
         session.add(Tenant())
 
@@ -56,3 +69,38 @@ class TestORM(helpers.TestGL):
             self.assertTrue(getattr(session, 'query'))
 
         return transaction()
+
+    @inlineCallbacks
+    def test_signals_are_emitted_after_commit(self):
+        emitted = []
+
+        def callback():
+            emitted.append(True)
+
+        Signals.subscribe('test', callback)
+
+        try:
+            yield self.assertFailure(self._transact_with_signal(True), Exception)
+            self.assertEqual(emitted, [])
+
+            yield self._transact_with_signal(False)
+            self.assertEqual(emitted, [True])
+        finally:
+            Signals.unsubscribe('test', callback)
+
+    @inlineCallbacks
+    def test_queries_are_attributed_to_transactions(self):
+        count = QueryLog.count
+
+        yield self._transact_with_queries(3)
+        with self.assert_max_queries(3):
+            yield self._transact_with_queries(3)
+
+        self.assertTrue(QueryLog.count - count >= 6)
+
+        stats = QueryLog.transactions['globaleaks.tests.test_orm._transact_with_queries']
+        self.assertEqual(stats['executions'], 2)
+        self.assertEqual(stats['max_queries'], 3)
+
+        yield tw(self.db_add_config)
+        self.assertIn('globaleaks.tests.test_orm.db_add_config', QueryLog.transactions)
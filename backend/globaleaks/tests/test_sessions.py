@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from globaleaks.sessions import Sessions
+from globaleaks.settings import Settings
+from globaleaks.tests import helpers
+
+
+class TestSessions(helpers.TestGL):
+    def test_new_revokes_previous_session(self):
+        s1 = Sessions.new(1, u'user', u'receiver', False, b'')
+        s2 = Sessions.new(1, u'user', u'receiver', False, b'')
+
+        self.assertTrue(Sessions.get(s1.id) is None)
+        self.assertTrue(Sessions.get(s2.id) is not None)
+        self.assertEqual(list(Sessions.users[(1, u'user')]), [s2.id])
+
+    def test_max_sessions_per_user(self):
+        Settings.max_sessions_per_user = 2
+
+        try:
+            sessions = [Sessions.new(1, u'user', u'receiver', False, b'') for _ in range(3)]
+        finally:
+            Settings.max_sessions_per_user = 1
+
+        self.assertTrue(Sessions.get(sessions[0].id) is None)
+        self.assertEqual(list(Sessions.users[(1, u'user')]), [sessions[1].id, sessions[2].id])
+
+    def test_revoke(self):
+        s1 = Sessions.new(1, u'user', u'receiver', False, b'')
+        s2 = Sessions.new(2, u'user', u'receiver', False, b'')
+
+        Sessions.revoke(1, u'user')
+
+        self.assertTrue(Sessions.get(s1.id) is None)
+        self.assertTrue(Sessions.get(s2.id) is not None)
+        self.assertEqual(Sessions.count(1), 0)
+        self.assertEqual(Sessions.count(2), 1)
+
+    def test_revoke_tenant(self):
+        Sessions.new(1, u'admin', u'admin', False, b'')
+        Sessions.new(1, u'receiver', u'receiver', False, b'')
+        Sessions.new(2, u'receiver', u'receiver', False, b'')
+
+        self.assertEqual(Sessions.count_by_role(1), {u'admin': 1, u'receiver': 1})
+
+        Sessions.revoke_tenant(1, u'receiver')
+        self.assertEqual(Sessions.count_by_role(1), {u'admin': 1})
+
+        Sessions.revoke_tenant(1)
+        self.assertEqual(Sessions.count(1), 0)
+        self.assertEqual(Sessions.count(2), 1)
+
+    def test_indexes_follow_expiration_and_regeneration(self):
+        session = Sessions.new(1, u'user', u'receiver', False, b'')
+        old_id = session.id
+
+        session = Sessions.regenerate(session.id)
+        self.assertEqual(list(Sessions.users[(1, u'user')]), [session.id])
+        self.assertNotIn(old_id, Sessions.tenants[1])
+
+        self.test_reactor.advance(Sessions.get_timeout() + 1)
+
+        self.assertEqual(len(Sessions), 0)
+        self.assertEqual(Sessions.users, {})
+        self.assertEqual(Sessions.tenants, {})
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks.orm import tw
+from globaleaks.tests import helpers
+from globaleaks.transactions import db_schedule_email
+from globaleaks.utils.worksignals import Signals
+
+
+class TestTransactions(helpers.TestGL):
+    @inlineCallbacks
+    def test_schedule_email_wakes_up_the_notification(self):
+        emitted = []
+
+        def callback():
+            emitted.append(True)
+
+        Signals.subscribe('notification', callback)
+
+        try:
+            yield tw(db_schedule_email, 1, u'antani@mail.org', u'subject', u'body')
+            self.assertEqual(emitted, [True])
+        finally:
+            Signals.unsubscribe('notification', callback)
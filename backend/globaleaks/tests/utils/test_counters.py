@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from twisted.trial import unittest
+
+from globaleaks import event
+from globaleaks.state import TenantState
+from globaleaks.utils.counters import RingCounter, SlidingWindowCounter
+
+
+class TestRingCounter(unittest.TestCase):
+    def test_count(self):
+        counter = RingCounter(1, 10)
+
+        for now in range(20):
+            counter.increment(now, now)
+
+        self.assertEqual(counter.count(19, 1), 19)
+        self.assertEqual(counter.count(19, 3), 17 + 18 + 19)
+        self.assertEqual(counter.count(19, 100), sum(range(10, 20)))
+
+        # the buckets left behind are not counted
+        self.assertEqual(counter.count(25, 10), sum(range(16, 20)))
+        self.assertEqual(counter.count(100, 10), 0)
+
+
+class TestSlidingWindowCounter(unittest.TestCase):
+    def test_windows(self):
+        counter = SlidingWindowCounter()
+
+        # an event every second for two hours
+        for now in range(7200):
+            counter.increment(now)
+
+        self.assertEqual(counter.total, 7200)
+        self.assertEqual(counter.count(10, 7199), 10)
+        self.assertEqual(counter.count(60, 7199), 60)
+        self.assertEqual(counter.count(600, 7199), 600)
+        self.assertEqual(counter.count(3600, 7199), 3600)
+        self.assertEqual(counter.count(86400, 7199), 7200)
+
+    def test_flood(self):
+        counter = SlidingWindowCounter()
+
+        for i in range(1000000):
+            counter.increment(i / 100.0)
+
+        self.assertEqual(counter.total, 1000000)
+        self.assertEqual(counter.count(1, 9999.99), 100)
+        self.assertEqual([len(ring.buckets) for ring in counter.rings], [60, 60, 24])
+
+
+class TestTenantState(unittest.TestCase):
+    def test_add_event(self):
+        tenant_state = TenantState(None)
+
+        for _ in range(TenantState.event_queue_size * 10):
+            tenant_state.add_event(event.Event(event.events_monitored[0], timedelta(seconds=1)))
+
+        self.assertEqual(len(tenant_state.EventQ), TenantState.event_queue_size)
+        self.assertEqual(tenant_state.count_events(), {'failed_logins': TenantState.event_queue_size * 10})
+        self.assertEqual(tenant_state.count_events(3600), {'failed_logins': TenantState.event_queue_size * 10})
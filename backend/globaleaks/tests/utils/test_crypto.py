@@ -1,10 +1,13 @@
 # -*- coding: utf-8
 import filecmp
 import os
+import threading
+import time
 
 from globaleaks.settings import Settings
 from globaleaks.tests import helpers
-from globaleaks.utils.crypto import GCE
+from globaleaks.utils import crypto
+from globaleaks.utils.crypto import GCE, PARALLEL_DECRYPTION_THRESHOLD
 
 password = b'password'
 message = b'message'
@@ -42,6 +45,36 @@ class TestCryptoUtils(helpers.TestGL):
         dec = GCE.asymmetric_decrypt(prv_key, enc)
         self.assertEqual(dec, message)
 
+    def test_crypto_generate_encrypt_decrypt_message_batch(self):
+        prv_key, pub_key = GCE.generate_keypair()
+
+        for n in [1, PARALLEL_DECRYPTION_THRESHOLD * 4]:
+            messages = [b'%s %d' % (message, i) for i in range(n)]
+            enc = [GCE.asymmetric_encrypt(pub_key, m) for m in messages]
+            self.assertEqual(GCE.asymmetric_decrypt_batch(prv_key, enc), messages)
+
+    def test_decryption_pool_is_created_once(self):
+        created = []
+
+        def ThreadPool(n):
+            created.append(n)
+            time.sleep(0.1)
+            return object()
+
+        self.patch(crypto, 'ThreadPool', ThreadPool)
+        self.patch(crypto, '_decryption_pool', None)
+
+        pools = []
+        threads = [threading.Thread(target=lambda: pools.append(crypto.get_decryption_pool())) for _ in range(4)]
+        for t in threads:
+            t.start()
+
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(created), 1)
+        self.assertTrue(all(pool is pools[0] for pool in pools))
+
     def test_check_password(self):
         hash = GCE.hash_password(password, salt)
         self.assertTrue(GCE.check_password(GCE.HASH, password, salt, hash))
@@ -1,9 +1,12 @@
 # -*- coding: utf-8
 import os
+import threading
+import time
 
 from globaleaks.rest import errors
 from globaleaks.settings import Settings
 from globaleaks.tests import helpers
+from globaleaks.utils import fs
 from globaleaks.utils.fs import directory_traversal_check
 
 
@@ -18,3 +21,84 @@ class TestFilesystemAccess(helpers.TestGL):
     def test_directory_traversal_check_allowed(self):
         valid_access = os.path.join(Settings.files_path, "valid.txt")
         directory_traversal_check(Settings.files_path, valid_access)
+
+
+class TestSecureDeletion(helpers.TestGL):
+    def create_file(self, name, size):
+        path = os.path.join(Settings.tmp_path, name)
+        with open(path, 'wb') as f:
+            f.write(b'a' * size)
+
+        return path
+
+    def test_overwrite_and_remove(self):
+        path = self.create_file('file', fs.SECURE_DELETION_BLOCK_SIZE + 1)
+
+        written = []
+        os_remove = os.remove
+
+        def remove(p):
+            with open(p, 'rb') as f:
+                written.append(f.read())
+
+            os_remove(p)
+
+        self.patch(os, 'remove', remove)
+
+        self.assertEqual(fs.overwrite_and_remove(path), fs.SECURE_DELETION_BLOCK_SIZE + 1)
+        self.assertFalse(os.path.exists(path))
+
+        # the whole length of the file has been overwritten
+        self.assertEqual(len(written[0]), fs.SECURE_DELETION_BLOCK_SIZE + 1)
+        self.assertNotIn(b'aaaa', written[0])
+
+    def test_overwrite_and_remove_missing_file(self):
+        self.assertEqual(fs.overwrite_and_remove(os.path.join(Settings.tmp_path, 'missing')), 0)
+
+    def test_overwrite_and_remove_files(self):
+        paths = [self.create_file('file%d' % i, 1024) for i in range(10)]
+
+        self.assertEqual(fs.overwrite_and_remove_files(paths), 10 * 1024)
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+    def test_secure_deletion_pool_is_created_once(self):
+        created = []
+
+        class ThreadPool(object):
+            def __init__(self, n):
+                created.append(self)
+                time.sleep(0.1)
+
+            def close(self):
+                self.closed = True
+
+            def join(self):
+                pass
+
+        self.patch(fs, 'ThreadPool', ThreadPool)
+        self.patch(fs, '_secure_deletion_pool', None)
+
+        pools = []
+        threads = [threading.Thread(target=lambda: pools.append(fs.get_secure_deletion_pool())) for _ in range(4)]
+        for t in threads:
+            t.start()
+
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(created), 1)
+        self.assertTrue(all(pool is created[0] for pool in pools))
+
+        fs.close_secure_deletion_pool()
+        self.assertTrue(created[0].closed)
+        self.assertTrue(fs._secure_deletion_pool is None)
+
+    def test_close_secure_deletion_pool(self):
+        path = self.create_file('file', 1024)
+        self.assertEqual(fs.overwrite_and_remove_files([path]), 1024)
+
+        pool = fs.get_secure_deletion_pool()
+        fs.close_secure_deletion_pool()
+
+        # The pool is recreated on the next use
+        self.assertFalse(fs.get_secure_deletion_pool() is pool)
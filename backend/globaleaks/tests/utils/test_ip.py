@@ -21,3 +21,22 @@ class TestIPUtils(unittest.TestCase):
         # Now confirm we properly fail when garbage is appended
         ip_str = ip_str + ",abcdef"
         self.assertEqual(ip.parse_csv_ip_ranges_to_ip_networks(ip_str), [])
+
+    def test_check_ip(self):
+        ip_filter = "192.168.1.1,10.0.0.0/8,10.1.0.0/16,::1,2001:db8::/32"
+
+        for client_ip in ["192.168.1.1", b"10.1.2.3", "10.255.255.255", "::1", "2001:db8::1"]:
+            self.assertTrue(ip.check_ip(client_ip, ip_filter))
+
+        for client_ip in ["192.168.1.2", "11.0.0.0", "::2", "2001:db9::1", "garbage"]:
+            self.assertFalse(ip.check_ip(client_ip, ip_filter))
+
+        # An invalid filter does not allow any address
+        self.assertFalse(ip.check_ip("10.0.0.1", ip_filter + ",abcdef"))
+
+    def test_get_ip_filter(self):
+        ip_filter = ip.get_ip_filter("10.0.0.0/8")
+
+        self.assertIs(ip.get_ip_filter("10.0.0.0/8"), ip_filter)
+        self.assertIs(ip.get_ip_filter(ip_filter), ip_filter)
+        self.assertIsNot(ip.get_ip_filter("10.0.0.0/16"), ip_filter)
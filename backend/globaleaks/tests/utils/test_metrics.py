@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from twisted.trial import unittest
+
+from globaleaks.utils.metrics import MetricsRegistry
+
+
+class TestMetrics(unittest.TestCase):
+    def test_render(self):
+        registry = MetricsRegistry()
+
+        counter = registry.counter('requests_total', 'Requests', ('method',))
+        counter.inc(('get',))
+        counter.inc(('get',), 2)
+        counter.inc(('post',))
+
+        registry.gauge('queue', 'Queue', function=lambda: 7)
+
+        histogram = registry.histogram('duration_seconds', 'Duration', buckets=(0.1, 1, float('inf')))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        self.assertEqual(registry.render(),
+                         '# HELP globaleaks_requests_total Requests\n'
+                         '# TYPE globaleaks_requests_total counter\n'
+                         'globaleaks_requests_total{method="get"} 3\n'
+                         'globaleaks_requests_total{method="post"} 1\n'
+                         '# HELP globaleaks_queue Queue\n'
+                         '# TYPE globaleaks_queue gauge\n'
+                         'globaleaks_queue 7\n'
+                         '# HELP globaleaks_duration_seconds Duration\n'
+                         '# TYPE globaleaks_duration_seconds histogram\n'
+                         'globaleaks_duration_seconds_bucket{le="0.1"} 1\n'
+                         'globaleaks_duration_seconds_bucket{le="1.0"} 2\n'
+                         'globaleaks_duration_seconds_bucket{le="+Inf"} 3\n'
+                         'globaleaks_duration_seconds_sum 5.55\n'
+                         'globaleaks_duration_seconds_count 3\n')
@@ -2,8 +2,9 @@
 import os
 from datetime import datetime
 
+from globaleaks.rest import errors
 from globaleaks.tests import helpers
-from globaleaks.utils.pgp import PGPContext
+from globaleaks.utils.pgp import PGPContext, PGPKeyring
 
 
 class TestPGP(helpers.TestGL):
@@ -55,3 +56,84 @@ class TestPGP(helpers.TestGL):
 
         self.assertEqual(pgpctx.load_key(helpers.PGPKEYS['EXPIRED_PGP_KEY_PUB'])['expiration'],
                          datetime.utcfromtimestamp(1391012793))
+
+
+class TestPGPKeyring(helpers.TestGL):
+    secret_content = u'secret content'
+
+    def test_encrypt_message(self):
+        keyring = PGPKeyring()
+
+        encrypted_body = keyring.encrypt_message(helpers.PGPKEYS['VALID_PGP_KEY1_PRV'], self.secret_content)
+
+        self.assertEqual(str(keyring.pgpctx.gnupg.decrypt(encrypted_body)), self.secret_content)
+
+        keyring.clear()
+
+    def test_keys_are_imported_once(self):
+        keyring = PGPKeyring()
+
+        k1 = keyring.load_key(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'])
+        pgpctx = keyring.pgpctx
+        k2 = keyring.load_key(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'])
+
+        self.assertEqual(k1, k2)
+        self.assertEqual(len(keyring.keys), 1)
+        self.assertIs(keyring.pgpctx, pgpctx)
+
+        keyring.clear()
+
+    def test_size_limit(self):
+        keyring = PGPKeyring(size_limit=1)
+
+        k1 = keyring.load_key(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'])
+        keyring.load_key(helpers.PGPKEYS['VALID_PGP_KEY2_PUB'])
+
+        self.assertEqual(len(keyring.keys), 1)
+        self.assertEqual(keyring.pgpctx.gnupg.list_keys(keys=k1['fingerprint']), [])
+
+        keyring.clear()
+
+    def test_keys_in_use_are_not_evicted(self):
+        keyring = PGPKeyring(size_limit=1)
+
+        key_id, pgpctx, fingerprint = keyring.acquire(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'])
+        keyring.load_key(helpers.PGPKEYS['VALID_PGP_KEY2_PUB'])
+
+        # The limit is exceeded while the first key is pinned
+        self.assertEqual(len(keyring.keys), 2)
+        encrypted_body = pgpctx.encrypt_message(fingerprint, self.secret_content)
+        self.assertTrue(encrypted_body.startswith('-----BEGIN PGP MESSAGE-----'))
+
+        keyring.release(key_id, pgpctx)
+
+        self.assertEqual(len(keyring.keys), 1)
+        self.assertEqual(keyring.pgpctx.gnupg.list_keys(keys=fingerprint), [])
+
+        keyring.clear()
+
+    def test_blocks_of_multiple_keys_are_rejected(self):
+        keyring = PGPKeyring()
+
+        k1 = keyring.load_key(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'])
+
+        self.assertRaises(errors.InputValidationError, keyring.load_key,
+                          helpers.PGPKEYS['VALID_PGP_KEY1_PUB'] + helpers.PGPKEYS['VALID_PGP_KEY2_PUB'])
+
+        # The keys of the block are removed, except the one already in use
+        self.assertEqual([k['fingerprint'] for k in keyring.pgpctx.gnupg.list_keys()], [k1['fingerprint']])
+        self.assertEqual(len(keyring.keys), 1)
+
+        keyring.clear()
+
+    def test_clear(self):
+        keyring = PGPKeyring()
+        keyring.load_key(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'])
+
+        gnupghome = keyring.pgpctx.gnupg.gnupghome
+        self.assertTrue(os.path.exists(gnupghome))
+
+        keyring.clear()
+
+        self.assertFalse(os.path.exists(gnupghome))
+        self.assertEqual(len(keyring.keys), 0)
@@ -1,9 +1,11 @@
 # -*- coding: utf-8
+import os
+
 from six import text_type
 
 from globaleaks.settings import Settings
 from globaleaks.tests import helpers
-from globaleaks.utils.securetempfile import SecureTemporaryFile
+from globaleaks.utils.securetempfile import SecureFile, SecureTemporaryFile
 
 
 class TestSecureTemporaryFiles(helpers.TestGL):
@@ -18,3 +20,23 @@ class TestSecureTemporaryFiles(helpers.TestGL):
         with a.open('r') as f:
             for x in range(1000):
                 self.assertTrue(antani == text_type(f.read(10), 'utf-8'))
+
+
+class TestSecureFile(helpers.TestGL):
+    def test_seek(self):
+        key, nonce = os.urandom(32), b'\xff' * 16
+        content = os.urandom(1000)
+
+        a = SecureFile(os.path.join(Settings.tmp_path, 'secure_file'), key, nonce)
+        with a.open('w') as f:
+            f.write(content)
+
+        with open(a.filepath, 'rb') as f:
+            self.assertNotEqual(f.read(), content)
+
+        with a.open('r') as f:
+            self.assertEqual(f.read(), content)
+
+            for offset in [0, 15, 16, 17, 999]:
+                f.seek(offset)
+                self.assertEqual(f.read(100), content[offset:offset + 100])
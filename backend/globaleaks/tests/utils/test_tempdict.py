@@ -53,3 +53,45 @@ class TestTempDict(helpers.TestGL):
                 self.assertEqual(len(xxx), size_limit)
                 self.assertEqual(xxx.get(x - size_limit + 1).id, x - size_limit + 1)
                 self.assertEqual(xxx.get(x - size_limit), None)
+
+    def test_get_postpones_expiration(self):
+        xxx = TempDict(timeout=10)
+
+        xxx.set(1, TestObject(1))
+
+        for _ in range(30):
+            self.test_reactor.advance(1)
+            self.assertEqual(xxx.get(1).id, 1)
+
+        self.test_reactor.advance(10)
+        self.assertEqual(xxx.get(1), None)
+
+        # the wheel does not tick when the dictionary is empty
+        self.assertEqual(len(self.test_reactor.getDelayedCalls()), 0)
+
+    def test_delete(self):
+        expired = []
+
+        xxx = TempDict(timeout=10)
+        xxx.expireCallback = expired.append
+
+        xxx.set(1, TestObject(1))
+        xxx.delete(1)
+        self.assertEqual(len(xxx), 0)
+
+        self.test_reactor.advance(5000)
+        self.assertEqual(expired, [])
+
+    def test_idle_wheel_restarts_from_now(self):
+        xxx = TempDict(timeout=10)
+
+        xxx.set(1, TestObject(1))
+        self.test_reactor.advance(5000)
+        self.assertEqual(len(xxx), 0)
+
+        # The first tick after the idle period processes only the elapsed slot
+        xxx.set(2, TestObject(2))
+        self.assertEqual(xxx._wheel_tick, xxx._tick_of(self.test_reactor.seconds()) - 1)
+
+        self.test_reactor.advance(10)
+        self.assertEqual(len(xxx), 0)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+import os
+
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks.sessions import SessionsFactory
+from globaleaks.settings import Settings
+from globaleaks.tests import helpers
+from globaleaks.utils.tempstore import SQLiteTempStore, ThreadedTempStore
+from globaleaks.utils.token import TokenList
+
+
+class TestSQLiteTempStore(helpers.TestGL):
+    def setUp(self):
+        d = helpers.TestGL.setUp(self)
+        self.store = SQLiteTempStore(os.path.join(Settings.working_path, 'sessions.db'),
+                                     os.path.join(Settings.working_path, 'sessions.key'))
+        self.attached = []
+        return d
+
+    def tearDown(self):
+        for x in self.attached:
+            x.detach_store()
+
+        helpers.TestGL.tearDown(self)
+        self.store.close()
+
+    def attach_store(self, x, kind):
+        x.attach_store(self.store, kind)
+        self.attached.append(x)
+        return x
+
+    def get_sessions(self):
+        return self.attach_store(SessionsFactory(timeout=Settings.authentication_lifetime), u'sessions')
+
+    def test_records_are_encrypted(self):
+        self.store.put(u'sessions', u'id', {'secret': u'antani'}, 10)
+
+        data = self.store.conn.execute('SELECT data FROM tempstore').fetchone()[0]
+        self.assertNotIn(b'antani', bytes(data))
+        self.assertEqual(self.store.load(u'sessions', 0), [(u'id', 10, {'secret': u'antani'})])
+
+    def test_sessions_are_restored(self):
+        sessions = self.get_sessions()
+        session = sessions.new(1, u'user', u'receiver', False, u'')
+
+        # e.g. after a restart
+        restored = self.get_sessions()
+        self.assertEqual(restored.count(1), 1)
+
+        restored_session = restored.get(session.id)
+        self.assertEqual(restored_session.user_id, u'user')
+
+    def test_private_keys_are_not_persisted(self):
+        sessions = self.get_sessions()
+        session = sessions.new(1, u'user', u'receiver', False, b'cc')
+
+        data = self.store.conn.execute('SELECT data FROM tempstore').fetchone()[0]
+        self.assertTrue(self.store.decrypt(data)['cc'] is True)
+
+        # The user needs to login again to unlock the key
+        restored = self.get_sessions()
+        self.assertTrue(restored.get(session.id) is None)
+
+    def test_sessions_are_shared(self):
+        a = self.get_sessions()
+        b = self.get_sessions()
+
+        session = a.new(1, u'user', u'receiver', False, u'')
+
+        # The sessions of the other processes are loaded by the periodic sync
+        self.assertTrue(b.get(session.id) is None)
+        self.test_reactor.advance(b.store_sync_interval)
+        self.assertEqual(b.get(session.id).user_id, u'user')
+
+        # The updates of the other processes replace the items already loaded
+        session.pcn = True
+        a.persist(session.id)
+        self.test_reactor.advance(b.store_sync_interval)
+        self.assertTrue(b.get(session.id).pcn)
+
+        # The revocations of the other processes are synced as well
+        a.revoke(1, u'user')
+        self.test_reactor.advance(b.store_sync_interval)
+        self.assertTrue(b.get(session.id) is None)
+        self.assertEqual(b.count(1), 0)
+
+    def test_revocations_are_shared(self):
+        a = self.get_sessions()
+        b = self.get_sessions()
+
+        self.patch(Settings, 'max_sessions_per_user', 2)
+
+        session1 = a.new(1, u'user', u'receiver', False, u'')
+        session2 = a.new(1, u'user', u'receiver', False, u'')
+        session3 = a.new(1, u'other', u'admin', False, u'')
+        self.test_reactor.advance(b.store_sync_interval)
+        self.assertEqual(b.count(1), 3)
+
+        # e.g. on a password change in b
+        b.revoke(1, u'user', keep=session2.id)
+        self.test_reactor.advance(a.store_sync_interval)
+        self.assertTrue(a.get(session1.id) is None)
+        self.assertTrue(a.get(session2.id) is not None)
+
+        b.revoke_tenant(1)
+        self.test_reactor.advance(a.store_sync_interval)
+        self.assertEqual(len(a), 0)
+        self.assertTrue(session3.id not in a)
+
+        # The deletions are not synced back to the process deleting them
+        self.assertEqual(len(b), 0)
+
+    def test_tombstones_are_pruned(self):
+        self.store.delete(u'sessions', u'id', u'a')
+        self.assertEqual(self.store.changes(u'sessions', 0, 0, u'b')[2], [u'id'])
+
+        self.store.tombstone_lifetime = -1
+        self.store.changes(u'sessions', 0, 0, u'b')
+        self.assertEqual(self.store.conn.execute('SELECT COUNT(*) FROM tempstore_deleted').fetchone()[0], 0)
+
+    def test_expiration_is_extended_by_other_processes(self):
+        a = self.get_sessions()
+        b = self.get_sessions()
+
+        session = a.new(1, u'user', u'receiver', False, u'')
+        b.sync_store()
+        b.get(session.id)
+
+        for _ in range(Settings.authentication_lifetime // b.store_touch_interval + 1):
+            self.test_reactor.advance(b.store_touch_interval)
+            self.assertTrue(b.get(session.id) is not None)
+
+        self.assertTrue(session.id in a)
+
+        self.test_reactor.advance(Settings.authentication_lifetime)
+        self.assertEqual(len(a), 0)
+        self.assertEqual(len(b), 0)
+        self.assertEqual(self.store.load(u'sessions', 0), [])
+
+    def test_tokens_are_restored(self):
+        tokens = self.attach_store(TokenList(Settings.tmp_path), u'tokens')
+
+        token = tokens.new(1)
+        token.solved = True
+        tokens.persist(token.id)
+
+        restored = self.attach_store(TokenList(Settings.tmp_path), u'tokens')
+
+        restored_token = restored.get(token.id)
+        self.assertTrue(restored_token.solved)
+        self.assertEqual(restored_token.question, token.question)
+        self.assertEqual(restored_token.tokenlist, restored)
+
+    def test_solved_tokens_are_shared(self):
+        a = self.attach_store(TokenList(Settings.tmp_path), u'tokens')
+        b = self.attach_store(TokenList(Settings.tmp_path), u'tokens')
+
+        token = a.new(1)
+        self.test_reactor.advance(b.store_sync_interval)
+        self.assertFalse(b.get(token.id).solved)
+
+        token.solved = True
+        a.persist(token.id)
+        self.test_reactor.advance(b.store_sync_interval)
+        self.assertTrue(b.get(token.id).solved)
+
+    def test_unknown_keys_do_not_query_the_store(self):
+        sessions = self.get_sessions()
+
+        def changes(*args):
+            raise Exception('unexpected query')
+
+        self.store.changes = changes
+        self.store.load = changes
+
+        self.assertTrue(sessions.get(u'unknown') is None)
+
+    @inlineCallbacks
+    def test_threaded_store(self):
+        store = ThreadedTempStore(self.store)
+
+        yield store.put(u'sessions', u'id', {'secret': u'antani'}, 10)
+        records = yield store.load(u'sessions', 0)
+        self.assertEqual(records, [(u'id', 10, {'secret': u'antani'})])
+
+        store.threadpool.stop()
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import os
 
 from globaleaks.jobs import anomalies
+from globaleaks.settings import Settings
 from globaleaks.tests import helpers
+from globaleaks.utils import token
+from globaleaks.utils.token import check_proof_of_work, TokenDifficulty, TokenList
 from twisted.internet.defer import inlineCallbacks
 
 
@@ -50,6 +54,7 @@ class TestToken(helpers.TestGL):
         # difficulty changes, also this dummy value has to.
         token.solved = False
         token.question = "7GJ4Sl37AEnP10Zk9p7q"
+        token.difficulty = 8
 
         self.assertFalse(token.update(0))
         # validate with right value: OK
@@ -62,6 +67,7 @@ class TestToken(helpers.TestGL):
         # difficulty changes, also this dummy value has to.
         token.solved = False
         token.question = "7GJ4Sl37AEnP10Zk9p7q"
+        token.difficulty = 8
 
         # validate with right value: OK
         self.assertTrue(token.update(26))
@@ -78,3 +84,95 @@ class TestToken(helpers.TestGL):
         self.test_reactor.advance(self.state.tokens.get_timeout()+1)
 
         self.assertTrue(len(self.state.tokens) == 0)
+
+
+class TestTokenDifficulty(helpers.TestGL):
+    def setUp(self):
+        self.patch(token, 'get_load_average', lambda: 0)
+        return helpers.TestGL.setUp(self)
+
+    def test_check_proof_of_work(self):
+        question = "7GJ4Sl37AEnP10Zk9p7q"
+
+        answer = 0
+        while not check_proof_of_work(question, answer, 12):
+            answer += 1
+
+        digest = int(hashlib.sha256(("%s%d" % (question, answer)).encode()).hexdigest(), 16)
+        zero_bits = len(bin(digest)) - len(bin(digest).rstrip('0'))
+
+        for difficulty in range(0, 24):
+            self.assertEqual(check_proof_of_work(question, answer, difficulty), difficulty <= zero_bits)
+
+    def test_creation_flood(self):
+        tokens = TokenList(Settings.tmp_path)
+
+        # The creation of tokens costs nothing and does not raise the difficulty
+        for _ in range(10000):
+            tokens.new(1)
+
+        self.assertEqual(tokens.new(1).difficulty, TokenDifficulty.min_bits)
+
+    def test_solved_tokens_are_tracked(self):
+        tokens = TokenList(Settings.tmp_path)
+
+        t = tokens.new(1)
+
+        answer = 0
+        while not t.update(answer):
+            answer += 1
+
+        # The token is accounted only once
+        t.update(answer)
+
+        self.assertEqual(tokens.difficulty.get_rate(1, self.test_reactor.seconds()), 1)
+
+    def test_flood(self):
+        tokens = TokenList(Settings.tmp_path)
+
+        difficulties = []
+        for _ in range(10000):
+            difficulties.append(tokens.new(1).difficulty)
+            tokens.difficulty.track(1)
+
+        self.assertEqual(difficulties[0], TokenDifficulty.min_bits)
+        self.assertEqual(difficulties, sorted(difficulties))
+        self.assertTrue(difficulties[-1] >= TokenDifficulty.min_bits + 8)
+
+        # The work required to the flooder doubles with each bit while the
+        # server always verifies an answer with a single digest
+        self.assertTrue(sum(2 ** d for d in difficulties) > 10000 * len(difficulties))
+
+        # The other tenants are not affected
+        self.assertEqual(tokens.new(2).difficulty, TokenDifficulty.min_bits)
+
+        # The difficulty returns to the minimum once the flood ends
+        self.test_reactor.advance(TokenDifficulty.window * 2)
+        self.assertEqual(tokens.new(1).difficulty, TokenDifficulty.min_bits)
+
+    def test_alarm_level(self):
+        tokens = TokenList(Settings.tmp_path)
+
+        tokens.difficulty.set_alarm_level(1, 2)
+
+        self.assertEqual(tokens.new(1).difficulty, TokenDifficulty.min_bits + 2 * TokenDifficulty.alarm_level_bits)
+
+    def test_load(self):
+        self.patch(token, 'get_load_average', lambda: 1.5)
+
+        tokens = TokenList(Settings.tmp_path)
+
+        self.assertEqual(tokens.new(1).difficulty, TokenDifficulty.min_bits + 1)
+
+        # The increase caused by the load is capped
+        self.patch(token, 'get_load_average', lambda: 2 ** 20)
+        self.test_reactor.advance(TokenDifficulty.load_interval)
+
+        self.assertEqual(tokens.new(1).difficulty, TokenDifficulty.min_bits + TokenDifficulty.max_load_bits)
+
+    def test_max_bits(self):
+        tokens = TokenList(Settings.tmp_path)
+
+        tokens.difficulty.set_alarm_level(1, 100)
+
+        self.assertEqual(tokens.new(1).difficulty, TokenDifficulty.max_bits)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from twisted.trial import unittest
+
+from globaleaks.utils.tor_exit_set import TorExitSet, ExitAddressesParser
+
+EXIT_ADDRESSES = b'''ExitNode 0011BD2485AD45D984EC4159C88FC066E5E3300E
+Published 2018-06-24 11:21:13
+LastStatus 2018-06-24 12:03:08
+ExitAddress 162.247.74.201 2018-06-24 12:05:23
+ExitNode 0091174DE56EB10EFFBFD10BE02B8EAE7F3B8A6E
+Published 2018-06-24 03:22:24
+LastStatus 2018-06-24 04:03:19
+ExitAddress 185.220.101.6 2018-06-24 04:04:22
+ExitAddress 2001:67c:289c::9 2018-06-24 04:04:22
+ExitAddress garbage 2018-06-24 04:04:22
+ExitAddress 10.0.0.1 2018-06-24 04:04:22'''
+
+
+class TestTorExitSet(unittest.TestCase):
+    def test_process_data(self):
+        tor_exit_set = TorExitSet()
+
+        stats = tor_exit_set.processData(EXIT_ADDRESSES)
+
+        self.assertEqual(stats, {'added': 4, 'removed': 0, 'kept': 0})
+        self.assertEqual(len(tor_exit_set), 4)
+
+        for ip in [u'162.247.74.201', b'185.220.101.6', u'2001:67c:289c::9', u'10.0.0.1']:
+            self.assertIn(ip, tor_exit_set)
+
+        for ip in [u'162.247.74.202', u'2001:67c:289c::8', u'garbage', b'']:
+            self.assertNotIn(ip, tor_exit_set)
+
+        stats = tor_exit_set.processData(b'ExitAddress 162.247.74.201 2018-06-24 12:05:23\n'
+                                         b'ExitAddress 1.2.3.4 2018-06-24 12:05:23\n')
+
+        self.assertEqual(stats, {'added': 1, 'removed': 3, 'kept': 1})
+        self.assertEqual(sorted(tor_exit_set), [u'1.2.3.4', u'162.247.74.201'])
+
+    def test_streaming_parser(self):
+        parser = ExitAddressesParser()
+
+        # The data is fed in chunks splitting the lines at random positions
+        for i in range(0, len(EXIT_ADDRESSES), 7):
+            parser.feed(EXIT_ADDRESSES[i:i + 7])
+
+        addresses = parser.close()
+
+        self.assertEqual(len(addresses[4]), 3)
+        self.assertEqual(len(addresses[6]), 1)
+
+    def test_save_and_load(self):
+        path = self.mktemp()
+
+        tor_exit_set = TorExitSet()
+        tor_exit_set.processData(EXIT_ADDRESSES)
+        tor_exit_set.save(path)
+
+        loaded = TorExitSet()
+        loaded.load(path)
+
+        self.assertEqual(list(loaded), list(tor_exit_set))
+
+        # A missing snapshot is ignored
+        loaded.load(path + '.missing')
+        self.assertEqual(len(loaded), 4)
@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 import os
+import struct
 
 from io import BytesIO
 from six import unichr
 from twisted.internet.defer import inlineCallbacks
-from zipfile import ZipFile
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
 
 from globaleaks.tests import helpers
 from globaleaks.utils.zipstream import ZipStream
@@ -40,3 +41,40 @@ class TestZipStream(helpers.TestGL):
                     self.assertTrue(ff.file_size == len(self.unicode_seq.encode()))
                 else:
                     self.assertTrue(ff.file_size == os.stat(os.path.abspath(__file__)).st_size)
+
+    def test_compression_selection(self):
+        files = [
+          {'name': 'text.txt', 'fo': BytesIO(b'antani' * 10000)},
+          {'name': 'random.bin', 'fo': BytesIO(os.urandom(100000))},
+          {'name': 'image.jpg', 'fo': BytesIO(b'antani' * 10000), 'content_type': 'image/jpeg'},
+          {'name': 'empty.txt', 'fo': BytesIO(b'')}
+        ]
+
+        output = BytesIO()
+
+        for data in ZipStream(files):
+            output.write(data)
+
+        with ZipFile(output, 'r') as f:
+            self.assertIsNone(f.testzip())
+            self.assertEqual(f.getinfo('text.txt').compress_type, ZIP_DEFLATED)
+            self.assertEqual(f.getinfo('random.bin').compress_type, ZIP_STORED)
+            self.assertEqual(f.getinfo('image.jpg').compress_type, ZIP_STORED)
+            self.assertEqual(f.getinfo('empty.txt').compress_type, ZIP_STORED)
+
+    def test_zip64_announced_for_large_files(self):
+        files = [
+          {'name': 'large.bin', 'fo': BytesIO(b'antani'), 'size': 1 << 32}
+        ]
+
+        output = BytesIO()
+
+        for data in ZipStream(files):
+            output.write(data)
+
+        # the local header declares the ZIP64 extension used by the data descriptor
+        self.assertEqual(struct.unpack('<L', output.getvalue()[18:22])[0], 0xffffffff)
+
+        with ZipFile(output, 'r') as f:
+            self.assertIsNone(f.testzip())
+            self.assertEqual(f.read('large.bin'), b'antani')
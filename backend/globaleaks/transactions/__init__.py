@@ -3,13 +3,18 @@
 ORM Transactions definitions.
 """
 from globaleaks import models
+from globaleaks.utils.worksignals import db_emit_signals
 
 
 def db_schedule_email(session, tid, address, subject, body):
-    return models.db_forge_obj(session, models.Mail,
+    mail = models.db_forge_obj(session, models.Mail,
                                {
                                    'address': address,
                                    'subject': subject,
                                    'body': body,
                                    'tid': tid,
                                })
+
+    db_emit_signals(session, 'notification')
+
+    return mail
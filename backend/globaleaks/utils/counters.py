@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Implementation of fixed memory counters of events over sliding windows
+import math
+import time
+
+
+class RingCounter(object):
+    """
+    Counter of events made of a ring of size buckets of resolution seconds.
+
+    Each bucket records the absolute index of the time interval it refers
+    to, so that the buckets left behind by the ring are reset lazily on
+    increment and ignored by the queries.
+    """
+    __slots__ = ('resolution', 'size', 'buckets', 'stamps')
+
+    def __init__(self, resolution, size):
+        self.resolution = resolution
+        self.size = size
+        self.buckets = [0] * size
+        self.stamps = [-1] * size
+
+    def increment(self, now, n=1):
+        t = int(now // self.resolution)
+        i = t % self.size
+
+        if self.stamps[i] != t:
+            self.stamps[i] = t
+            self.buckets[i] = 0
+
+        self.buckets[i] += n
+
+    def count(self, now, window):
+        """Return the events of the buckets covering the latest window seconds"""
+        t = int(now // self.resolution)
+        n = min(self.size, int(math.ceil(float(window) / self.resolution)))
+
+        ret = 0
+        for x in range(t - n + 1, t + 1):
+            i = x % self.size
+            if self.stamps[i] == x:
+                ret += self.buckets[i]
+
+        return ret
+
+
+class SlidingWindowCounter(object):
+    """
+    Counter of events queryable over sliding windows of up to a day,
+    using rings of buckets of a second, a minute and an hour.
+    """
+    __slots__ = ('rings', 'total')
+
+    def __init__(self):
+        self.rings = [RingCounter(1, 60), RingCounter(60, 60), RingCounter(3600, 24)]
+        self.total = 0
+
+    def increment(self, now=None, n=1):
+        if now is None:
+            now = time.time()
+
+        for ring in self.rings:
+            ring.increment(now, n)
+
+        self.total += n
+
+    def count(self, window, now=None):
+        """Return the events of the latest window seconds, with the precision of the finest ring covering it"""
+        if now is None:
+            now = time.time()
+
+        for ring in self.rings:
+            if window <= ring.resolution * ring.size:
+                return ring.count(now, window)
+
+        return ring.count(now, window)
@@ -5,6 +5,9 @@ import os
 import random
 import string
 import struct
+import threading
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 from distutils.version import LooseVersion as V  # pylint: disable=no-name-in-module,import-error
 
@@ -28,6 +31,28 @@ from six import text_type
 
 crypto_backend = default_backend()
 
+# Below this number of items a batch is decrypted in the calling thread
+PARALLEL_DECRYPTION_THRESHOLD = 64
+
+_decryption_pool = None
+_decryption_pool_lock = threading.Lock()
+
+
+def get_decryption_pool():
+    """
+    Return the pool of threads used to decrypt big batches of data;
+    libsodium releases the GIL so that the work is spread on all the cores
+
+    The pool is created on first use by the threads of the ORM.
+    """
+    global _decryption_pool
+
+    with _decryption_pool_lock:
+        if _decryption_pool is None:
+            _decryption_pool = ThreadPool(cpu_count())
+
+    return _decryption_pool
+
 
 def _convert_to_bytes(arg):
     if isinstance(arg, text_type):
@@ -310,6 +335,23 @@ class GCE(object):
             data = _convert_to_bytes(data)
             return SealedBox(prv_key).decrypt(data)
 
+        @staticmethod
+        def asymmetric_decrypt_batch(prv_key, data_list):
+            """
+            Perform asymmetric decryption of a list of data with the same key
+
+            The key is loaded once and big batches are decrypted in parallel
+            """
+            box = SealedBox(PrivateKey(prv_key, RawEncoder))
+
+            def decrypt(data):
+                return box.decrypt(_convert_to_bytes(data))
+
+            if len(data_list) < PARALLEL_DECRYPTION_THRESHOLD:
+                return [decrypt(data) for data in data_list]
+
+            return get_decryption_pool().map(decrypt, data_list, max(1, len(data_list) // (4 * cpu_count())))
+
         @staticmethod
         def streaming_encryption_open(mode, user_key, filepath):
             return _StreamingEncryptionObject(mode, user_key, filepath)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8
+# Implement the list of the exports built asynchronously on disk
+import os
+from uuid import uuid4
+
+from six import text_type
+from twisted.internet.defer import DeferredSemaphore
+
+from globaleaks.utils.crypto import GCE
+from globaleaks.utils.securetempfile import SecureFile
+from globaleaks.utils.tempdict import TempDict
+from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601
+
+
+class Export(object):
+    def __init__(self, exportlist, tid, user_id, rtips_ids):
+        self.exportlist = exportlist
+        self.tid = tid
+        self.user_id = user_id
+        self.rtips_ids = rtips_ids
+        self.id = text_type(uuid4())
+        self.creation_date = datetime_now()
+        self.filepath = os.path.join(exportlist.file_path, '%s.zip' % self.id)
+
+        self.status = u'pending'
+        self.size = 0
+        self.estimated_size = 0
+        self.expired = False
+
+        self.crypto_key = None
+        self.crypto_key_wrapped = False
+        self.crypto_nonce = os.urandom(16)
+
+    def generate_key(self, user_pub_key):
+        """
+        Generate the key used to encrypt the archive on disk
+
+        The key is kept in memory wrapped with the public key of the user
+        so that the archive could be read only within a session of the user.
+        """
+        key = os.urandom(32)
+
+        if user_pub_key:
+            self.crypto_key = GCE.asymmetric_encrypt(user_pub_key, key)
+            self.crypto_key_wrapped = True
+        else:
+            self.crypto_key = key
+
+        return key
+
+    def get_key(self, user_key):
+        if self.crypto_key_wrapped:
+            return GCE.asymmetric_decrypt(user_key, self.crypto_key)
+
+        return self.crypto_key
+
+    def open(self, mode, key):
+        return SecureFile(self.filepath, key, self.crypto_nonce).open(mode)
+
+    @property
+    def progress(self):
+        if self.status == u'ready':
+            return 100
+
+        if not self.estimated_size:
+            return 0
+
+        return min(99, self.size * 100 // self.estimated_size)
+
+    def serialize(self):
+        return {
+            'id': self.id,
+            'creation_date': datetime_to_ISO8601(self.creation_date),
+            'rtips': self.rtips_ids,
+            'status': self.status,
+            'progress': self.progress,
+            'size': self.size if self.status == u'ready' else 0
+        }
+
+
+class ExportList(TempDict):
+    max_exports_per_user = 5
+    max_concurrent_builds = 1
+
+    def __init__(self, file_path, *args, **kwds):
+        self.file_path = file_path
+        self.semaphore = DeferredSemaphore(self.max_concurrent_builds)
+        TempDict.__init__(self, *args, **kwds)
+
+    def get_timeout(self):
+        return 86400
+
+    def expireCallback(self, item):
+        item.expired = True
+
+        # The archive of an export still in progress is discarded at the end of the build
+        if item.status != u'building':
+            return self.secure_delete(item)
+
+    def delete(self, key):
+        if key not in self:
+            return
+
+        # TempDict.delete removes the item without notifying its expiration
+        item = self[key]
+        TempDict.delete(self, key)
+        return self.expireCallback(item)
+
+    def secure_delete(self, item):
+        from globaleaks.handlers.file import db_mark_file_for_secure_deletion
+        from globaleaks.orm import tw
+
+        return tw(db_mark_file_for_secure_deletion, self.file_path, os.path.basename(item.filepath))
+
+    def get_user_exports(self, tid, user_id):
+        return [x for x in self.values() if x.tid == tid and x.user_id == user_id]
+
+    def new(self, tid, user_id, rtips_ids):
+        export = Export(self, tid, user_id, rtips_ids)
+        self.set(export.id, export)
+        return export
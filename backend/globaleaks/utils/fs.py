@@ -1,54 +1,83 @@
 # -*- coding: utf-8 -*-
 import os
-import random
-import sys
+import threading
+from multiprocessing.pool import ThreadPool
 
 from globaleaks.rest import errors
 from globaleaks.utils.utility import log
 
 
+# The size of the blocks of random data used to overwrite the files
+SECURE_DELETION_BLOCK_SIZE = 1024 * 1024
+
+# The maximum number of files concurrently overwritten
+SECURE_DELETION_THREADS = 4
+
+_secure_deletion_pool = None
+_secure_deletion_pool_lock = threading.Lock()
+
+
+def get_secure_deletion_pool():
+    """
+    Return the bounded pool of threads used to overwrite the files;
+    the overwrite is I/O bound and the GIL is released while writing
+    """
+    global _secure_deletion_pool
+
+    with _secure_deletion_pool_lock:
+        if _secure_deletion_pool is None:
+            _secure_deletion_pool = ThreadPool(SECURE_DELETION_THREADS)
+
+    return _secure_deletion_pool
+
+
+def close_secure_deletion_pool():
+    """
+    Wait the completion of the pending overwrites and stop the threads of the pool
+    """
+    global _secure_deletion_pool
+
+    with _secure_deletion_pool_lock:
+        pool, _secure_deletion_pool = _secure_deletion_pool, None
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
 def overwrite_and_remove(absolutefpath, iterations_number=1):
     """
-    Overwrite the file with all_zeros, all_ones, random patterns
+    Overwrite the whole length of the file with random data and remove it
 
-    Note: At each iteration the original size of the file is altered.
+    :return: the number of bytes overwritten
     """
     log.debug("Starting secure deletion of file %s", absolutefpath)
 
-    def _overwrite(absolutefpath, pattern):
-        count = 0
-        length = len(pattern)
+    if not os.path.exists(absolutefpath):
+        return 0
 
-        with open(absolutefpath, 'w+') as f:
-            f.seek(0)
-            while count < length:
-                f.write(pattern)
-                count += len(pattern)
-
-    randomgen = random.SystemRandom()
+    size = 0
 
     try:
-        # in the following loop, the file is open and closed on purpose, to trigger flush operations
-        all_zeros = "\0\0\0\0" * 1024               # 4kb of zeros
-
-        if sys.version_info[0] == 2:
-            all_ones = "FFFFFFFF".decode("hex") * 1024  # 4kb of ones
-        else:
-            all_ones = "\xFF" * 4096
+        with open(absolutefpath, 'r+b') as f:
+            size = os.fstat(f.fileno()).st_size
 
-        for iteration in range(iterations_number):
-            OPTIMIZATION_RANDOM_BLOCK = randomgen.randint(4096, 4096 * 2)
+            for iteration in range(iterations_number):
+                log.debug("Excecuting rewrite iteration (%d out of %d)",
+                          iteration, iterations_number)
 
-            random_pattern = ""
-            for _ in range(OPTIMIZATION_RANDOM_BLOCK):
-                random_pattern += str(randomgen.randrange(256))
+                f.seek(0)
 
-            log.debug("Excecuting rewrite iteration (%d out of %d)",
-                      iteration, iterations_number)
+                remaining = size
+                while remaining > 0:
+                    block = os.urandom(min(remaining, SECURE_DELETION_BLOCK_SIZE))
+                    f.write(block)
+                    remaining -= len(block)
 
-            _overwrite(absolutefpath, all_zeros)
-            _overwrite(absolutefpath, all_ones)
-            _overwrite(absolutefpath, random_pattern)
+                # the data is flushed to the disk at each iteration so that
+                # the following one does not overwrite only the page cache
+                f.flush()
+                os.fsync(f.fileno())
 
     except Exception as excep:
         log.err("Unable to perform secure overwrite for file %s: %s",
@@ -63,6 +92,20 @@ def overwrite_and_remove(absolutefpath, iterations_number=1):
 
     log.debug("Performed deletion of file: %s", absolutefpath)
 
+    return size
+
+
+def overwrite_and_remove_files(absolutefpaths):
+    """
+    Securely delete a list of files using the pool of threads
+
+    :return: the number of bytes overwritten
+    """
+    if len(absolutefpaths) < 2:
+        return sum(overwrite_and_remove(x) for x in absolutefpaths)
+
+    return sum(get_secure_deletion_pool().imap_unordered(overwrite_and_remove, absolutefpaths))
+
 
 def directory_traversal_check(trusted_absolute_prefix, untrusted_path):
     """
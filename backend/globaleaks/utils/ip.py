@@ -37,19 +37,82 @@ def parse_csv_ip_ranges_to_ip_networks(ip_str):
         return []
 
 
-def check_ip(client_ip, ip_filter):
-    try:
-        ip_networks = parse_csv_ip_ranges_to_ip_networks(ip_filter)
+class IPFilter(object):
+    """
+    IP filter compiled from a list of IP addresses and/or CIDRs
+
+    The networks are kept as integer prefixes in a hash set for each prefix
+    length in use, one table for IPv4 and one for IPv6, so that a lookup
+    costs at most one set membership test per distinct prefix length
+    independently of the number of networks of the filter.
+    """
+    __slots__ = ('tables',)
+
+    def __init__(self, ip_filter):
+        self.tables = {4: {}, 6: {}}
+
+        for ip_network in self._collapse(parse_csv_ip_ranges_to_ip_networks(ip_filter)):
+            shift = ip_network.max_prefixlen - ip_network.prefixlen
+            self.tables[ip_network.version].setdefault(shift, set()).add(int(ip_network.network_address) >> shift)
+
+        # The tables are searched from the shortest prefix as the most likely to match
+        for version in self.tables:
+            self.tables[version] = sorted(self.tables[version].items(), reverse=True)
 
-        if isinstance(client_ip, binary_type):
-            client_ip = client_ip.decode()
+    @staticmethod
+    def _collapse(ip_networks):
+        ret = []
+        for version in (4, 6):
+            ret.extend(ipaddress.collapse_addresses([x for x in ip_networks if x.version == version]))
 
-        client_ip_obj = ipaddress.ip_address(client_ip)
+        return ret
 
-        for ip_network in ip_networks:
-            if client_ip_obj in ip_network:
+    def __contains__(self, client_ip):
+        try:
+            if isinstance(client_ip, binary_type):
+                client_ip = client_ip.decode()
+
+            client_ip_obj = ipaddress.ip_address(text_type(client_ip))
+        except:
+            return False
+
+        x = int(client_ip_obj)
+        for shift, prefixes in self.tables[client_ip_obj.version]:
+            if x >> shift in prefixes:
                 return True
-    except:
+
         return False
 
-    return False
+
+IP_FILTERS_CACHE_SIZE = 128
+
+_ip_filters = {}
+
+
+def get_ip_filter(ip_filter):
+    """
+    Return the IPFilter compiled from a list of IP addresses and/or CIDRs
+
+    The filters are cached by their source so that changing the
+    configuration of a filter implicitly causes its recompilation.
+    """
+    if isinstance(ip_filter, IPFilter):
+        return ip_filter
+
+    ret = _ip_filters.get(ip_filter)
+    if ret is None:
+        if len(_ip_filters) >= IP_FILTERS_CACHE_SIZE:
+            _ip_filters.clear()
+
+        ret = _ip_filters[ip_filter] = IPFilter(ip_filter)
+
+    return ret
+
+
+def check_ip(client_ip, ip_filter):
+    """
+    Check if the client_ip is allowed by the ip_filter
+
+    @param ip_filter: an IPFilter or a list of IP addresses and/or CIDRs
+    """
+    return client_ip in get_ip_filter(ip_filter)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Implementation of in-process metrics exported in the Prometheus text format
+import threading
+
+
+def format_value(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+
+        return repr(value)
+
+    return str(value)
+
+
+def format_labels(labelnames, labels):
+    if not labelnames:
+        return ''
+
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                          for k, v in zip(labelnames, labels)) + '}'
+
+
+class Metric(object):
+    """
+    Base class of the metrics
+
+    The values of a metric are kept per tuple of label values; the label
+    names are declared when the metric is created.
+    """
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def samples(self):
+        """Return the list of the (suffix, labelnames, labels, value) of the metric"""
+        with self.lock:
+            return [('', self.labelnames, labels, value) for labels, value in sorted(self.values.items())]
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation),
+                 '# TYPE %s %s' % (self.name, self.type)]
+
+        for suffix, labelnames, labels, value in self.samples():
+            lines.append('%s%s%s %s' % (self.name, suffix, format_labels(labelnames, labels), format_value(value)))
+
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labels=(), n=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + n
+
+    def get(self, labels=()):
+        return self.values.get(labels, 0)
+
+
+class Gauge(Metric):
+    """
+    Gauge whose values could be set or collected by a function at every
+    scrape; the function returns a value or a list of (labels, value).
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        Metric.__init__(self, name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, labels=()):
+        with self.lock:
+            self.values[labels] = value
+
+    def samples(self):
+        if self.function is None:
+            return Metric.samples(self)
+
+        ret = self.function()
+        if not isinstance(ret, list):
+            ret = [((), ret)]
+
+        return [('', self.labelnames, labels, value) for labels, value in ret]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    buckets = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300, float('inf'))
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        Metric.__init__(self, name, documentation, labelnames)
+        if buckets is not None:
+            self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        with self.lock:
+            x = self.values.get(labels)
+            if x is None:
+                # The counts of the buckets followed by the sum and the count
+                x = self.values[labels] = [0] * len(self.buckets) + [0, 0]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    x[i] += 1
+                    break
+
+            x[-2] += value
+            x[-1] += 1
+
+    def samples(self):
+        labelnames = self.labelnames + ('le',)
+
+        ret = []
+        with self.lock:
+            for labels, x in sorted(self.values.items()):
+                cumulative = 0
+                for i, bound in enumerate(self.buckets):
+                    cumulative += x[i]
+                    ret.append(('_bucket', labelnames, labels + (format_value(float(bound)),), cumulative))
+
+                ret.append(('_sum', self.labelnames, labels, x[-2]))
+                ret.append(('_count', self.labelnames, labels, x[-1]))
+
+        return ret
+
+
+class MetricsRegistry(object):
+    def __init__(self, prefix='globaleaks_'):
+        self.prefix = prefix
+        self.metrics = []
+
+    def register(self, metric):
+        metric.name = self.prefix + metric.name
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+
+Metrics = MetricsRegistry()
+
+# The metrics updated by the code paths of the backend; the gauges collected
+# on demand are registered by the handler of the metrics.
+request_duration = Metrics.histogram('http_request_duration_seconds',
+                                     'Duration of the HTTP requests by handler and method',
+                                     ('handler', 'method'))
+
+request_status = Metrics.counter('http_responses_total',
+                                 'HTTP responses by status code',
+                                 ('code',))
+
+transaction_retries = Metrics.counter('orm_transaction_retries_total',
+                                      'Transactions retried because of the database being locked')
+
+job_duration = Metrics.histogram('job_duration_seconds',
+                                 'Duration of the executions of the jobs',
+                                 ('job',))
+
+cache_requests = Metrics.counter('api_cache_requests_total',
+                                 'Lookups of the API cache by result',
+                                 ('result',))
+
+https_worker_deaths = Metrics.counter('https_worker_deaths_total',
+                                      'HTTPS workers exited')
+
+tenant_cache_refresh_duration = Metrics.histogram('tenant_cache_refresh_duration_seconds',
+                                                  'Duration of the refreshes of the tenant cache by kind',
+                                                  ('kind',))
@@ -2,12 +2,15 @@
 import os
 import shutil
 import tempfile
+import threading
 
+from collections import OrderedDict
 from datetime import datetime
 
 from gnupg import GPG
 
 from globaleaks.rest import errors
+from globaleaks.utils.crypto import sha256
 from globaleaks.utils.log import log
 
 
@@ -27,14 +30,17 @@ class PGPContext(object):
             self.gnupg.encoding = "UTF-8"
         except OSError as excep:
             log.err("Critical, OS error in operating with GnuPG home: %s", excep)
+            shutil.rmtree(tempdir, True)
             raise
         except Exception as excep:
             log.err("Unable to instance PGP object: %s" % excep)
+            shutil.rmtree(tempdir, True)
             raise
 
-    def load_key(self, key):
+    def load_key(self, key, tracked=()):
         """
         @param key
+        @param tracked: the fingerprints of the keys in use already present in the keyring
         @return: a dict with the expiration date and the key fingerprint
         """
         try:
@@ -46,11 +52,19 @@ class PGPContext(object):
         if not import_result.fingerprints:
             raise errors.InputValidationError
 
+        if len(set(import_result.fingerprints)) > 1:
+            # Only a key per block is tracked: the others would remain in
+            # the long lived keyring without ever being evicted
+            for fingerprint in set(import_result.fingerprints) - set(tracked):
+                self.delete_key(fingerprint)
+
+            raise errors.InputValidationError
+
         fingerprint = import_result.fingerprints[0]
 
         # looking if the key is effectively reachable
         try:
-            all_keys = self.gnupg.list_keys()
+            all_keys = self.gnupg.list_keys(keys=fingerprint)
         except Exception as excep:
             log.err("Error in PGP list_keys: %s", excep)
             raise errors.InputValidationError
@@ -67,6 +81,15 @@ class PGPContext(object):
             'expiration': expiration
         }
 
+    def delete_key(self, key_fingerprint):
+        """
+        Remove the key with the specified fingerprint from the keyring
+        """
+        try:
+            self.gnupg.delete_keys(str(key_fingerprint))
+        except Exception as excep:
+            log.err("Error in PGP delete_keys: %s", excep)
+
     def encrypt_file(self, key_fingerprint, input_file, output_path):
         """
         Encrypt a file with the specified PGP key
@@ -89,8 +112,149 @@ class PGPContext(object):
 
         return str(encrypted_obj)
 
-    def __del__(self):
+    def close(self):
+        """
+        Remove the temporary GnuPG home of the context
+        """
+        gnupghome = getattr(getattr(self, 'gnupg', None), 'gnupghome', None)
+        if gnupghome is None or not os.path.exists(gnupghome):
+            return
+
         try:
-            shutil.rmtree(self.gnupg.gnupghome)
+            shutil.rmtree(gnupghome)
         except Exception as excep:
-            log.err("Unable to clean temporary PGP environment: %s: %s", self.gnupg.gnupghome, excep)
+            log.err("Unable to clean temporary PGP environment: %s: %s", gnupghome, excep)
+
+    def __del__(self):
+        self.close()
+
+
+class PGPKeyring(object):
+    """
+    A long lived keyring shared by the whole process.
+
+    Public keys are imported once in a single GnuPG home and then reused
+    by all the encryption operations; keys not used recently are evicted
+    from the keyring when the configured size limit is reached.
+
+    The lock protects only the bookkeeping of the keys: the encryptions
+    run concurrently and pin the key they use so that it is not evicted
+    while in use.
+    """
+    def __init__(self, tempdirprefix=None, size_limit=256):
+        self.tempdirprefix = tempdirprefix
+        self.size_limit = size_limit
+        self.pgpctx = None
+        self.keys = OrderedDict()
+        self.pins = {}
+        self.lock = threading.RLock()
+
+    def get_context(self):
+        if self.pgpctx is None:
+            self.pgpctx = PGPContext(self.tempdirprefix)
+
+        return self.pgpctx
+
+    def load_key(self, key):
+        """
+        Import a key in the keyring if not already present
+
+        @param key: the armored public key
+        @return: a dict with the expiration date and the key fingerprint
+        """
+        return self._load_key(sha256(key.encode()), key)
+
+    def _load_key(self, key_id, key):
+        with self.lock:
+            if key_id in self.keys:
+                # mark the key as the most recently used one
+                self.keys[key_id] = self.keys.pop(key_id)
+                return self.keys[key_id]
+
+            k = self.get_context().load_key(key, [x['fingerprint'] for x in self.keys.values()])
+
+            self.keys[key_id] = k
+
+            self.trim(keep=key_id)
+
+            return k
+
+    def trim(self, keep=None):
+        """Evict the least recently used keys not in use exceeding the size limit"""
+        with self.lock:
+            for key_id in list(self.keys):
+                if len(self.keys) <= self.size_limit:
+                    break
+
+                if key_id != keep and key_id not in self.pins:
+                    self.evict(key_id)
+
+    def evict(self, key_id):
+        with self.lock:
+            fingerprint = self.keys.pop(key_id)['fingerprint']
+
+            # different versions of the same key share the fingerprint
+            if all(k['fingerprint'] != fingerprint for k in self.keys.values()):
+                self.pgpctx.delete_key(fingerprint)
+
+    def acquire(self, key):
+        """
+        Import a key if needed and pin it until released
+
+        @return: the (key id, context, fingerprint) to be used for the encryption
+        """
+        key_id = sha256(key.encode())
+
+        with self.lock:
+            fingerprint = self._load_key(key_id, key)['fingerprint']
+            self.pins[key_id] = self.pins.get(key_id, 0) + 1
+            return key_id, self.pgpctx, fingerprint
+
+    def release(self, key_id, pgpctx):
+        with self.lock:
+            # The pins of a context dropped by clear() are gone with it and
+            # the context is removed when no more referenced
+            if pgpctx is not self.pgpctx:
+                return
+
+            self.pins[key_id] -= 1
+            if not self.pins[key_id]:
+                del self.pins[key_id]
+
+            self.trim()
+
+    def encrypt_file(self, key, input_file, output_path):
+        """
+        Encrypt a file with the specified PGP key
+        """
+        key_id, pgpctx, fingerprint = self.acquire(key)
+
+        try:
+            return pgpctx.encrypt_file(fingerprint, input_file, output_path)
+        finally:
+            self.release(key_id, pgpctx)
+
+    def encrypt_message(self, key, plaintext):
+        """
+        Encrypt a text message with the specified PGP key
+        """
+        key_id, pgpctx, fingerprint = self.acquire(key)
+
+        try:
+            return pgpctx.encrypt_message(fingerprint, plaintext)
+        finally:
+            self.release(key_id, pgpctx)
+
+    def clear(self):
+        """
+        Drop all the keys and remove the GnuPG home of the keyring
+        """
+        with self.lock:
+            self.keys.clear()
+
+            if self.pgpctx is not None:
+                if not self.pins:
+                    self.pgpctx.close()
+
+                self.pgpctx = None
+                self.pins.clear()
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import binascii
 import os
 
 from cryptography.hazmat.backends import default_backend
@@ -74,3 +75,67 @@ class SecureTemporaryFile(object):
             os.remove(self.filepath)
         except:
             pass
+
+
+class SecureFile(object):
+    """
+    Seekable AES-CTR encrypted file
+
+    Differently from SecureTemporaryFile the file is not removed when the
+    object is destroyed and the key is provided by the caller so that the
+    content could be read back later at arbitrary offsets.
+    """
+    block_size = 16
+
+    def __init__(self, filepath, key, nonce):
+        self.filepath = filepath
+        self.key = key
+        self.nonce = nonce
+        self.fd = None
+        self.cipher = None
+
+    def get_cipher(self, block):
+        counter = (int(binascii.hexlify(self.nonce), 16) + block) % (1 << 128)
+        nonce = binascii.unhexlify('%032x' % counter)
+        return Cipher(algorithms.AES(self.key), modes.CTR(nonce), backend=crypto_backend)
+
+    def open(self, mode):
+        if mode == 'w':
+            self.fd = open(self.filepath, 'wb')
+            self.cipher = self.get_cipher(0).encryptor()
+        else:
+            self.fd = open(self.filepath, 'rb')
+            self.cipher = self.get_cipher(0).decryptor()
+
+        return self
+
+    def write(self, data):
+        if isinstance(data, text_type):
+            data = data.encode('utf-8')
+
+        self.fd.write(self.cipher.update(data))
+
+    def seek(self, offset):
+        block, skip = divmod(offset, self.block_size)
+        self.fd.seek(block * self.block_size)
+        self.cipher = self.get_cipher(block).decryptor()
+        self.read(skip)
+
+    def read(self, c=None):
+        if c is None:
+            data = self.fd.read()
+        else:
+            data = self.fd.read(c)
+
+        return self.cipher.update(data)
+
+    def close(self):
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
+import math
 import six
 from collections import OrderedDict
 
-from twisted.internet import reactor as _reactor
+from twisted.internet import defer, task, reactor as _reactor
+
+from globaleaks.utils.crypto import generateRandomKey
+from globaleaks.utils.log import log
 
 
 # needed in order to allow UT override
@@ -10,13 +14,53 @@ reactor = _reactor
 
 
 class TempDict(OrderedDict):
+    """
+    Dictionary of items expiring after a timeout of inactivity.
+
+    The expiration times are tracked by a hashed timer wheel instead of
+    scheduling a reactor call for each item: the wheel is made of a ring of
+    slots of resolution seconds each, an item is placed in the slot of its
+    expiration time and a single periodic tick, active only while the
+    dictionary is not empty, processes the slots as the time passes.
+
+    Accessing an item only updates its expireTime; the item is moved to
+    the slot of the new expiration time when its previous slot is processed.
+
+    The items could be persisted in a TempStore shared with other processes
+    by subclasses implementing dump_item and load_item; the expiration times
+    of the items in the store are updated at most every store_touch_interval
+    seconds.
+
+    The store is never queried on access: the items put, updated and
+    deleted by other processes are synced every store_sync_interval
+    seconds, so that a lookup of an unknown key costs only a miss of the
+    dictionary. The operations on the store are not awaited and with a
+    ThreadedTempStore are executed outside of the reactor.
+    """
     expireCallback = None
 
+    resolution = 1
+    wheel_size = 1024
+
+    store = None
+    store_kind = None
+    store_touch_interval = 60
+    store_sync_interval = 1
+
     def __init__(self, timeout=None, size_limit=None):
         self.timeout = timeout
         self.size_limit = size_limit
         OrderedDict.__init__(self)
 
+        self._wheel = [set() for _ in range(self.wheel_size)]
+        self._wheel_tick = None
+        self._tick_call = None
+        self._tick_reactor = None
+
+        self._sync_call = None
+        self._sync_cursor = None
+        self.store_origin = generateRandomKey(16)
+
         self._check_size_limit()
 
     def get_timeout(self):
@@ -27,28 +71,121 @@ class TempDict(OrderedDict):
         """The override of this method allows dynamic limits imlementations"""
         return self.size_limit
 
+    def dump_item(self, item):
+        """Return the record of an item persisted in the store"""
+        raise NotImplementedError
+
+    def load_item(self, record):
+        """Return the item of a record loaded from the store or None if not restorable"""
+        raise NotImplementedError
+
+    def update_item(self, item, record):
+        """Update an item with the record put in the store by another process"""
+        raise NotImplementedError
+
+    def item_group(self, item):
+        """Return the group of an item in the store"""
+        return u''
+
+    def attach_store(self, store, kind):
+        """Persist the items in store and load the ones already persisted"""
+        self.store = store
+        self.store_kind = kind
+        self._sync_cursor = None
+
+        for key in list(self):
+            self.persist(key)
+
+        self._sync_call = task.LoopingCall(self.sync_store)
+        self._sync_call.clock = reactor
+        self._sync_call.start(self.store_sync_interval)
+
+    def detach_store(self):
+        if self._sync_call is not None and self._sync_call.running:
+            self._sync_call.stop()
+
+        self._sync_call = None
+        self.store = None
+
+    def call_store(self, method, *args):
+        """Execute an operation on the store, logging its errors"""
+        def on_error(failure):
+            log.err("Error executing %s on the store of the %s: %s", method, self.store_kind, failure.getErrorMessage())
+
+        return defer.maybeDeferred(getattr(self.store, method), self.store_kind, *args).addErrback(on_error)
+
+    def sync_store(self):
+        """Sync the items put, updated and deleted in the store by other processes since the previous sync"""
+        def load(ret):
+            if ret is None or self.store is None:
+                return
+
+            self._sync_cursor, records, deleted = ret
+
+            for key in deleted:
+                self._discard(key)
+
+            for key, expireTime, record in records:
+                if key in self:
+                    self._update(key, expireTime, record)
+                else:
+                    self._restore(key, expireTime, record)
+
+        return self.call_store('changes', self._sync_cursor, reactor.seconds(), self.store_origin).addCallback(load)
+
+    def persist(self, key):
+        """Persist the changes of an item in the store"""
+        if self.store is not None and key in self:
+            item = self[key]
+            item.storeTime = reactor.seconds()
+            self.call_store('put', key, self.dump_item(item), item.expireTime, self.item_group(item), self.store_origin)
+
     def set(self, key, item):
         self._check_size_limit()
-        timeout = self.get_timeout()
-        item.expireCall = reactor.callLater(timeout, self._expire, key)
+        item.expireTime = reactor.seconds() + self.get_timeout()
         self[key] = item
+        self._schedule(key, item)
+        self.persist(key)
 
     def get(self, key):
+        now = reactor.seconds()
+
         if key not in self:
             return
 
-        if self[key].expireCall is not None:
-            self[key].expireCall.reset(self.get_timeout())
+        item = self[key]
+        item.expireTime = now + self.get_timeout()
+
+        if self.store is not None and now - item.storeTime >= self.store_touch_interval:
+            item.storeTime = now
+            self.call_store('touch', key, item.expireTime).addCallback(self._touched, key)
+
+        # The item could have been found deleted by another process
+        return OrderedDict.get(self, key)
+
+    def _touched(self, found, key):
+        if found is False:
+            # The item has been deleted by another process
+            self._discard(key)
+
+    def __delitem__(self, key):
+        OrderedDict.__delitem__(self, key)
 
-        return self[key]
+        if self.store is not None:
+            self.call_store('delete', key, self.store_origin)
+
+    def pop(self, key, *args):
+        if self.store is not None and key in self:
+            self.call_store('delete', key, self.store_origin)
+
+        return OrderedDict.pop(self, key, *args)
 
     def delete(self, key):
         if key not in self:
             return
 
         item = self.pop(key)
-        item.expireCall.cancel()  # pylint: disable=no-member
-        self._expire(key)
+        self._wheel[self._slot(item.expireTime)].discard(key)
 
     def _check_size_limit(self):
         size_limit = self.get_size_limit()
@@ -60,12 +197,122 @@ class TempDict(OrderedDict):
             k = next(six.iterkeys(self))
             self.delete(k)
 
+    def _restore(self, key, expireTime, record):
+        item = self.load_item(record)
+        if item is None:
+            return
+
+        item.expireTime = expireTime
+        item.storeTime = reactor.seconds()
+        self[key] = item
+        self._schedule(key, item)
+
+    def _update(self, key, expireTime, record):
+        item = self[key]
+        self.update_item(item, record)
+
+        # The item is moved to the later slot when its current one is processed
+        item.expireTime = max(item.expireTime, expireTime)
+
+    def _discard(self, key):
+        """Delete an item already deleted from the store by another process"""
+        store, self.store = self.store, None
+        try:
+            self.delete(key)
+        finally:
+            self.store = store
+
     def _expire(self, key):
         if key not in self:
             return
 
+        if self.store is not None:
+            # The item could have been accessed by another process
+            self.call_store('expire', key, reactor.seconds()).addCallback(self._expired, key)
+        else:
+            self._expired(None, key)
+
+    def _expired(self, expireTime, key):
+        if key not in self:
+            return
+
+        if self[key].expireTime > reactor.seconds():
+            # The item has been accessed while waiting for the store
+            self._wheel[self._slot(self[key].expireTime)].add(key)
+            self.persist(key)
+            return
+
+        if expireTime is not None:
+            self[key].expireTime = expireTime
+            self._wheel[self._slot(expireTime)].add(key)
+            return
+
         if self.expireCallback is not None:
             # pylint: disable=not-callable
             self.expireCallback(self[key])
 
         del self[key]
+
+    def _tick_of(self, t):
+        return int(math.ceil(float(t) / self.resolution))
+
+    def _slot(self, t):
+        return self._tick_of(t) % self.wheel_size
+
+    def _schedule(self, key, item):
+        if self._tick_reactor is not reactor:
+            # The reactor is replaced by the unit tests; the items are
+            # redistributed on the wheel of the new clock
+            self._tick_reactor = reactor
+            self._tick_call = None
+            self._wheel_tick = self._tick_of(reactor.seconds()) - 1
+            self._wheel = [set() for _ in range(self.wheel_size)]
+            for k, v in self.items():
+                self._wheel[self._slot(v.expireTime)].add(k)
+
+        if self._tick_call is None:
+            # The tick is stopped only when the dictionary is empty; the
+            # processing of the idle wheel restarts from the current time
+            self._wheel_tick = self._tick_of(reactor.seconds()) - 1
+
+        self._wheel[self._slot(item.expireTime)].add(key)
+
+        if self._tick_call is None:
+            self._schedule_tick()
+
+    def _schedule_tick(self):
+        delay = (self._wheel_tick + 1) * self.resolution - reactor.seconds()
+        self._tick_call = reactor.callLater(max(delay, 0), self._tick)
+
+    def _tick(self):
+        self._tick_call = None
+
+        now = reactor.seconds()
+        current = int(math.floor(float(now) / self.resolution))
+
+        if current - self._wheel_tick >= self.wheel_size:
+            # After a long pause every slot is processed only once
+            ticks = range(current - self.wheel_size + 1, current + 1)
+        else:
+            ticks = range(self._wheel_tick + 1, current + 1)
+
+        self._wheel_tick = current
+
+        for tick in ticks:
+            slot = tick % self.wheel_size
+            keys, self._wheel[slot] = self._wheel[slot], set()
+            for key in keys:
+                item = OrderedDict.get(self, key)
+                if item is None:
+                    # removed without passing through delete()
+                    continue
+
+                if item.expireTime <= now:
+                    self._expire(key)
+                else:
+                    self._wheel[self._slot(item.expireTime)].add(key)
+
+        if len(self):
+            self._schedule_tick()
+        else:
+            self._wheel = [set() for _ in range(self.wheel_size)]
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# Implementation of the stores persisting the items of a TempDict
+import json
+import os
+import sqlite3
+import time
+
+from twisted.internet import reactor
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+from globaleaks.utils.crypto import GCE
+
+
+class TempStore(object):
+    """
+    Interface of the stores persisting the items of a TempDict
+
+    The records are dictionaries serializable in JSON and are identified
+    by the kind of the TempDict (e.g. sessions, tokens) and by their key.
+    Each record is associated with its expiration time in seconds since
+    the epoch, the same clock of the reactor, with a group used to
+    delete all the records of an owner (e.g. the sessions of a user) and
+    with the origin, the identifier of the TempDict that wrote or deleted
+    it, so that each TempDict receives only the changes of the others.
+    """
+    def load(self, kind, now):
+        """Return the list of the (key, expiration, record) of a kind not yet expired"""
+        raise NotImplementedError
+
+    def changes(self, kind, cursor, now, origin=u''):
+        """
+        Return the (cursor, list of the (key, expiration, record), list of
+        the deleted keys) of the records of a kind not yet expired put and
+        of the records deleted by the other origins since the cursor
+        returned by the previous call; the first call is done with a None
+        cursor and returns no deleted keys.
+        """
+        raise NotImplementedError
+
+    def put(self, kind, key, record, expiration, group=u'', origin=u''):
+        raise NotImplementedError
+
+    def touch(self, kind, key, expiration):
+        """Update the expiration of a record; return False if the record is missing"""
+        raise NotImplementedError
+
+    def expire(self, kind, key, now):
+        """
+        Delete a record if expired
+
+        Return None if the record has been deleted or is missing, otherwise
+        the later expiration time set by another process.
+        """
+        raise NotImplementedError
+
+    def delete(self, kind, key, origin=u''):
+        raise NotImplementedError
+
+    def delete_group(self, kind, pattern, keep=None, origin=u''):
+        """Delete the records whose group matches the SQL LIKE pattern, except the record keep"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteTempStore(TempStore):
+    """
+    TempStore keeping the records in a SQLite database that could be
+    shared by multiple processes.
+
+    The records are encrypted with a key read from key_path, generated
+    on first use.
+
+    The deletions are recorded as tombstones kept for tombstone_lifetime
+    seconds, the time given to the other processes to sync them.
+    """
+    # Margin of the cursors of the changes tolerating the writes of other
+    # processes stamped before and committed after a query of the changes
+    changes_margin = 1
+
+    tombstone_lifetime = 60
+
+    def __init__(self, db_path, key_path):
+        self.key = self.load_key(key_path)
+
+        # The connection is used by the thread of the ThreadedTempStore
+        self.conn = sqlite3.connect(db_path, timeout=1, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA secure_delete=ON')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS tempstore ('
+                          'kind TEXT NOT NULL, '
+                          'id TEXT NOT NULL, '
+                          'expiration REAL NOT NULL, '
+                          'grp TEXT NOT NULL, '
+                          'mtime REAL NOT NULL, '
+                          'origin TEXT NOT NULL, '
+                          'data BLOB NOT NULL, '
+                          'PRIMARY KEY (kind, id))')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS tempstore__grp ON tempstore (kind, grp)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS tempstore__mtime ON tempstore (kind, mtime)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS tempstore_deleted ('
+                          'kind TEXT NOT NULL, '
+                          'id TEXT NOT NULL, '
+                          'mtime REAL NOT NULL, '
+                          'origin TEXT NOT NULL, '
+                          'PRIMARY KEY (kind, id))')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS tempstore_deleted__mtime ON tempstore_deleted (kind, mtime)')
+
+    @staticmethod
+    def load_key(key_path):
+        if not os.path.exists(key_path):
+            fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(GCE.generate_key())
+
+        with open(key_path, 'rb') as f:
+            return f.read()
+
+    def encrypt(self, record):
+        return sqlite3.Binary(GCE.symmetric_encrypt(self.key, json.dumps(record)))
+
+    def decrypt(self, data):
+        return json.loads(GCE.symmetric_decrypt(self.key, bytes(data)).decode('utf-8'))
+
+    def load(self, kind, now):
+        self.conn.execute('DELETE FROM tempstore WHERE kind = ? AND expiration <= ?', (kind, now))
+
+        return [(key, expiration, self.decrypt(data)) for key, expiration, data in
+                self.conn.execute('SELECT id, expiration, data FROM tempstore WHERE kind = ?', (kind,))]
+
+    def changes(self, kind, cursor, now, origin=u''):
+        t = time.time()
+
+        self.conn.execute('DELETE FROM tempstore_deleted WHERE kind = ? AND mtime < ?',
+                          (kind, t - self.tombstone_lifetime))
+
+        records = [(key, expiration, self.decrypt(data)) for key, expiration, data in
+                   self.conn.execute('SELECT id, expiration, data FROM tempstore '
+                                     'WHERE kind = ? AND mtime >= ? AND expiration > ? AND origin != ?',
+                                     (kind, cursor if cursor is not None else 0, now, origin))]
+
+        deleted = []
+        if cursor is not None:
+            deleted = [key for key, in
+                       self.conn.execute('SELECT id FROM tempstore_deleted '
+                                         'WHERE kind = ? AND mtime >= ? AND origin != ?',
+                                         (kind, cursor, origin))]
+
+        return t - self.changes_margin, records, deleted
+
+    def put(self, kind, key, record, expiration, group=u'', origin=u''):
+        self.conn.execute('DELETE FROM tempstore_deleted WHERE kind = ? AND id = ?', (kind, key))
+        self.conn.execute('INSERT OR REPLACE INTO tempstore (kind, id, expiration, grp, mtime, origin, data) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                          (kind, key, expiration, group, time.time(), origin, self.encrypt(record)))
+
+    def touch(self, kind, key, expiration):
+        # The expiration is never moved back in favour of a process that touched the record later
+        cursor = self.conn.execute('UPDATE tempstore SET expiration = MAX(expiration, ?) WHERE kind = ? AND id = ?',
+                                   (expiration, kind, key))
+
+        return cursor.rowcount > 0
+
+    def expire(self, kind, key, now):
+        self.conn.execute('DELETE FROM tempstore WHERE kind = ? AND id = ? AND expiration <= ?', (kind, key, now))
+
+        row = self.conn.execute('SELECT expiration FROM tempstore WHERE kind = ? AND id = ?', (kind, key)).fetchone()
+
+        return row[0] if row is not None else None
+
+    def delete(self, kind, key, origin=u''):
+        self.delete_ids(kind, [key], origin)
+
+    def delete_group(self, kind, pattern, keep=None, origin=u''):
+        self.delete_ids(kind, [key for key, in
+                               self.conn.execute('SELECT id FROM tempstore WHERE kind = ? AND grp LIKE ? AND id != ?',
+                                                 (kind, pattern, keep if keep is not None else u''))], origin)
+
+    def delete_ids(self, kind, keys, origin):
+        t = time.time()
+
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for key in keys:
+                self.conn.execute('DELETE FROM tempstore WHERE kind = ? AND id = ?', (kind, key))
+                self.conn.execute('INSERT OR REPLACE INTO tempstore_deleted (kind, id, mtime, origin) VALUES (?, ?, ?, ?)',
+                                  (kind, key, t, origin))
+        except:
+            self.conn.execute('ROLLBACK')
+            raise
+
+        self.conn.execute('COMMIT')
+
+    def close(self):
+        self.conn.close()
+
+
+class ThreadedTempStore(object):
+    """
+    Proxy executing the operations of a TempStore in a dedicated thread
+
+    Every operation returns a deferred; as the thread is only one the
+    operations are executed in the order they are requested.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.threadpool = ThreadPool(1, 1, 'TempStore')
+        self.threadpool.start()
+
+    def __getattr__(self, name):
+        method = getattr(self.store, name)
+
+        def call(*args):
+            return deferToThreadPool(reactor, self.threadpool, method, *args)
+
+        return call
+
+    def close(self):
+        self.threadpool.stop()
+        self.store.close()
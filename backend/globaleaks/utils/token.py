@@ -1,18 +1,128 @@
 # -*- coding: utf-8
 # Implement a proof of work token to prevent resources exhaustion
+import hashlib
+import math
+import multiprocessing
 import os
 from datetime import datetime, timedelta
 
-from globaleaks.utils.crypto import sha256, generateRandomKey, GCE
+from globaleaks.utils import tempdict
+from globaleaks.utils.crypto import generateRandomKey, GCE
 from globaleaks.utils.tempdict import TempDict
-from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601
+from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601, ISO8601_to_datetime
+
+
+def get_load_average():
+    try:
+        return os.getloadavg()[0] / multiprocessing.cpu_count()
+    except (AttributeError, NotImplementedError, OSError):
+        return 0
+
+
+class TokenDifficulty(object):
+    """
+    Controller of the difficulty of the proof of work of the tokens
+
+    The difficulty is the number of trailing zero bits required in the
+    sha256 digest of the question concatenated with the answer, so that
+    each additional bit doubles the expected work of the client while the
+    verification costs a single digest.
+
+    The difficulty of a tenant grows with the rate of the tokens solved
+    for the tenant, with the activity alarm level of the tenant and with the
+    load of the system; it decreases as soon as these conditions cease.
+
+    Only the solved tokens are accounted: the creation of a token costs
+    nothing and a flood of creations would otherwise raise the work
+    required to every whistleblower of the tenant.
+    """
+    min_bits = 8
+    max_bits = 20
+
+    # tokens solved per minute of a tenant tolerated at the minimum
+    # difficulty; every doubling of the rate adds a bit
+    rate_threshold = 30
+    window = 60
+
+    # bits added for each level of the activity alarm of the tenant
+    alarm_level_bits = 2
+
+    # the load of the system is sampled at most every load_interval seconds
+    # and adds at most max_load_bits
+    load_interval = 10
+    max_load_bits = 2
+
+    def __init__(self):
+        self.rates = {}
+        self.alarm_levels = {}
+        self.load = 0
+        self.load_time = None
+
+    def set_alarm_level(self, tid, level):
+        self.alarm_levels[tid] = level
+
+    def get_rate(self, tid, now, n=0):
+        """Return the rate of the tokens solved for a tenant, accounting n new ones"""
+        # The rate is estimated on two consecutive windows, weighting the
+        # previous one by its overlap with the sliding window ending now
+        start, current, previous = self.rates.get(tid, (now, 0, 0))
+        if now - start >= 2 * self.window:
+            start, current, previous = now, 0, 0
+        elif now - start >= self.window:
+            start, current, previous = start + self.window, 0, current
+
+        current += n
+        if current or previous:
+            self.rates[tid] = (start, current, previous)
+        else:
+            self.rates.pop(tid, None)
+
+        return current + previous * max(0, 1 - float(now - start) / self.window)
+
+    def track(self, tid):
+        """Account a token solved for a tenant"""
+        self.get_rate(tid, tempdict.reactor.seconds(), 1)
+
+    def get(self, tid):
+        """Return the difficulty required to the tokens of a tenant"""
+        now = tempdict.reactor.seconds()
+
+        bits = self.min_bits
+
+        rate = self.get_rate(tid, now)
+        if rate > self.rate_threshold:
+            bits += int(math.log(float(rate) / self.rate_threshold, 2)) + 1
+
+        bits += self.alarm_levels.get(tid, 0) * self.alarm_level_bits
+
+        if self.load_time is None or now - self.load_time >= self.load_interval:
+            self.load = get_load_average()
+            self.load_time = now
+
+        if self.load > 1:
+            bits += min(int(math.log(self.load, 2)) + 1, self.max_load_bits)
+
+        return min(bits, self.max_bits)
+
+
+def check_proof_of_work(question, answer, difficulty):
+    """Verify that the digest of the question and the answer ends with difficulty zero bits"""
+    digest = bytearray(hashlib.sha256(("%s%d" % (question, answer)).encode()).digest())
+
+    nbytes, nbits = divmod(difficulty, 8)
+
+    for i in range(1, nbytes + 1):
+        if digest[-i]:
+            return False
+
+    return not nbits or not digest[-nbytes - 1] & ((1 << nbits) - 1)
 
 
 class Token(object):
     min_ttl = 1
     max_ttl = 3600
 
-    def __init__(self, tokenlist, tid, type='submission'):
+    def __init__(self, tokenlist, tid, type='submission', difficulty=TokenDifficulty.min_bits):
         self.tokenlist = tokenlist
         self.tid = tid
         self.id = generateRandomKey(42)
@@ -23,6 +133,7 @@ class Token(object):
 
         self.solved = False
         self.question = generateRandomKey(20)
+        self.difficulty = difficulty
 
     def timedelta_check(self):
         now = datetime_now()
@@ -35,16 +146,19 @@ class Token(object):
             raise Exception("TokenFailure: Too late to use this token")
 
     def validate(self, answer):
-        resolved = "%s%d" % (self.question, answer)
-        x = sha256(resolved.encode())
-        self.solved = x.endswith(b'00')
+        self.solved = self.solved or check_proof_of_work(self.question, answer, self.difficulty)
 
     def update(self, answer):
+        solved = self.solved
+
         self.validate(answer)
 
         if not self.solved:
             return False
 
+        if not solved:
+            self.tokenlist.difficulty.track(self.tid)
+
         if self.type == 'submission' and GCE.ENCRYPTION_AVAILABLE:
             self.tip_key = GCE.generate_key()
 
@@ -70,6 +184,7 @@ class Token(object):
             'creation_date': datetime_to_ISO8601(self.creation_date),
             'type': self.type,
             'question': self.question,
+            'difficulty': self.difficulty,
             'solved': self.solved
         }
 
@@ -77,6 +192,7 @@ class Token(object):
 class TokenList(TempDict):
     def __init__(self, file_path, *args, **kwds):
         self.file_path = file_path
+        self.difficulty = TokenDifficulty()
         TempDict.__init__(self, *args, **kwds)
 
     def set_file_path(self, file_path):
@@ -95,6 +211,32 @@ class TokenList(TempDict):
             except Exception as e:
                 pass
 
+    def dump_item(self, item):
+        # The uploaded files are not persisted: their encryption keys live
+        # only in memory and the temporary files are removed on restart
+        return {
+            'id': item.id,
+            'tid': item.tid,
+            'type': item.type,
+            'creation_date': datetime_to_ISO8601(item.creation_date),
+            'question': item.question,
+            'difficulty': item.difficulty,
+            'solved': item.solved
+        }
+
+    def load_item(self, record):
+        token = Token(self, record['tid'], record['type'], record['difficulty'])
+        token.id = record['id']
+        token.creation_date = ISO8601_to_datetime(record['creation_date'])
+        token.question = record['question']
+        token.solved = record['solved']
+
+        return token
+
+    def update_item(self, token, record):
+        # The uploaded files of the token stay in the process receiving them
+        token.solved = token.solved or record['solved']
+
     def get(self, key):
         ret = TempDict.get(self, key)
         if ret is None:
@@ -103,6 +245,6 @@ class TokenList(TempDict):
         return ret
 
     def new(self, tid, type='submission'):
-        token = Token(self, tid, type)
+        token = Token(self, tid, type, self.difficulty.get(tid))
         self.set(token.id, token)
         return token
@@ -1,21 +1,247 @@
 # -*- coding: utf-8 -*-
-import re
-from six import text_type
+import os
+import socket
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
 
-from globaleaks.utils.agent import get_page
+from six import PY3, text_type, binary_type
+
+from twisted.internet import defer
+from twisted.internet.protocol import Protocol
+from twisted.web.client import ResponseDone, PotentialDataLoss
+
+from globaleaks.utils.log import log
 
 
 EXIT_ADDR_URL = b'https://deb.globaleaks.org/app/exit-addresses'
 
 
-class TorExitSet(set):
-    """Set that keep the list of Tor exit nodes ip using check.torproject.org"""
+def _typecode(size):
+    for typecode in ('I', 'L', 'Q'):
+        try:
+            if array(typecode).itemsize == size:
+                return typecode
+        except ValueError:
+            pass
+
+
+# The addresses are stored in words of 4 bytes for IPv4 and of 8 bytes for IPv6
+WORD_SIZE = {4: 4, 16: 8}
+WORD_FORMAT = {4: 'I', 16: 'QQ'}
+WORD_TYPECODE = {4: _typecode(4), 16: _typecode(8)}
+
+
+def pack_ip(ip):
+    """Return the (version, packed big endian address) of an IP or None if invalid"""
+    if PY3 and isinstance(ip, binary_type):
+        ip = ip.decode('ascii', 'replace')
+    elif not PY3 and isinstance(ip, text_type):
+        ip = ip.encode('ascii', 'replace')
+
+    for version, family in ((4, socket.AF_INET), (6, socket.AF_INET6)):
+        try:
+            return version, socket.inet_pton(family, ip)
+        except (socket.error, ValueError):
+            pass
+
+
+def unpack_ip(packed):
+    return text_type(socket.inet_ntop(socket.AF_INET if len(packed) == 4 else socket.AF_INET6, packed))
+
+
+class PackedAddresses(object):
+    """
+    Sorted array of the addresses of a version packed as integers
+
+    The addresses are split in words of 32 bits for IPv4 and of 64 bits for
+    IPv6 kept in a column of packed integers each; a lookup narrows with
+    bisect the range of the addresses matching each word.
+    """
+    __slots__ = ('width', 'struct', 'columns')
+
+    def __init__(self, width, addresses=()):
+        self.width = width
+        self.struct = struct.Struct('!' + WORD_FORMAT[width])
+
+        n = width // WORD_SIZE[width]
+        self.columns = [array(WORD_TYPECODE[width]) for _ in range(n)]
+
+        for address in sorted(set(addresses)):
+            for column, word in zip(self.columns, self.struct.unpack(address)):
+                column.append(word)
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def __iter__(self):
+        for words in zip(*self.columns):
+            yield self.struct.pack(*words)
+
+    def __contains__(self, address):
+        lo, hi = 0, len(self.columns[0])
+
+        for column, word in zip(self.columns, self.struct.unpack(address)):
+            lo = bisect_left(column, word, lo, hi)
+            hi = bisect_right(column, word, lo, hi)
+            if lo == hi:
+                return False
+
+        return True
+
+
+class ExitAddressesParser(object):
+    """
+    Streaming parser of the exit lists in the format of check.torproject.org
+
+    The data is consumed line by line as it is received and only the lines
+    'ExitAddress <ip> <date> <time>' are considered.
+    """
+    def __init__(self):
+        self.buffer = b''
+        self.addresses = {4: set(), 6: set()}
+
+    def feed(self, data):
+        lines = (self.buffer + data).split(b'\n')
+        self.buffer = lines.pop()
+
+        for line in lines:
+            self.parse_line(line)
+
+    def parse_line(self, line):
+        x = line.split()
+        if len(x) < 2 or x[0] != b'ExitAddress':
+            return
+
+        ip = pack_ip(x[1])
+        if ip is not None:
+            self.addresses[ip[0]].add(ip[1])
+
+    def close(self):
+        self.parse_line(self.buffer)
+        self.buffer = b''
+
+        return self.addresses
+
+
+class ExitAddressesProtocol(Protocol):
+    def __init__(self, finished):
+        self.finished = finished
+        self.parser = ExitAddressesParser()
+
+    def dataReceived(self, data):
+        self.parser.feed(data)
+
+    def connectionLost(self, reason):
+        if reason.check(ResponseDone, PotentialDataLoss):
+            self.finished.callback(self.parser.close())
+        else:
+            self.finished.errback(reason)
+
+
+class TorExitSet(object):
+    """
+    Set that keep the list of Tor exit nodes ip using check.torproject.org
+
+    The addresses are kept in a PackedAddresses per IP version; a refresh
+    builds the new arrays apart and swaps them at once.
+    """
+    def __init__(self):
+        self.tables = self.make_tables({4: (), 6: ()})
+
+    @staticmethod
+    def make_tables(addresses):
+        return {4: PackedAddresses(4, addresses[4]),
+                6: PackedAddresses(16, addresses[6])}
+
+    def __contains__(self, ip):
+        ip = pack_ip(ip)
+
+        return ip is not None and ip[1] in self.tables[ip[0]]
+
+    def __len__(self):
+        return sum(len(x) for x in self.tables.values())
+
+    def __iter__(self):
+        for version in (4, 6):
+            for x in self.tables[version]:
+                yield unpack_ip(x)
+
+    def add(self, ip):
+        version, packed = pack_ip(ip)
+
+        addresses = {v: list(self.tables[v]) for v in self.tables}
+        addresses[version].append(packed)
+
+        self.tables = self.make_tables(addresses)
+
+    def clear(self):
+        self.swap({4: (), 6: ()})
+
+    def swap(self, addresses):
+        """
+        Replace the addresses of the set
+
+        @return: a dictionary with the number of addresses added, removed
+                 and kept by the swap
+        """
+        tables = self.make_tables(addresses)
+
+        stats = {'added': 0, 'removed': 0, 'kept': 0}
+        for version in tables:
+            new, old = set(tables[version]), set(self.tables[version])
+            stats['added'] += len(new - old)
+            stats['removed'] += len(old - new)
+            stats['kept'] += len(new & old)
+
+        self.tables = tables
+
+        return stats
 
     def processData(self, data):
-        self.clear()
+        parser = ExitAddressesParser()
+        parser.feed(data)
+        return self.swap(parser.close())
+
+    def load(self, path):
+        """Load the addresses saved by a previous run"""
+        if not os.path.exists(path):
+            return
 
-        for ip in re.findall(r'ExitAddress ([^ ]*) ', text_type(data)):
-            self.add(ip)
+        try:
+            with open(path, 'rb') as f:
+                parser = ExitAddressesParser()
+                for line in f:
+                    parser.feed(line)
+
+            self.swap(parser.close())
+        except Exception as e:
+            log.err('Unable to load the list of Tor exit nodes: %s', e)
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'wb') as f:
+            for ip in self:
+                f.write(b'ExitAddress ' + ip.encode() + b'\n')
+
+        os.rename(tmp_path, path)
 
     def update(self, agent):
-        return get_page(agent, EXIT_ADDR_URL).addCallback(self.processData)
+        """
+        Fetch the list of the exit nodes and swap it with the current one
+
+        @return: a deferred firing with the stats of the swap or with None
+                 if the list fetched is empty and has been discarded
+        """
+        def fetch(response):
+            finished = defer.Deferred()
+            response.deliverBody(ExitAddressesProtocol(finished))
+            return finished
+
+        def swap(addresses):
+            # An empty list is the sign of a broken download more than of the end of Tor
+            if any(addresses.values()):
+                return self.swap(addresses)
+
+        return agent.request(b'GET', EXIT_ADDR_URL).addCallback(fetch).addCallback(swap)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8
+# In-process bus used to notify the jobs about the availability of new work
+
+
+class WorkSignals(object):
+    def __init__(self):
+        self.subscribers = {}
+
+    def subscribe(self, signal, callback):
+        self.subscribers.setdefault(signal, []).append(callback)
+
+    def unsubscribe(self, signal, callback):
+        if callback in self.subscribers.get(signal, []):
+            self.subscribers[signal].remove(callback)
+
+    def emit(self, *signals):
+        for signal in set(signals):
+            for callback in list(self.subscribers.get(signal, [])):
+                callback()
+
+
+Signals = WorkSignals()
+
+
+def db_emit_signals(session, *signals):
+    """
+    Schedule the emission of the signals after the commit of the session
+    """
+    session.info.setdefault('signals', set()).update(signals)
@@ -17,10 +17,42 @@ from six import text_type
 __all__ = ["ZipStream"]
 
 ZIP64_LIMIT= (1 << 31) - 1
+ZIP_FILECOUNT_LIMIT = (1 << 16) - 1
+ZIP_STORED = 0
 ZIP_DEFLATED = 8
 
+# Size of the reads performed on the archived files
+CHUNK_SIZE = 64 * 1024
+
+# Size of the sample used to estimate if a file is worth compressing
+SAMPLE_SIZE = 4 * 1024
+
+# Content types of formats that are already compressed or encrypted
+COMPRESSED_CONTENT_TYPES = (
+    'application/gzip',
+    'application/pgp-encrypted',
+    'application/vnd.openxmlformats-officedocument.',
+    'application/vnd.oasis.opendocument.',
+    'application/vnd.rar',
+    'application/x-7z-compressed',
+    'application/x-bzip2',
+    'application/x-gzip',
+    'application/x-rar-compressed',
+    'application/x-xz',
+    'application/zip',
+    'audio/aac',
+    'audio/mp4',
+    'audio/mpeg',
+    'audio/ogg',
+    'image/gif',
+    'image/jpeg',
+    'image/png',
+    'image/webp',
+    'video/',
+)
+
 # Here are some struct module formats for reading headers
-structEndArchive = b"<4s4H2lH"     # 9 items, end of archive, 22 bytes
+structEndArchive = b"<4s4H2LH"     # 9 items, end of archive, 22 bytes
 stringEndArchive = b"PK\005\006"   # magic number for end of archive record
 structCentralDir = b"<4s4B4HLLL5HLl"  # 19 items, central directory, 46 bytes
 stringCentralDir = b"PK\001\002"   # magic number for central directory
@@ -33,10 +65,23 @@ stringEndArchive64 = b"PK\x06\x06"  # magic token for Zip64 header
 stringDataDescriptor = b"PK\x07\x08"  # magic number for data descriptor
 
 
+def is_compressible(sample, content_type=''):
+    """
+    Estimate if a file is worth compressing by looking at its content type
+    and at the ratio achieved compressing a sample of its data.
+    """
+    if not sample or (content_type or '').startswith(COMPRESSED_CONTENT_TYPES):
+        return False
+
+    sample = sample[:SAMPLE_SIZE]
+
+    return len(zlib.compress(sample, 1)) < len(sample) * 0.9
+
+
 class ZipInfo(object):
     """Class with attributes describing each file in the ZIP archive."""
 
-    def __init__(self, filename="NoName", date_time=(1980, 1, 1, 0, 0, 0), compression=ZIP_DEFLATED):
+    def __init__(self, filename="NoName", date_time=(1980, 1, 1, 0, 0, 0), compression=ZIP_DEFLATED, zip64=False):
         # Convert filename to bytes before we work with it
         self.orig_filename = filename   # Original file name in archive
 
@@ -55,6 +100,7 @@ class ZipInfo(object):
         self.date_time = date_time       # year, month, day, hour, min, sec
         # Standard values:
         self.compress_type = compression  # Type of compression for the file
+        self.zip64 = zip64                # Whether the file requires the ZIP64 extensions
         self.comment = b""                # Comment for each file
         self.extra = b""                  # ZIP extra data
 
@@ -94,7 +140,8 @@ class ZipInfo(object):
             return self.filename, self.flag_bits
 
     def DataDescriptor(self):
-        if self.compress_size > ZIP64_LIMIT or self.file_size > ZIP64_LIMIT:
+        # The size of the descriptor fields must match what announced in the file header
+        if self.zip64:
             fmt = "<4sLQQ"
         else:
             fmt = "<4sLLL"
@@ -116,9 +163,10 @@ class ZipInfo(object):
 
         extra = self.extra
 
-        if file_size > ZIP64_LIMIT or compress_size > ZIP64_LIMIT:
+        if self.zip64 or file_size > ZIP64_LIMIT or compress_size > ZIP64_LIMIT:
             # File is larger than what fits into a 4 byte integer,
             # fall back to the ZIP64 extension
+            self.zip64 = True
             fmt = b'<hhqq'
             extra = extra + struct.pack(fmt,
                     1, struct.calcsize(fmt)-4, file_size, compress_size)
@@ -159,11 +207,14 @@ class ZipStream(object):
         self.data_ptr += len(data)
         return data
 
-    def zipinfo_open(self, arcname):
-        zinfo = ZipInfo(arcname, self.time, ZIP_DEFLATED)
+    def zipinfo_open(self, arcname, compression=ZIP_DEFLATED, zip64=False):
+        zinfo = ZipInfo(arcname, self.time, compression, zip64)
         zinfo.header_offset = self.data_ptr
 
-        cmpr = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        if compression == ZIP_DEFLATED:
+            cmpr = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        else:
+            cmpr = None
 
         header = zinfo.FileHeader()
 
@@ -177,7 +228,9 @@ class ZipStream(object):
         zinfo.file_size += len(chunk)
         zinfo.CRC = binascii.crc32(chunk, zinfo.CRC) & 0xffffffff
 
-        chunk = cmpr.compress(chunk)
+        if cmpr is not None:
+            chunk = cmpr.compress(chunk)
+
         zinfo.compress_size += len(chunk)
 
         self.update_data_ptr(chunk)
@@ -185,7 +238,7 @@ class ZipStream(object):
         return chunk
 
     def zipinfo_close(self, zinfo, cmpr):
-        buf = cmpr.flush()
+        buf = cmpr.flush() if cmpr is not None else b''
         zinfo.compress_size += len(buf)
         self.update_data_ptr(buf)
 
@@ -194,23 +247,36 @@ class ZipStream(object):
 
         return buf + trailer
 
-    def zip_fo(self, fo, arcname):
-        zipinfo, cmpr, header = self.zipinfo_open(arcname)
-
-        yield header
+    def zip_fo(self, fo, arcname, size=None, content_type=''):
+        """
+        Archive the content of a file object
 
+        fo -- the file object to be archived
+        arcname -- the name of the file inside the archive
+        size -- an estimation of the size of the file used to evaluate the need of ZIP64
+        content_type -- the content type of the file used to evaluate the need of compression
+        """
         with fo:
-            while True:
-                buf = fo.read(8 * 1024)
-                if not buf:
-                    break
+            buf = fo.read(CHUNK_SIZE)
+
+            compression = ZIP_DEFLATED if is_compressible(buf, content_type) else ZIP_STORED
+
+            # Like in zipfile.py the margin accounts for the expansion of incompressible data
+            zip64 = size is not None and size * 1.05 > ZIP64_LIMIT
 
+            zipinfo, cmpr, header = self.zipinfo_open(arcname, compression, zip64)
+
+            yield header
+
+            while buf:
                 yield self.zipinfo_update(zipinfo, cmpr, buf)
 
+                buf = fo.read(CHUNK_SIZE)
+
         yield self.zipinfo_close(zipinfo, cmpr)
 
-    def zip_file(self, filepath, arcname):
-        return self.zip_fo(open(filepath, "rb"), arcname)
+    def zip_file(self, filepath, arcname, content_type=''):
+        return self.zip_fo(open(filepath, "rb"), arcname, os.path.getsize(filepath), content_type)
 
     def archive_footer(self):
         """
@@ -279,7 +345,7 @@ class ZipStream(object):
 
         pos2 = self.data_ptr
         # Write end-of-zip-archive record
-        if pos1 > ZIP64_LIMIT:
+        if count > ZIP_FILECOUNT_LIMIT or pos1 > ZIP64_LIMIT or pos2 - pos1 > ZIP64_LIMIT:
             # Need to write the ZIP64 end-of-archive records
             zip64endrec = struct.pack(structEndArchive64, stringEndArchive64,
                                       44, 45, 45, 0, 0, count, count, pos2 - pos1, pos1)
@@ -290,7 +356,10 @@ class ZipStream(object):
             data.append(self.update_data_ptr(zip64locrec))
 
             endrec = struct.pack(structEndArchive, stringEndArchive,
-                                 0, 0, count, count, pos2 - pos1, -1, 0)
+                                 0, 0,
+                                 min(count, 0xffff), min(count, 0xffff),
+                                 min(pos2 - pos1, 0xffffffff), min(pos1, 0xffffffff),
+                                 0)
             data.append(self.update_data_ptr(endrec))
 
         else:
@@ -303,11 +372,11 @@ class ZipStream(object):
     def __iter__(self):
         for f in self.files:
             if 'fo' in f:
-                for data in self.zip_fo(f['fo'], f['name']):
+                for data in self.zip_fo(f['fo'], f['name'], f.get('size'), f.get('content_type', '')):
                     yield data
 
             elif 'path' in f:
-                for data in self.zip_file(f['path'], f['name']):
+                for data in self.zip_file(f['path'], f['name'], f.get('content_type', '')):
                     yield data
 
         yield self.archive_footer()
@@ -12,6 +12,7 @@ from globaleaks.models.config import ConfigFactory
 from globaleaks.orm import transact
 from globaleaks.utils import tls
 from globaleaks.utils.log import log
+from globaleaks.utils.metrics import https_worker_deaths
 from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601
 from globaleaks.workers.process import HTTPSProcProtocol
 
@@ -98,6 +99,8 @@ class ProcessSupervisor(object):
     def handle_worker_death(self, pp, reason):
         log.debug("Subprocess: %s exited with: %s", pp, reason)
 
+        https_worker_deaths.inc()
+
         if pp in self.tls_process_pool:
             self.tls_process_pool.remove(pp)
 
@@ -205,7 +205,7 @@ GLClient.controller("SubmissionCtrl",
       startCountdown();
 
       if ($scope.submission._token.question) {
-        glbcProofOfWork.proofOfWork($scope.submission._token.question).then(function(result) {
+        glbcProofOfWork.proofOfWork($scope.submission._token.question, $scope.submission._token.difficulty).then(function(result) {
           $scope.submission._token.answer = result;
           $scope.submission._token.$update(function(token) {
             $scope.submission._token = token;
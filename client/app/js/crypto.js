@@ -18,7 +18,7 @@ angular.module("GLCrypto", [])
 })
 .factory("glbcProofOfWork", ["$q", "sha256", "glbcUtil", function($q, sha256, glbcUtil) {
   // proofOfWork return the answer to the proof of work
-  // { [challenge string] -> [ answer index] }
+  // { [challenge string], [difficulty in bits] -> [ answer index] }
   var getWebCrypto = function() {
     if (typeof window === "undefined") {
       return;
@@ -32,14 +32,27 @@ angular.module("GLCrypto", [])
   };
 
   return {
-    proofOfWork: function(str) {
+    proofOfWork: function(str, difficulty) {
       var deferred = $q.defer();
 
       var i = 0;
 
+      // the digest must end with difficulty zero bits
+      var check = function (hash) {
+        var j, bits = difficulty;
+
+        for (j = 31; bits >= 8; j--, bits -= 8) {
+          if (hash[j] !== 0) {
+            return false;
+          }
+        }
+
+        return (hash[j] & ((1 << bits) - 1)) === 0;
+      };
+
       var xxx = function (hash) {
         hash = new Uint8Array(hash);
-        if (hash[31] === 0) {
+        if (check(hash)) {
           deferred.resolve(i);
         } else {
           i += 1;